@@ -18,7 +18,7 @@
 
 from flask import Flask, request
 from queue import Queue
-from services.webhook import send_webhook
+from services.webhook import send_webhook, enqueue_webhook, start_webhook_dispatcher
 import threading
 import uuid
 import os
@@ -27,6 +27,8 @@ import json
 from version import BUILD_NUMBER  # Import the BUILD_NUMBER
 from app_utils import log_job_status, discover_and_register_blueprints  # Import the discover_and_register_blueprints function
 from services.gcp_toolkit import trigger_cloud_run_job
+from services.payload_policy import apply_payload_policy
+from services.thread_budget import job_budget
 
 MAX_QUEUE_LENGTH = int(os.environ.get('MAX_QUEUE_LENGTH', 0))
 
@@ -54,7 +56,9 @@ def create_app():
                 "response": None
             })
             
-            response = task_func()
+            # Torch and ffmpeg threads are sized to the jobs running on this host
+            with job_budget(job_id):
+                response = task_func()
             run_time = time.time() - run_start_time
             total_time = time.time() - queue_start_time
 
@@ -73,6 +77,9 @@ def create_app():
                 "queue_length": task_queue.qsize(),
                 "build_number": BUILD_NUMBER  # Add build number to response
             }
+
+            # Large results are stored as an artifact and referenced by URL
+            response_data = apply_payload_policy(response_data, job_id)
             
             # Log job status as done
             log_job_status(job_id, {
@@ -83,15 +90,20 @@ def create_app():
                 "response": response_data
             })
 
-            # Only send webhook if webhook_url has an actual value (not an empty string)
+            # Only send webhook if webhook_url has an actual value (not an empty string).
+            # Delivery happens in the background so a slow receiver never holds up the queue.
             if data.get("webhook_url") and data.get("webhook_url") != "":
-                send_webhook(data.get("webhook_url"), response_data)
+                enqueue_webhook(data.get("webhook_url"), response_data, job_id)
 
             task_queue.task_done()
 
     # Start the queue processing in a separate thread
     threading.Thread(target=process_queue, daemon=True).start()
 
+    # Deliver any webhooks left in the outbox by a previous run
+    if not os.environ.get("CLOUD_RUN_JOB"):
+        start_webhook_dispatcher()
+
     # Decorator to add tasks to the queue or bypass it
     def queue_task(bypass_queue=False):
         def decorator(f):
@@ -116,7 +128,8 @@ def create_app():
                     })
 
                     # Execute the function directly (no queue)
-                    response = f(job_id=job_id, data=data, *args, **kwargs)
+                    with job_budget(job_id):
+                        response = f(job_id=job_id, data=data, *args, **kwargs)
                     run_time = time.time() - start_time
 
                     # Build response object
@@ -136,18 +149,23 @@ def create_app():
                         "build_number": BUILD_NUMBER
                     }
 
+                    # Large results are stored as an artifact and referenced by URL in the
+                    # status record and webhook; the caller still gets the full result
+                    stored_obj = apply_payload_policy(response_obj, job_id)
+
                     # Log job status as done
                     log_job_status(job_id, {
                         "job_status": "done",
                         "job_id": job_id,
                         "queue_id": execution_name,
                         "process_id": pid,
-                        "response": response_obj
+                        "response": stored_obj
                     })
 
-                    # Send webhook if webhook_url is provided
+                    # Send webhook if webhook_url is provided. The job instance shuts down
+                    # right after this request, so deliver synchronously instead of via the outbox.
                     if data.get("webhook_url") and data.get("webhook_url") != "":
-                        send_webhook(data.get("webhook_url"), response_obj)
+                        send_webhook(data.get("webhook_url"), stored_obj, job_id)
 
                     return response_obj, response[2]
 
@@ -239,7 +257,8 @@ def create_app():
                         "response": None
                     })
                     
-                    response = f(job_id=job_id, data=data, *args, **kwargs)
+                    with job_budget(job_id):
+                        response = f(job_id=job_id, data=data, *args, **kwargs)
                     run_time = time.time() - start_time
 
                     response_obj = {
@@ -258,13 +277,14 @@ def create_app():
                         "build_number": BUILD_NUMBER  # Add build number to response
                     }
                     
-                    # Log job status as done
+                    # Log job status as done; the caller gets the full result directly,
+                    # only the stored record has large results offloaded
                     log_job_status(job_id, {
                         "job_status": "done",
                         "job_id": job_id,
                         "queue_id": queue_id,
                         "process_id": pid,
-                        "response": response_obj
+                        "response": apply_payload_policy(response_obj, job_id)
                     })
                     
                     return response_obj, response[2]
@@ -22,6 +22,9 @@ import jsonschema
 import os
 import json
 import time
+import fcntl
+import threading
+from contextlib import contextmanager
 from config import LOCAL_STORAGE_PATH
 
 def validate_payload(schema):
@@ -39,6 +42,33 @@ def validate_payload(schema):
         return decorated_function
     return decorator
 
+JOBS_DIR = os.path.join(LOCAL_STORAGE_PATH, 'jobs')
+
+_job_status_lock = threading.Lock()
+
+@contextmanager
+def _job_status_write_lock():
+    """
+    Serialize job record writes across threads and across gunicorn workers, so a
+    merge in one worker cannot overwrite a status written by another.
+    """
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    with _job_status_lock:
+        with open(os.path.join(JOBS_DIR, '.lock'), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _write_job_file(job_id, data):
+    job_file = os.path.join(JOBS_DIR, f"{job_id}.json")
+    # Write to a temporary file and rename it so readers never see a partial record
+    temp_file = f"{job_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_file, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(temp_file, job_file)
+
 def log_job_status(job_id, data):
     """
     Log job status to a file in the STORAGE_PATH/jobs folder
@@ -47,18 +77,29 @@ def log_job_status(job_id, data):
         job_id (str): The unique job ID
         data (dict): Data to write to the log file
     """
-    jobs_dir = os.path.join(LOCAL_STORAGE_PATH, 'jobs')
-    
-    # Create jobs directory if it doesn't exist
-    if not os.path.exists(jobs_dir):
-        os.makedirs(jobs_dir, exist_ok=True)
-    
-    # Create or update the job log file
-    job_file = os.path.join(jobs_dir, f"{job_id}.json")
-    
-    # Write data directly to file
-    with open(job_file, 'w') as f:
-        json.dump(data, f, indent=2)
+    with _job_status_write_lock():
+        _write_job_file(job_id, data)
+
+def update_job_status(job_id, updates):
+    """
+    Merge fields into an existing job status record (creating it if needed).
+
+    Used by background work such as webhook delivery that reports on a job
+    after its main status has been written.
+
+    Args:
+        job_id (str): The unique job ID
+        updates (dict): Top-level fields to set on the record
+    """
+    job_file = os.path.join(JOBS_DIR, f"{job_id}.json")
+    with _job_status_write_lock():
+        try:
+            with open(job_file, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {"job_id": job_id}
+        data.update(updates)
+        _write_job_file(job_id, data)
 
 def queue_task_wrapper(bypass_queue=False):
     def decorator(f):
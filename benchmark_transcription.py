@@ -0,0 +1,94 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+# Compare transcription backends on a local audio/video file.
+#
+# Reports load time, transcription time and real-time factor (RTF =
+# processing time / audio duration; lower is faster) for each backend.
+#
+# Usage: python benchmark_transcription.py media.mp3 [--model base] [--backends whisper faster_whisper]
+
+import os
+import sys
+import time
+import argparse
+import subprocess
+
+os.environ.setdefault('API_KEY', 'benchmark')  # config.py requires it
+
+from services.transcription_backends import BACKENDS, MODEL_SIZES, get_backend
+from services.whisper_models import resolve_device
+
+def get_duration(path):
+    output = subprocess.check_output([
+        'ffprobe', '-v', 'error', '-show_entries', 'format=duration',
+        '-of', 'default=noprint_wrappers=1:nokey=1', path
+    ])
+    return float(output.strip())
+
+def benchmark(backend_name, model_name, device, precision, path, runs, word_timestamps):
+    backend = get_backend(backend_name)
+    precision = precision or backend.default_precision(device)
+
+    start = time.perf_counter()
+    model = backend.load(model_name, device, precision)
+    load_time = time.perf_counter() - start
+
+    timings = []
+    result = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = backend.transcribe(model, path, precision, word_timestamps=word_timestamps)
+        timings.append(time.perf_counter() - start)
+
+    return {
+        'backend': backend_name,
+        'precision': precision,
+        'load_time': load_time,
+        'best_time': min(timings),
+        'segments': len(result['segments']),
+        'words': sum(len(segment.get('words', [])) for segment in result['segments'])
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare transcription backend speed (real-time factor).")
+    parser.add_argument('media', help="Local audio or video file")
+    parser.add_argument('--model', default='base', choices=MODEL_SIZES)
+    parser.add_argument('--backends', nargs='+', default=list(BACKENDS), choices=list(BACKENDS))
+    parser.add_argument('--device', default=None, help="cpu or cuda (default: auto)")
+    parser.add_argument('--precision', default=None, help="Override the backend's default precision")
+    parser.add_argument('--runs', type=int, default=1, help="Timed runs per backend; the best is reported")
+    parser.add_argument('--word-timestamps', action='store_true')
+    args = parser.parse_args()
+
+    duration = get_duration(args.media)
+    device = resolve_device(args.device)
+    print(f"Media: {args.media} ({duration:.1f}s), model: {args.model}, device: {device}\n")
+    print(f"{'backend':<16}{'precision':<11}{'load (s)':>10}{'run (s)':>10}{'RTF':>8}{'segments':>10}{'words':>8}")
+
+    for backend_name in args.backends:
+        try:
+            stats = benchmark(backend_name, args.model, device, args.precision, args.media, args.runs, args.word_timestamps)
+        except Exception as e:
+            print(f"{backend_name:<16}failed: {e}")
+            continue
+        print(f"{stats['backend']:<16}{stats['precision']:<11}{stats['load_time']:>10.2f}{stats['best_time']:>10.2f}"
+              f"{stats['best_time'] / duration:>8.3f}{stats['segments']:>10}{stats['words']:>8}")
+
+if __name__ == '__main__':
+    sys.exit(main())
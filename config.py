@@ -27,6 +27,102 @@ if not API_KEY:
 # Storage path setting
 LOCAL_STORAGE_PATH = os.environ.get('LOCAL_STORAGE_PATH', '/tmp')
 
+# S3 transfer tuning (sizes in MB); large uploads are split into parts uploaded in parallel
+S3_MULTIPART_THRESHOLD_MB = int(os.environ.get('S3_MULTIPART_THRESHOLD_MB', 16))
+S3_MULTIPART_CHUNKSIZE_MB = int(os.environ.get('S3_MULTIPART_CHUNKSIZE_MB', 16))
+S3_MAX_CONCURRENCY = int(os.environ.get('S3_MAX_CONCURRENCY', 10))
+
+# Number of files uploaded concurrently by multi-output jobs
+UPLOAD_MAX_WORKERS = int(os.environ.get('UPLOAD_MAX_WORKERS', 4))
+
+# Content-addressed uploads: identical outputs are stored once and reused.
+# Index entries older than the TTL (seconds) are re-checked against the bucket.
+CLOUD_STORAGE_DEDUPE = os.environ.get('CLOUD_STORAGE_DEDUPE', 'false').lower() in ('1', 'true', 'yes')
+CLOUD_STORAGE_DEDUPE_INDEX_TTL = int(os.environ.get('CLOUD_STORAGE_DEDUPE_INDEX_TTL', 86400))
+
+# Webhook delivery: webhooks are queued in a persistent outbox and sent by a
+# background pool with timeouts, retries and a per-host concurrency cap
+WEBHOOK_WORKERS = int(os.environ.get('WEBHOOK_WORKERS', 4))
+WEBHOOK_PER_HOST_LIMIT = int(os.environ.get('WEBHOOK_PER_HOST_LIMIT', 2))
+WEBHOOK_TIMEOUT = float(os.environ.get('WEBHOOK_TIMEOUT', 30))
+WEBHOOK_MAX_ATTEMPTS = int(os.environ.get('WEBHOOK_MAX_ATTEMPTS', 8))
+WEBHOOK_BACKOFF_BASE = float(os.environ.get('WEBHOOK_BACKOFF_BASE', 2))
+WEBHOOK_BACKOFF_MAX = float(os.environ.get('WEBHOOK_BACKOFF_MAX', 600))
+
+# Job results larger than this (bytes, serialized) are uploaded as a JSON artifact and
+# replaced by a URL in webhooks and job status records; 0 disables offloading
+PAYLOAD_MAX_INLINE_BYTES = int(os.environ.get('PAYLOAD_MAX_INLINE_BYTES', 1024 * 1024))
+# Webhook bodies are gzip-compressed for every receiver (WEBHOOK_GZIP) or only for the
+# comma-separated hosts in WEBHOOK_GZIP_HOSTS
+WEBHOOK_GZIP = os.environ.get('WEBHOOK_GZIP', 'false').lower() in ('1', 'true', 'yes')
+WEBHOOK_GZIP_HOSTS = [host.strip().lower() for host in os.environ.get('WEBHOOK_GZIP_HOSTS', '').split(',') if host.strip()]
+LOG_PAYLOAD_MAX_CHARS = int(os.environ.get('LOG_PAYLOAD_MAX_CHARS', 2000))
+
+# Whisper model cache: models are loaded once per worker and shared by jobs.
+# WHISPER_PRELOAD_MODELS is a comma-separated list loaded when a worker boots.
+WHISPER_DEFAULT_MODEL = os.environ.get('WHISPER_DEFAULT_MODEL', 'base')
+WHISPER_DEVICE = os.environ.get('WHISPER_DEVICE', 'auto')
+# 'whisper' (openai-whisper/PyTorch) or 'faster_whisper' (CTranslate2, int8 on CPU)
+WHISPER_BACKEND = os.environ.get('WHISPER_BACKEND', 'whisper')
+WHISPER_PRELOAD_MODELS = [name.strip() for name in os.environ.get('WHISPER_PRELOAD_MODELS', '').split(',') if name.strip()]
+WHISPER_MODEL_IDLE_TIMEOUT = int(os.environ.get('WHISPER_MODEL_IDLE_TIMEOUT', 1800))
+WHISPER_MEMORY_PRESSURE_PERCENT = float(os.environ.get('WHISPER_MEMORY_PRESSURE_PERCENT', 90))
+
+# Optional shared transcription sidecar: when a socket path is set, one process
+# owns the Whisper models and all gunicorn workers send requests to it
+TRANSCRIPTION_SERVER_SOCKET = os.environ.get('TRANSCRIPTION_SERVER_SOCKET', '')
+TRANSCRIPTION_SERVER_WORKERS = int(os.environ.get('TRANSCRIPTION_SERVER_WORKERS', 1))
+TRANSCRIPTION_SERVER_MAX_BATCH = int(os.environ.get('TRANSCRIPTION_SERVER_MAX_BATCH', 8))
+
+# Long-form transcription: media is split at silences into chunks of about
+# LONG_FORM_CHUNK_SECONDS and the chunks are transcribed in parallel processes
+LONG_FORM_CHUNK_SECONDS = int(os.environ.get('LONG_FORM_CHUNK_SECONDS', 600))
+LONG_FORM_OVERLAP_SECONDS = float(os.environ.get('LONG_FORM_OVERLAP_SECONDS', 1.0))
+LONG_FORM_WORKERS = int(os.environ.get('LONG_FORM_WORKERS', max(1, min(4, (os.cpu_count() or 1) // 2))))
+
+# Decoded 16 kHz mono audio is cached per source and shared by transcription
+# and audio analysis; about 230MB per hour of audio
+AUDIO_CACHE_TTL = int(os.environ.get('AUDIO_CACHE_TTL', 3600))
+AUDIO_CACHE_MAX_BYTES = int(os.environ.get('AUDIO_CACHE_MAX_BYTES', 2 * 1024 ** 3))
+
+# Transcripts are cached by audio content, model, language, task and
+# word_timestamps; entries unused for TRANSCRIPT_CACHE_TTL seconds expire (0 disables)
+TRANSCRIPT_CACHE_TTL = int(os.environ.get('TRANSCRIPT_CACHE_TTL', 86400))
+TRANSCRIPT_CACHE_MAX_BYTES = int(os.environ.get('TRANSCRIPT_CACHE_MAX_BYTES', 256 * 1024 ** 2))
+
+# Minimum seconds between partial-transcript updates to the job status record
+# and progress webhooks
+TRANSCRIBE_PROGRESS_INTERVAL = float(os.environ.get('TRANSCRIBE_PROGRESS_INTERVAL', 2.0))
+
+# Streaming transcriptions run outside the job queue; at most this many run at
+# once per worker and further requests are rejected with 429
+TRANSCRIBE_STREAM_MAX_CONCURRENT = int(os.environ.get('TRANSCRIBE_STREAM_MAX_CONCURRENT', 1))
+
+# Batch transcription: files are fetched TRANSCRIBE_BATCH_PREFETCH at a time
+# while up to TRANSCRIBE_BATCH_SIZE short clips go through the model together
+TRANSCRIBE_BATCH_SIZE = int(os.environ.get('TRANSCRIBE_BATCH_SIZE', 8))
+TRANSCRIBE_BATCH_PREFETCH = int(os.environ.get('TRANSCRIBE_BATCH_PREFETCH', 4))
+
+# CPU thread budget: torch and ffmpeg threads are divided between the jobs
+# running on the host at the same time (0 cores = all CPUs available)
+THREAD_BUDGET_ENABLED = os.environ.get('THREAD_BUDGET_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+THREAD_BUDGET_CORES = int(os.environ.get('THREAD_BUDGET_CORES', 0))
+THREAD_BUDGET_AFFINITY = os.environ.get('THREAD_BUDGET_AFFINITY', 'false').lower() in ('1', 'true', 'yes')
+
+# Installed font families are indexed once and saved here, next to the code so
+# the copy built into the image is not hidden by a volume mounted over
+# LOCAL_STORAGE_PATH; FONT_INDEX_FALLBACK_PATH is used when FONT_INDEX_PATH is
+# not writable. The font directories are re-checked for changes every
+# FONT_INDEX_CHECK_INTERVAL seconds
+FONT_INDEX_PATH = os.environ.get('FONT_INDEX_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'font_index.json'))
+FONT_INDEX_FALLBACK_PATH = os.path.join(LOCAL_STORAGE_PATH, 'font_index.json')
+FONT_INDEX_CHECK_INTERVAL = int(os.environ.get('FONT_INDEX_CHECK_INTERVAL', 60))
+
+# Chunked encoding (parallel_encode requests): ffmpeg processes per job
+# (0 = derived from the thread budget) and the shortest chunk worth splitting off
+PARALLEL_ENCODE_WORKERS = int(os.environ.get('PARALLEL_ENCODE_WORKERS', 0))
+PARALLEL_ENCODE_MIN_CHUNK_SECONDS = int(os.environ.get('PARALLEL_ENCODE_MIN_CHUNK_SECONDS', 30))
+
 # GCP environment variables
 GCP_SA_CREDENTIALS = os.environ.get('GCP_SA_CREDENTIALS', '')
 GCP_BUCKET_NAME = os.environ.get('GCP_BUCKET_NAME', '')
@@ -115,3 +115,30 @@ def when_ready(server):
         import threading
         thread = threading.Thread(target=cloud_run_job_task)
         thread.start()
+
+
+transcription_server_process = None
+
+def on_starting(server):
+    """Hook called before the master starts; launches the shared transcription server if configured."""
+    global transcription_server_process
+    if os.environ.get("TRANSCRIPTION_SERVER_SOCKET") and not os.environ.get("CLOUD_RUN_JOB"):
+        from services.transcription_server import start_server_process
+        transcription_server_process = start_server_process()
+
+
+def on_exit(server):
+    """Hook called when the master exits; stops the transcription server."""
+    if transcription_server_process and transcription_server_process.poll() is None:
+        transcription_server_process.terminate()
+
+
+def post_worker_init(worker):
+    """Hook called in each worker after it boots; loads the font index and the Whisper models listed in WHISPER_PRELOAD_MODELS."""
+    from services.font_index import load_index
+    load_index()
+
+    # With a transcription server the models live in the sidecar instead
+    if os.environ.get("WHISPER_PRELOAD_MODELS") and not os.environ.get("TRANSCRIPTION_SERVER_SOCKET"):
+        from services.whisper_models import preload_models
+        preload_models()
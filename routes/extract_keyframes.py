@@ -21,7 +21,7 @@ from app_utils import *
 import logging
 from services.extract_keyframes import process_keyframe_extraction
 from services.authentication import authenticate
-from services.cloud_storage import upload_file
+from services.cloud_storage import upload_files
 
 extract_keyframes_bp = Blueprint('extract_keyframes', __name__)
 logger = logging.getLogger(__name__)
@@ -50,11 +50,8 @@ def extract_keyframes(job_id, data):
         # Process keyframe extraction
         image_paths = process_keyframe_extraction(video_url, job_id)
 
-        # Upload each extracted keyframe and collect the cloud URLs
-        image_urls = []
-        for image_path in image_paths:
-            cloud_url = upload_file(image_path)
-            image_urls.append({"image_url": cloud_url})
+        # Upload the extracted keyframes concurrently, keeping their order
+        image_urls = [{"image_url": cloud_url} for cloud_url in upload_files(image_paths)]
 
         logger.info(f"Job {job_id}: Keyframes uploaded to cloud storage")
 
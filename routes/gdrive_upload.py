@@ -21,14 +21,11 @@ import logging
 from flask import Blueprint, request, jsonify
 import threading
 import requests
-import uuid
-import json
-from google.oauth2.service_account import Credentials
-from google.auth.transport.requests import Request
 from datetime import datetime
 import time
 import psutil
 from services.authentication import authenticate
+from services.gdrive_upload import upload_url_to_drive
 from app_utils import validate_payload, queue_task_wrapper
 
 # Configure logging
@@ -39,7 +36,6 @@ logger = logging.getLogger(__name__)
 gdrive_upload_bp = Blueprint('gdrive_upload', __name__)
 
 # Environment variables
-GCP_SA_CREDENTIALS = os.getenv('GCP_SA_CREDENTIALS')
 GDRIVE_USER = os.getenv('GDRIVE_USER')
 
 # Class to track upload progress
@@ -57,107 +53,17 @@ class UploadProgress:
 active_uploads = []
 uploads_lock = threading.Lock()
 
-def get_access_token():
-    """
-    Retrieves an access token for Google APIs using service account credentials.
-    """
-    credentials_info = json.loads(GCP_SA_CREDENTIALS)
-    credentials = Credentials.from_service_account_info(
-        credentials_info,
-        scopes=['https://www.googleapis.com/auth/drive']
-    )
-    delegated_credentials = credentials.with_subject(GDRIVE_USER)
-    if not delegated_credentials.valid or delegated_credentials.expired:
-        delegated_credentials.refresh(Request())
-    access_token = delegated_credentials.token
-    return access_token
-
-def initiate_resumable_upload(filename, folder_id, mime_type='application/octet-stream'):
-    """
-    Initiates a resumable upload session with Google Drive and returns the upload URL.
-    """
-    url = 'https://www.googleapis.com/upload/drive/v3/files?uploadType=resumable'
-    headers = {
-        'Authorization': f'Bearer {get_access_token()}',
-        'Content-Type': 'application/json; charset=UTF-8',
-        'X-Upload-Content-Type': mime_type
-    }
-    metadata = {
-        'name': filename,
-        'parents': [folder_id]
-    }
-    response = requests.post(url, headers=headers, data=json.dumps(metadata))
-    response.raise_for_status()
-    upload_url = response.headers['Location']
-    return upload_url
-
-def upload_file_in_chunks(file_url, upload_url, total_size, job_id, chunk_size):
-    """
-    Uploads the file to Google Drive in chunks by streaming data directly from the source URL.
-    """
-    bytes_uploaded = 0
-    max_retries = 5
-    retry_delay = 5  # seconds
-
+def track_upload_progress(job_id, total_size):
+    """Register an UploadProgress for the resource logger and return it with its update callback."""
     progress = UploadProgress(job_id, total_size)
-
-    # Add progress to active_uploads
     with uploads_lock:
         active_uploads.append(progress)
 
-    try:
-        with requests.get(file_url, stream=True) as r:
-            r.raise_for_status()
-            iterator = r.iter_content(chunk_size=chunk_size)
-            for chunk in iterator:
-                if chunk:
-                    for attempt in range(max_retries):
-                        start = bytes_uploaded
-                        end = bytes_uploaded + len(chunk) - 1
-                        content_range = f'bytes {start}-{end}/{total_size}'
-                        headers = {
-                            'Content-Length': str(len(chunk)),
-                            'Content-Range': content_range,
-                        }
-                        try:
-                            upload_response = requests.put(
-                                upload_url,
-                                headers=headers,
-                                data=chunk
-                            )
-                            if upload_response.status_code in (200, 201):
-                                # Upload complete
-                                logger.info(f"Job {job_id}: Upload complete.")
-                                with progress.lock:
-                                    progress.bytes_uploaded = end + 1
-                                return upload_response.json()['id']
-                            elif upload_response.status_code == 308:
-                                # Resumable upload incomplete
-                                bytes_uploaded = end + 1
-                                with progress.lock:
-                                    progress.bytes_uploaded = bytes_uploaded
-                                break  # Break retry loop and continue with next chunk
-                            else:
-                                # Handle unexpected status codes
-                                logger.error(f"Job {job_id}: Unexpected status code: {upload_response.status_code}")
-                                raise Exception(f"Upload failed with status code {upload_response.status_code}")
-                        except requests.exceptions.RequestException as e:
-                            logger.error(f"Job {job_id}: Network error during upload: {e}")
-                            if attempt < max_retries - 1:
-                                logger.info(f"Job {job_id}: Retrying upload chunk after {retry_delay} seconds...")
-                                time.sleep(retry_delay)
-                                continue
-                            else:
-                                logger.error(f"Job {job_id}: Max retries reached. Upload failed.")
-                                raise
-                    else:
-                        # If we exhausted retries, exit the function
-                        raise Exception("Failed to upload chunk after multiple retries.")
-    finally:
-        # Remove progress from active_uploads
-        with uploads_lock:
-            if progress in active_uploads:
-                active_uploads.remove(progress)
+    def update(bytes_uploaded):
+        with progress.lock:
+            progress.bytes_uploaded = bytes_uploaded
+
+    return progress, update
 
 @gdrive_upload_bp.route('/gdrive-upload', methods=['POST'])
 @authenticate
@@ -196,9 +102,10 @@ def gdrive_upload(job_id, data):
             head_response.raise_for_status()
             total_size = int(head_response.headers.get('Content-Length', 0))
             
-            get_response = requests.get(file_url, stream=True, timeout=30)
-            get_response.raise_for_status()
-            total_size = int(get_response.headers.get('Content-Length', 0))
+            if total_size == 0:
+                with requests.get(file_url, stream=True, timeout=30) as get_response:
+                    get_response.raise_for_status()
+                    total_size = int(get_response.headers.get('Content-Length', 0))
             if total_size == 0:
                 raise ValueError("Content-Length header is missing or zero")
         except requests.exceptions.RequestException as e:
@@ -210,12 +117,18 @@ def gdrive_upload(job_id, data):
 
         logger.info(f"Job {job_id}: File size determined: {total_size} bytes")
 
-        # Initiate upload session
-        upload_url = initiate_resumable_upload(filename, folder_id, mime_type)
-        logger.info(f"Job {job_id}: Resumable upload session initiated with chunk size {chunk_size} bytes.")
-
-        # Upload file in chunks
-        file_id = upload_file_in_chunks(file_url, upload_url, total_size, job_id, chunk_size)
+        # Upload through a resumable session; a previous attempt's session is picked up if present
+        progress, update_progress = track_upload_progress(job_id, total_size)
+        try:
+            logger.info(f"Job {job_id}: Starting resumable upload with initial chunk size {chunk_size} bytes.")
+            file_id = upload_url_to_drive(
+                file_url, filename, folder_id, total_size, mime_type,
+                chunk_size=chunk_size, job_id=job_id, progress_callback=update_progress
+            )
+        finally:
+            with uploads_lock:
+                if progress in active_uploads:
+                    active_uploads.remove(progress)
 
         return file_id, "/gdrive-upload", 200
 
@@ -22,7 +22,7 @@ from flask import Blueprint, request, jsonify
 from app_utils import *
 from services.v1.ffmpeg.ffmpeg_compose import process_ffmpeg_compose
 from services.authentication import authenticate
-from services.cloud_storage import upload_file
+from services.cloud_storage import UploadBatch
 
 v1_ffmpeg_compose_bp = Blueprint('v1_ffmpeg_compose', __name__)
 logger = logging.getLogger(__name__)
@@ -119,29 +119,39 @@ def ffmpeg_api(job_id, data):
     try:
         output_filenames, metadata = process_ffmpeg_compose(data, job_id)
         
-        # Upload output files to GCP and create result array
-        output_urls = []
-        for i, output_filename in enumerate(output_filenames):
-            if os.path.exists(output_filename):
-                upload_url = upload_file(output_filename)
-                output_info = {"file_url": upload_url}
-                
-                if metadata and i < len(metadata):
-                    output_metadata = metadata[i]
-                    if 'thumbnail' in output_metadata:
-                        thumbnail_path = output_metadata['thumbnail']
-                        if os.path.exists(thumbnail_path):
-                            thumbnail_url = upload_file(thumbnail_path)
-                            del output_metadata['thumbnail']
-                            output_metadata['thumbnail_url'] = thumbnail_url
-                            os.remove(thumbnail_path)  # Clean up local thumbnail file
-                    output_info.update(output_metadata)
-                
-                output_urls.append(output_info)
-                os.remove(output_filename)  # Clean up local output file after upload
-            else:
+        for output_filename in output_filenames:
+            if not os.path.exists(output_filename):
                 raise Exception(f"Expected output file {output_filename} not found")
 
+        # Upload all outputs and their thumbnails concurrently
+        with UploadBatch(remove_after_upload=True) as batch:
+            output_uploads = [batch.submit(output_filename) for output_filename in output_filenames]
+            thumbnail_uploads = {}
+            for i, output_metadata in enumerate(metadata or []):
+                thumbnail_path = output_metadata.get('thumbnail')
+                if not thumbnail_path:
+                    continue
+                if os.path.exists(thumbnail_path):
+                    thumbnail_uploads[i] = batch.submit(thumbnail_path)
+                else:
+                    logger.warning(f"Job {job_id}: Thumbnail {thumbnail_path} for output {i} was not generated")
+                    output_metadata['thumbnail_error'] = "Thumbnail was requested but could not be generated"
+                # The local path is replaced by thumbnail_url (or thumbnail_error) in the response
+                output_metadata.pop('thumbnail')
+            batch.results()
+
+        output_urls = []
+        for i, upload in enumerate(output_uploads):
+            output_info = {"file_url": upload.result()}
+
+            if metadata and i < len(metadata):
+                output_metadata = metadata[i]
+                if i in thumbnail_uploads:
+                    output_metadata['thumbnail_url'] = thumbnail_uploads[i].result()
+                output_info.update(output_metadata)
+
+            output_urls.append(output_info)
+
         return output_urls, "/v1/ffmpeg/compose", 200
         
     except Exception as e:
@@ -37,6 +37,8 @@ logger = logging.getLogger(__name__)
         "video_crf": {"type": "number", "minimum": 0, "maximum": 51},
         "audio_codec": {"type": "string"},
         "audio_bitrate": {"type": "string"},
+        "stream_output": {"type": "boolean"},
+        "parallel_encode": {"type": "boolean"},
         "webhook_url": {"type": "string", "format": "uri"},
         "id": {"type": "string"}
     },
@@ -52,13 +54,15 @@ def convert_media_format(job_id, data):
     video_crf = data.get('video_crf', 23)
     audio_codec = data.get('audio_codec', 'aac')
     audio_bitrate = data.get('audio_bitrate', '128k')
+    stream_output = data.get('stream_output', False)
+    parallel_encode = data.get('parallel_encode', False)
     webhook_url = data.get('webhook_url')
     id = data.get('id')
 
     logger.info(f"Job {job_id}: Received media conversion request for media URL: {media_url} to format: {output_format}")
 
     try:
-        output_file = process_media_convert(
+        output_file, streamed = process_media_convert(
             media_url, 
             job_id, 
             output_format, 
@@ -67,10 +71,16 @@ def convert_media_format(job_id, data):
             video_crf,
             audio_codec,
             audio_bitrate,
-            webhook_url
+            webhook_url,
+            stream_output,
+            parallel_encode
         )
         logger.info(f"Job {job_id}: Media format conversion completed successfully")
 
+        # Streamed outputs are already in cloud storage
+        if streamed:
+            return output_file, "/v1/media/convert", 200
+
         cloud_url = upload_file(output_file)
         logger.info(f"Job {job_id}: Converted media uploaded to cloud storage: {cloud_url}")
         
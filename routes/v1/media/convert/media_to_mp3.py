@@ -38,7 +38,8 @@ logger = logging.getLogger(__name__)
         "webhook_url": {"type": "string", "format": "uri"},
         "id": {"type": "string"},
         "bitrate": {"type": "string", "pattern": "^[0-9]+k$"},
-        "sample_rate": {"type": "number"}
+        "sample_rate": {"type": "number"},
+        "stream_output": {"type": "boolean"}
     },
     "required": ["media_url"],
     "additionalProperties": False
@@ -50,10 +51,16 @@ def convert_media_to_mp3(job_id, data):
     id = data.get('id')
     bitrate = data.get('bitrate', '128k')
     sample_rate = data.get('sample_rate')
+    stream_output = data.get('stream_output', False)
 
     logger.info(f"Job {job_id}: Received media-to-mp3 request for media URL: {media_url}")
 
     try:
+        if stream_output:
+            cloud_url = process_media_to_mp3(media_url, job_id, bitrate, sample_rate, stream_output=True)
+            logger.info(f"Job {job_id}: Converted media streamed to cloud storage: {cloud_url}")
+            return cloud_url, "/v1/media/transform/mp3", 200
+
         output_file = process_media_to_mp3(media_url, job_id, bitrate, sample_rate)
         logger.info(f"Job {job_id}: Media conversion process completed successfully")
 
@@ -0,0 +1,59 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+from flask import Blueprint
+from app_utils import *
+import logging
+from services.v1.media.detect_language import detect_language as run_language_detection
+from services.transcription_backends import MODEL_SIZES, BACKENDS
+from services.authentication import authenticate
+
+v1_media_detect_language_bp = Blueprint('v1_media_detect_language', __name__)
+logger = logging.getLogger(__name__)
+
+@v1_media_detect_language_bp.route('/v1/media/detect-language', methods=['POST'])
+@authenticate
+@validate_payload({
+    "type": "object",
+    "properties": {
+        "media_url": {"type": "string", "format": "uri"},
+        "model": {"type": "string", "enum": MODEL_SIZES},
+        "backend": {"type": "string", "enum": list(BACKENDS)},
+        "windows": {"type": "integer", "minimum": 1, "maximum": 8},
+        "webhook_url": {"type": "string", "format": "uri"},
+        "id": {"type": "string"}
+    },
+    "required": ["media_url"],
+    "additionalProperties": False
+})
+@queue_task_wrapper(bypass_queue=False)
+def detect_language(job_id, data):
+    """Detect the spoken language of a media file from a few short audio windows."""
+    media_url = data['media_url']
+    model = data.get('model')
+    backend = data.get('backend')
+    windows = data.get('windows', 3)
+
+    logger.info(f"Job {job_id}: Received language detection request for {media_url}")
+
+    try:
+        result = run_language_detection(media_url, model=model, backend=backend, windows=windows, job_id=job_id)
+        logger.info(f"Job {job_id}: Detected language {result['language']} ({result['probability']})")
+        return result, "/v1/media/detect-language", 200
+
+    except Exception as e:
+        logger.error(f"Job {job_id}: Error during language detection - {str(e)}")
+        return str(e), "/v1/media/detect-language", 500
@@ -6,7 +6,7 @@ import yt_dlp
 import tempfile
 from werkzeug.utils import secure_filename
 import uuid
-from services.cloud_storage import upload_file
+from services.cloud_storage import upload_file, UploadBatch
 from services.authentication import authenticate
 from services.file_management import download_file
 from urllib.parse import quote, urlparse
@@ -207,80 +207,91 @@ def download_media(job_id, data):
                     }
                 }
 
-                # Add thumbnails if available and requested
-                if info.get('thumbnails') and thumbnail_options.get('download', False):
-                    response["thumbnails"] = []
-                    for thumbnail in info['thumbnails']:
-                        if thumbnail.get('url'):
+                # Thumbnails and subtitles are downloaded and uploaded concurrently; each
+                # entry keeps its future until the batch finishes
+                with UploadBatch(remove_after_upload=True) as batch:
+                    thumbnail_uploads = []
+                    subtitle_uploads = []
+
+                    # Add thumbnails if available and requested
+                    if info.get('thumbnails') and thumbnail_options.get('download', False):
+                        for thumbnail in info['thumbnails']:
+                            if thumbnail.get('url'):
+                                thumbnail_uploads.append((thumbnail, batch.submit_download(thumbnail['url'], temp_dir)))
+
+                    # Process subtitles if available
+                    if 'subtitles' in info and subtitle_options.get('download', False):
+                        logger.info(f"Job {job_id}: Found subtitles in info: {info['subtitles']}")
+                        requested_languages = subtitle_options.get('languages', [])
+                        requested_format = subtitle_options.get('format', 'srt')
+                        subtitle_cloud_upload = subtitle_options.get('cloud_upload', True)  # Default to True
+                        
+                        # If no languages specified, use all available languages
+                        if not requested_languages:
+                            requested_languages = list(info['subtitles'].keys())
+                            logger.info(f"Job {job_id}: No languages specified, using all available: {requested_languages}")
+                        
+                        for lang, subtitle_list in info['subtitles'].items():
+                            # Skip if language not in requested list
+                            if lang not in requested_languages:
+                                continue
+                                
                             try:
-                                # Download the thumbnail first
-                                thumbnail_path = download_file(thumbnail['url'], temp_dir)
-                                # Upload to cloud storage
-                                thumbnail_url = upload_file(thumbnail_path)
-                                # Clean up the temporary thumbnail file
-                                os.remove(thumbnail_path)
+                                logger.info(f"Job {job_id}: Processing subtitle for language {lang}")
+                                # Find the requested format
+                                subtitle_data = None
+                                for subtitle in subtitle_list:
+                                    if subtitle['ext'] == requested_format:
+                                        subtitle_data = subtitle
+                                        break
+                                        
+                                if not subtitle_data:
+                                    logger.warning(f"Job {job_id}: Requested format {requested_format} not available for {lang}")
+                                    continue
                                 
-                                response["thumbnails"].append({
-                                    "id": thumbnail.get('id', 'default'),
-                                    "image_url": thumbnail_url,
-                                    "width": thumbnail.get('width'),
-                                    "height": thumbnail.get('height'),
-                                    "original_format": thumbnail.get('ext'),
-                                    "converted": thumbnail.get('converted', False)
-                                })
+                                # If cloud upload is requested, download and upload the subtitle
+                                upload = None
+                                if subtitle_cloud_upload:
+                                    upload = batch.submit_download(subtitle_data['url'], temp_dir)
+
+                                subtitle_uploads.append((lang, subtitle_data, upload))
                             except Exception as e:
-                                logger.error(f"Error processing thumbnail: {str(e)}")
+                                logger.error(f"Job {job_id}: Error processing subtitle: {str(e)}")
                                 continue
+                    else:
+                        logger.info(f"Job {job_id}: No subtitles found in info or download not requested")
 
-                # Process subtitles if available
-                if 'subtitles' in info and subtitle_options.get('download', False):
-                    logger.info(f"Job {job_id}: Found subtitles in info: {info['subtitles']}")
-                    response["subtitles"] = {}  # Changed from array to object
-                    requested_languages = subtitle_options.get('languages', [])
-                    requested_format = subtitle_options.get('format', 'srt')
-                    subtitle_cloud_upload = subtitle_options.get('cloud_upload', True)  # Default to True
-                    
-                    # If no languages specified, use all available languages
-                    if not requested_languages:
-                        requested_languages = list(info['subtitles'].keys())
-                        logger.info(f"Job {job_id}: No languages specified, using all available: {requested_languages}")
-                    
-                    for lang, subtitle_list in info['subtitles'].items():
-                        # Skip if language not in requested list
-                        if lang not in requested_languages:
-                            continue
-                            
+                if info.get('thumbnails') and thumbnail_options.get('download', False):
+                    response["thumbnails"] = []
+                    for thumbnail, upload in thumbnail_uploads:
                         try:
-                            logger.info(f"Job {job_id}: Processing subtitle for language {lang}")
-                            # Find the requested format
-                            subtitle_data = None
-                            for subtitle in subtitle_list:
-                                if subtitle['ext'] == requested_format:
-                                    subtitle_data = subtitle
-                                    break
-                                    
-                            if not subtitle_data:
-                                logger.warning(f"Job {job_id}: Requested format {requested_format} not available for {lang}")
-                                continue
-                            
-                            # If cloud upload is requested, download and upload the subtitle
-                            if subtitle_cloud_upload:
-                                try:
-                                    subtitle_path = download_file(subtitle_data['url'], temp_dir)
-                                    cloud_url = upload_file(subtitle_path)
-                                    subtitle_data['url'] = cloud_url
-                                except Exception as e:
-                                    logger.warning(f"Job {job_id}: Failed to download subtitle for {lang}: {str(e)}")
-                                    continue
-                            
-                            # Add subtitle data to response using language code as key
-                            response["subtitles"][lang] = subtitle_data
-                            logger.info(f"Job {job_id}: Successfully processed subtitle for {lang}")
+                            thumbnail_url = upload.result()
                         except Exception as e:
-                            logger.error(f"Job {job_id}: Error processing subtitle: {str(e)}")
+                            logger.error(f"Error processing thumbnail: {str(e)}")
                             continue
-                else:
-                    logger.info(f"Job {job_id}: No subtitles found in info or download not requested")
+
+                        response["thumbnails"].append({
+                            "id": thumbnail.get('id', 'default'),
+                            "image_url": thumbnail_url,
+                            "width": thumbnail.get('width'),
+                            "height": thumbnail.get('height'),
+                            "original_format": thumbnail.get('ext'),
+                            "converted": thumbnail.get('converted', False)
+                        })
+
+                if 'subtitles' in info and subtitle_options.get('download', False):
+                    response["subtitles"] = {}  # Changed from array to object
+                    for lang, subtitle_data, upload in subtitle_uploads:
+                        if upload is not None:
+                            try:
+                                subtitle_data['url'] = upload.result()
+                            except Exception as e:
+                                logger.warning(f"Job {job_id}: Failed to download or upload subtitle for {lang}: {str(e)}")
+                                continue
+
+                        # Add subtitle data to response using language code as key
+                        response["subtitles"][lang] = subtitle_data
+                        logger.info(f"Job {job_id}: Successfully processed subtitle for {lang}")
                 
                 return response, "/v1/media/download", 200
 
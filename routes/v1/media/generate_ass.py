@@ -2,6 +2,7 @@ from flask import Blueprint, jsonify, request
 from app_utils import validate_payload, queue_task_wrapper
 import logging
 from services.ass_toolkit import generate_ass_captions_v1
+from services.transcription_backends import MODEL_SIZES, BACKENDS
 from services.authentication import authenticate
 from services.cloud_storage import upload_file
 import os
@@ -18,6 +19,7 @@ logger = logging.getLogger(__name__)
         "media_url": {"type": "string", "format": "uri"},
         "canvas_width": {"type": "integer", "minimum": 1},
         "canvas_height": {"type": "integer", "minimum": 1},
+        "captions": {"type": "string"},
         "settings": {
             "type": "object",
             "properties": {
@@ -81,6 +83,8 @@ logger = logging.getLogger(__name__)
             }
         },
         "language": {"type": "string"},
+        "model": {"type": "string", "enum": MODEL_SIZES},
+        "backend": {"type": "string", "enum": list(BACKENDS)},
         "webhook_url": {"type": "string", "format": "uri"},
         "id": {"type": "string"}
     },
@@ -96,6 +100,7 @@ logger = logging.getLogger(__name__)
 @queue_task_wrapper(bypass_queue=False)
 def generate_ass_v1(job_id, data):
     media_url = data['media_url']
+    captions = data.get('captions')
     settings = data.get('settings', {})
     replace = data.get('replace', [])
     exclude_time_ranges = data.get('exclude_time_ranges', [])
@@ -104,6 +109,8 @@ def generate_ass_v1(job_id, data):
     language = data.get('language', 'auto')
     canvas_width = data.get('canvas_width')
     canvas_height = data.get('canvas_height')
+    model = data.get('model')
+    backend = data.get('backend')
 
     logger.info(f"Job {job_id}: Received ASS generation request for {media_url}")
     logger.info(f"Job {job_id}: Settings received: {settings}")
@@ -113,14 +120,16 @@ def generate_ass_v1(job_id, data):
     try:
         output = generate_ass_captions_v1(
             media_url,
-            captions=None,
+            captions=captions,
             settings=settings,
             replace=replace,
             exclude_time_ranges=exclude_time_ranges,
             job_id=job_id,
             language=language,
             PlayResX=canvas_width,
-            PlayResY=canvas_height
+            PlayResY=canvas_height,
+            model=model,
+            backend=backend
         )
         if isinstance(output, dict) and 'error' in output:
             if 'available_fonts' in output:
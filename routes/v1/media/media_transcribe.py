@@ -21,6 +21,7 @@ from app_utils import *
 import logging
 import os
 from services.v1.media.media_transcribe import process_transcribe_media
+from services.transcription_backends import MODEL_SIZES, BACKENDS
 from services.authentication import authenticate
 from services.cloud_storage import upload_file
 
@@ -42,7 +43,14 @@ logger = logging.getLogger(__name__)
         "language": {"type": "string"},
         "webhook_url": {"type": "string", "format": "uri"},
         "id": {"type": "string"},
-        "words_per_line": {"type": "integer", "minimum": 1}
+        "words_per_line": {"type": "integer", "minimum": 1},
+        "model": {"type": "string", "enum": MODEL_SIZES},
+        "backend": {"type": "string", "enum": list(BACKENDS)},
+        "long_form": {"type": "boolean"},
+        "progress_webhook_url": {"type": "string", "format": "uri"},
+        "vad": {"type": "boolean"},
+        "start": {"type": "number", "minimum": 0},
+        "end": {"type": "number", "exclusiveMinimum": 0}
     },
     "required": ["media_url"],
     "additionalProperties": False
@@ -60,11 +68,21 @@ def transcribe(job_id, data):
     webhook_url = data.get('webhook_url')
     id = data.get('id')
     words_per_line = data.get('words_per_line', None)
+    model = data.get('model')
+    backend = data.get('backend')
+    long_form = data.get('long_form', False)
+    progress_webhook_url = data.get('progress_webhook_url')
+    vad = data.get('vad', False)
+    start = data.get('start')
+    end = data.get('end')
 
     logger.info(f"Job {job_id}: Received transcription request for {media_url}")
 
+    if start is not None and end is not None and end <= start:
+        return "'end' must be greater than 'start'", "/v1/transcribe/media", 400
+
     try:
-        result = process_transcribe_media(media_url, task, include_text, include_srt, include_segments, word_timestamps, response_type, language, job_id, words_per_line)
+        result = process_transcribe_media(media_url, task, include_text, include_srt, include_segments, word_timestamps, response_type, language, job_id, words_per_line, model, backend, long_form, progress_webhook_url, id, vad=vad, start=start, end=end)
         logger.info(f"Job {job_id}: Transcription process completed successfully")
 
         # If the result is a file path, upload it using the unified upload_file() method
@@ -77,6 +95,7 @@ def transcribe(job_id, data):
                 "text_url": None,
                 "srt_url": None,
                 "segments_url": None,
+                **result[3]
             }
 
             return result_json, "/v1/transcribe/media", 200
@@ -90,6 +109,7 @@ def transcribe(job_id, data):
                 "text_url": upload_file(result[0]) if include_text is True else None,
                 "srt_url": upload_file(result[1]) if include_srt is True else None,
                 "segments_url": upload_file(result[2]) if include_segments is True else None,
+                **result[3]
             }
 
             if include_text is True:
@@ -0,0 +1,76 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+from flask import Blueprint
+from app_utils import *
+import logging
+from services.v1.media.batch_transcribe import transcribe_batch as run_batch_transcription
+from services.transcription_backends import MODEL_SIZES, BACKENDS
+from services.authentication import authenticate
+
+v1_media_transcribe_batch_bp = Blueprint('v1_media_transcribe_batch', __name__)
+logger = logging.getLogger(__name__)
+
+@v1_media_transcribe_batch_bp.route('/v1/media/transcribe/batch', methods=['POST'])
+@authenticate
+@validate_payload({
+    "type": "object",
+    "properties": {
+        "media_urls": {
+            "type": "array",
+            "items": {"type": "string", "format": "uri"},
+            "minItems": 1,
+            "maxItems": 1000
+        },
+        "task": {"type": "string", "enum": ["transcribe", "translate"]},
+        "language": {"type": "string"},
+        "word_timestamps": {"type": "boolean"},
+        "include_srt": {"type": "boolean"},
+        "include_segments": {"type": "boolean"},
+        "model": {"type": "string", "enum": MODEL_SIZES},
+        "backend": {"type": "string", "enum": list(BACKENDS)},
+        "progress_webhook_url": {"type": "string", "format": "uri"},
+        "webhook_url": {"type": "string", "format": "uri"},
+        "id": {"type": "string"}
+    },
+    "required": ["media_urls"],
+    "additionalProperties": False
+})
+@queue_task_wrapper(bypass_queue=False)
+def transcribe_batch(job_id, data):
+    """Transcribe many media files in one job on a single warm model."""
+    media_urls = data['media_urls']
+
+    logger.info(f"Job {job_id}: Received batch transcription request for {len(media_urls)} files")
+
+    try:
+        result = run_batch_transcription(
+            media_urls, job_id,
+            task=data.get('task', 'transcribe'),
+            language=data.get('language'),
+            word_timestamps=data.get('word_timestamps', False),
+            include_srt=data.get('include_srt', False),
+            include_segments=data.get('include_segments', False),
+            model=data.get('model'),
+            backend=data.get('backend'),
+            progress_webhook_url=data.get('progress_webhook_url'),
+            request_id=data.get('id')
+        )
+        return result, "/v1/media/transcribe/batch", 200
+
+    except Exception as e:
+        logger.error(f"Job {job_id}: Error during batch transcription - {str(e)}")
+        return str(e), "/v1/media/transcribe/batch", 500
@@ -0,0 +1,168 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+from queue import Queue, Empty
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from app_utils import validate_payload, log_job_status
+from services.authentication import authenticate
+from services.thread_budget import job_budget
+from services.v1.media.media_transcribe import process_transcribe_media
+from services.transcription_backends import MODEL_SIZES, BACKENDS
+from version import BUILD_NUMBER
+from config import TRANSCRIBE_STREAM_MAX_CONCURRENT
+
+v1_media_transcribe_stream_bp = Blueprint('v1_media_transcribe_stream', __name__)
+logger = logging.getLogger(__name__)
+
+ENDPOINT = "/v1/media/transcribe/stream"
+KEEPALIVE_INTERVAL = 15  # seconds; keeps proxies from closing an idle stream while a model loads
+
+# Bounds the transcriptions this worker runs outside the job queue
+_stream_slots = threading.BoundedSemaphore(max(1, TRANSCRIBE_STREAM_MAX_CONCURRENT))
+
+def format_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@v1_media_transcribe_stream_bp.route(ENDPOINT, methods=['POST'])
+@authenticate
+@validate_payload({
+    "type": "object",
+    "properties": {
+        "media_url": {"type": "string", "format": "uri"},
+        "task": {"type": "string", "enum": ["transcribe", "translate"]},
+        "include_srt": {"type": "boolean"},
+        "word_timestamps": {"type": "boolean"},
+        "language": {"type": "string"},
+        "words_per_line": {"type": "integer", "minimum": 1},
+        "model": {"type": "string", "enum": MODEL_SIZES},
+        "backend": {"type": "string", "enum": list(BACKENDS)},
+        "long_form": {"type": "boolean"},
+        "vad": {"type": "boolean"},
+        "start": {"type": "number", "minimum": 0},
+        "end": {"type": "number", "exclusiveMinimum": 0},
+        "progress_webhook_url": {"type": "string", "format": "uri"},
+        "id": {"type": "string"}
+    },
+    "required": ["media_url"],
+    "additionalProperties": False
+})
+def transcribe_stream():
+    """
+    Transcribe media and stream segments as Server-Sent Events while they are
+    decoded. Runs outside the job queue, since the client holds the connection,
+    but at most TRANSCRIBE_STREAM_MAX_CONCURRENT at a time per worker; progress
+    is still recorded in the job status under the returned job_id.
+    """
+    data = request.json
+    if data.get('start') is not None and data.get('end') is not None and data['end'] <= data['start']:
+        return jsonify({"message": "Invalid payload: 'end' must be greater than 'start'"}), 400
+
+    if not _stream_slots.acquire(blocking=False):
+        return jsonify({
+            "code": 429,
+            "id": data.get('id'),
+            "message": f"TRANSCRIBE_STREAM_MAX_CONCURRENT ({TRANSCRIBE_STREAM_MAX_CONCURRENT}) reached",
+            "build_number": BUILD_NUMBER
+        }), 429
+
+    job_id = str(uuid.uuid4())
+    media_url = data['media_url']
+    start_time = time.time()
+    events = Queue()
+
+    logger.info(f"Job {job_id}: Received streaming transcription request for {media_url}")
+    try:
+        log_job_status(job_id, {
+            "job_status": "running",
+            "job_id": job_id,
+            "queue_id": None,
+            "process_id": os.getpid(),
+            "response": None
+        })
+    except Exception:
+        _stream_slots.release()
+        raise
+
+    def run():
+        try:
+            run_transcription()
+        finally:
+            _stream_slots.release()
+
+    def run_transcription():
+        try:
+            with job_budget(job_id):
+                text, srt_text, _, metadata = process_transcribe_media(
+                    media_url, data.get('task', 'transcribe'), True, data.get('include_srt', False), False,
+                    data.get('word_timestamps', False), "direct", data.get('language'), job_id,
+                    data.get('words_per_line'), data.get('model'), data.get('backend'), data.get('long_form', False),
+                    data.get('progress_webhook_url'), data.get('id'),
+                    on_segment=lambda segment: events.put(("segment", segment)), vad=data.get('vad', False),
+                    start=data.get('start'), end=data.get('end')
+                )
+            code, response, message = 200, dict({"text": text, "srt": srt_text}, **metadata), "success"
+        except Exception as e:
+            logger.error(f"Job {job_id}: Error during streaming transcription - {str(e)}")
+            code, response, message = 500, None, str(e)
+
+        run_time = round(time.time() - start_time, 3)
+        log_job_status(job_id, {
+            "job_status": "done",
+            "job_id": job_id,
+            "queue_id": None,
+            "process_id": os.getpid(),
+            "response": {
+                "endpoint": ENDPOINT,
+                "code": code,
+                "id": data.get('id'),
+                "job_id": job_id,
+                "response": response,
+                "message": message,
+                "run_time": run_time,
+                "build_number": BUILD_NUMBER
+            }
+        })
+        if code == 200:
+            events.put(("done", dict(response, job_id=job_id, id=data.get('id'), run_time=run_time)))
+        else:
+            events.put(("error", {"job_id": job_id, "id": data.get('id'), "message": message}))
+
+    # Transcription runs on its own thread so a client that disconnects does not
+    # abort it; the result still lands in the job status and transcript cache
+    threading.Thread(target=run, daemon=True).start()
+
+    def generate():
+        yield format_event("start", {"job_id": job_id, "id": data.get('id')})
+        while True:
+            try:
+                event, payload = events.get(timeout=KEEPALIVE_INTERVAL)
+            except Empty:
+                yield ": keep-alive\n\n"
+                continue
+            yield format_event(event, payload)
+            if event in ("done", "error"):
+                return
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
@@ -19,9 +19,13 @@
 from flask import Blueprint, jsonify
 from app_utils import validate_payload, queue_task_wrapper
 import logging
-from services.ass_toolkit import generate_ass_captions_v1
+from services.ass_toolkit import generate_ass_captions_v1, prepare_caption_options
+from services.transcription_backends import MODEL_SIZES, BACKENDS
 from services.authentication import authenticate
 from services.cloud_storage import upload_file
+from services.file_management import download_file
+from services.v1.ffmpeg.parallel_encode import encode_chunked
+from config import LOCAL_STORAGE_PATH
 import os
 import requests  # Ensure requests is imported for webhook handling
 
@@ -99,7 +103,10 @@ logger = logging.getLogger(__name__)
         },
         "webhook_url": {"type": "string", "format": "uri"},
         "id": {"type": "string"},
-        "language": {"type": "string"}
+        "language": {"type": "string"},
+        "model": {"type": "string", "enum": MODEL_SIZES},
+        "backend": {"type": "string", "enum": list(BACKENDS)},
+        "parallel_encode": {"type": "boolean"}
     },
     "required": ["video_url"],
     "additionalProperties": False
@@ -114,19 +121,39 @@ def caption_video_v1(job_id, data):
     webhook_url = data.get('webhook_url')
     id = data.get('id')
     language = data.get('language', 'auto')
+    model = data.get('model')
+    backend = data.get('backend')
+    parallel_encode = data.get('parallel_encode', False)
 
     logger.info(f"Job {job_id}: Received v1 captioning request for {video_url}")
     logger.info(f"Job {job_id}: Settings received: {settings}")
     logger.info(f"Job {job_id}: Replace rules received: {replace}")
     logger.info(f"Job {job_id}: Exclude time ranges received: {exclude_time_ranges}")
 
+    video_path = None
+    ass_path = None
     try:
+        # Reject bad settings, replace rules and unknown fonts before fetching any media
+        _, error = prepare_caption_options(settings, replace, exclude_time_ranges, job_id)
+        if error:
+            return error, "/v1/video/caption", 400
+
+        # Fetch the video once: the resolution probe, the transcription's audio
+        # extraction and the render below all read this local copy
+        try:
+            video_path = download_file(video_url, LOCAL_STORAGE_PATH)
+            logger.info(f"Job {job_id}: Video downloaded to {video_path}")
+        except Exception as e:
+            logger.error(f"Job {job_id}: Video download error: {str(e)}")
+            return {"error": str(e)}, "/v1/video/caption", 500
+
         # Do NOT combine position and alignment. Keep them separate.
         # Just pass settings directly to process_captioning_v1.
         # This ensures position and alignment remain independent keys.
         
         # Process video with the enhanced v1 service
-        output = generate_ass_captions_v1(video_url, captions, settings, replace, exclude_time_ranges, job_id, language)
+        output = generate_ass_captions_v1(video_url, captions, settings, replace, exclude_time_ranges, job_id, language,
+                                          model=model, backend=backend, video_path=video_path)
         
         if isinstance(output, dict) and 'error' in output:
             # Check if this is a font-related error by checking for 'available_fonts' key
@@ -145,33 +172,26 @@ def caption_video_v1(job_id, data):
         output_filename = f"{job_id}_captioned.mp4"
         output_path = os.path.join(os.path.dirname(ass_path), output_filename)
 
-        # Download the video (if not already local)
-        video_path = None
-        try:
-            from services.file_management import download_file
-            from config import LOCAL_STORAGE_PATH
-            video_path = download_file(video_url, LOCAL_STORAGE_PATH)
-            logger.info(f"Job {job_id}: Video downloaded to {video_path}")
-        except Exception as e:
-            logger.error(f"Job {job_id}: Video download error: {str(e)}")
-            return {"error": str(e)}, "/v1/video/caption", 500
-
         # Render the video with subtitles using FFmpeg
         try:
-            import ffmpeg
-            ffmpeg.input(video_path).output(
-                output_path,
-                vf=f"subtitles='{ass_path}'",
-                acodec='copy'
-            ).run(overwrite_output=True)
+            if parallel_encode:
+                # ASS burn-in is time-local, so each chunk renders its own span of the subtitles
+                encode_chunked(video_path, output_path, ['-c:v', 'libx264'], ['-c:a', 'copy'],
+                               video_filter=f"subtitles='{ass_path}'", job_id=job_id)
+            else:
+                import ffmpeg
+                from services import thread_budget
+                ffmpeg.input(video_path).output(
+                    output_path,
+                    vf=f"subtitles='{ass_path}'",
+                    acodec='copy',
+                    **thread_budget.ffmpeg_output_options()
+                ).global_args(*thread_budget.ffmpeg_global_args()).run(overwrite_output=True)
             logger.info(f"Job {job_id}: FFmpeg processing completed. Output saved to {output_path}")
         except Exception as e:
             logger.error(f"Job {job_id}: FFmpeg error: {str(e)}")
             return {"error": f"FFmpeg error: {str(e)}"}, "/v1/video/caption", 500
 
-        # Clean up the ASS file after use
-        os.remove(ass_path)
-
         # Upload the captioned video
         cloud_url = upload_file(output_path)
         logger.info(f"Job {job_id}: Captioned video uploaded to cloud storage: {cloud_url}")
@@ -185,3 +205,9 @@ def caption_video_v1(job_id, data):
     except Exception as e:
         logger.error(f"Job {job_id}: Error during captioning process - {str(e)}", exc_info=True)
         return {"error": str(e)}, "/v1/video/caption", 500
+
+    finally:
+        # The downloaded source and the ASS file are only needed for this job
+        for path in (video_path, ass_path):
+            if path and os.path.exists(path):
+                os.remove(path)
@@ -19,7 +19,9 @@
 from flask import Blueprint
 from app_utils import *
 import logging
+import os
 from services.v1.video.split import split_video
+from services.cloud_storage import UploadBatch
 from services.authentication import authenticate
 
 v1_video_split_bp = Blueprint('v1_video_split', __name__)
@@ -71,36 +73,32 @@ def video_split(job_id, data):
     logger.info(f"Job {job_id}: Received video split request for {video_url}")
     
     try:
-        # Process the video file and get list of output files
-        output_files, input_filename = split_video(
-            video_url=video_url,
-            splits=splits,
-            job_id=job_id,
-            video_codec=video_codec,
-            video_preset=video_preset,
-            video_crf=video_crf,
-            audio_codec=audio_codec,
-            audio_bitrate=audio_bitrate
-        )
-        
-        # Upload all output files to cloud storage
-        from services.cloud_storage import upload_file
-        result_files = []
-        
-        for i, output_file in enumerate(output_files):
-            cloud_url = upload_file(output_file)
-            result_files.append({
+        # Each split starts uploading as soon as it is encoded
+        with UploadBatch(remove_after_upload=True) as batch:
+            output_files, input_filename = split_video(
+                video_url=video_url,
+                splits=splits,
+                job_id=job_id,
+                video_codec=video_codec,
+                video_preset=video_preset,
+                video_crf=video_crf,
+                audio_codec=audio_codec,
+                audio_bitrate=audio_bitrate,
+                on_output=batch.submit
+            )
+            cloud_urls = batch.results()
+        logger.info(f"Job {job_id}: Uploaded and removed {len(cloud_urls)} split files")
+
+        result_files = [
+            {
                 "file_url": cloud_url,
                 "start": splits[i]["start"],
                 "end": splits[i]["end"]
-            })
-            # Remove the local file after upload
-            import os
-            os.remove(output_file)
-            logger.info(f"Job {job_id}: Uploaded and removed split file {i+1}")
+            }
+            for i, cloud_url in enumerate(cloud_urls)
+        ]
         
         # Clean up input file
-        import os
         os.remove(input_filename)
         logger.info(f"Job {job_id}: Removed input file")
         
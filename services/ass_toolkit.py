@@ -20,11 +20,11 @@ import os
 import ffmpeg
 import logging
 import subprocess
-import whisper
 from datetime import timedelta
 import srt
 import re
-from services.file_management import download_file
+from services import whisper_models, transcript_cache, font_index
+from services.audio_ingest import get_audio
 from services.cloud_storage import upload_file  # Ensure this import is present
 import requests  # Ensure requests is imported for webhook handling
 from urllib.parse import urlparse
@@ -62,23 +62,32 @@ def rgb_to_ass_color(rgb_color):
             return f"&H00{b:02X}{g:02X}{r:02X}"
     return "&H00FFFFFF"
 
-def generate_transcription(video_path, language='auto'):
+def generate_transcription(video_path, language='auto', model=None, backend=None, cache_key=None):
     try:
-        model = whisper.load_model("base")
+        # Decode the audio once to shared 16 kHz mono PCM (keyed on the source URL when given)
+        audio = get_audio(video_path, cache_key=cache_key)
         transcription_options = {
             'word_timestamps': True,
             'verbose': True,
         }
         if language != 'auto':
             transcription_options['language'] = language
-        result = model.transcribe(video_path, **transcription_options)
+        result = transcript_cache.get_or_transcribe(
+            audio,
+            lambda: whisper_models.transcribe(audio, model_name=model, backend=backend, **transcription_options),
+            model_name=model, backend=backend, **transcription_options
+        )
         logger.info(f"Transcription generated successfully for video: {video_path}")
         return result
     except Exception as e:
         logger.error(f"Error in transcription: {str(e)}")
         raise
 
-def get_video_resolution(video_path):
+def get_video_resolution(video_path, raise_errors=False):
+    """
+    Width and height of the first video stream, or 384x288 when there is none.
+    A file that cannot be probed also falls back to 384x288, unless raise_errors is set.
+    """
     try:
         probe = ffmpeg.probe(video_path)
         video_streams = [s for s in probe['streams'] if s['codec_type'] == 'video']
@@ -91,27 +100,14 @@ def get_video_resolution(video_path):
             logger.warning(f"No video streams found for {video_path}. Using default resolution 384x288.")
             return 384, 288
     except Exception as e:
+        if raise_errors:
+            raise
         logger.error(f"Error getting video resolution: {str(e)}. Using default resolution 384x288.")
         return 384, 288
 
 def get_available_fonts():
     """Get the list of available fonts on the system."""
-    try:
-        import matplotlib.font_manager as fm
-    except ImportError:
-        logger.error("matplotlib not installed. Install via 'pip install matplotlib'.")
-        return []
-    font_list = fm.findSystemFonts(fontpaths=None, fontext='ttf')
-    font_names = set()
-    for font in font_list:
-        try:
-            font_prop = fm.FontProperties(fname=font)
-            font_name = font_prop.get_name()
-            font_names.add(font_name)
-        except Exception:
-            continue
-    logger.info(f"Available fonts retrieved: {font_names}")
-    return list(font_names)
+    return font_index.get_families()
 
 def format_ass_time(seconds):
     """Convert float seconds to ASS time format H:MM:SS.cc"""
@@ -121,10 +117,44 @@ def format_ass_time(seconds):
     centiseconds = int(round((seconds - int(seconds)) * 100))
     return f"{hours}:{minutes:02}:{secs:02}.{centiseconds:02}"
 
-def process_subtitle_text(text, replace_dict, all_caps, max_words_per_line):
+class TextReplacer:
+    """
+    Case-insensitive find/replace for caption text, built once per request.
+
+    All 'find' terms are compiled into a single alternation, longest first, so
+    each text is scanned once however many terms there are. Replacements are
+    literal and are not scanned again for further matches.
+    """
+
+    def __init__(self, replace_dict):
+        self.replacements = {}
+        for old_word, new_word in replace_dict.items():
+            if old_word:
+                # The first entry wins when two terms differ only in case
+                self.replacements.setdefault(old_word.lower(), new_word)
+        self.pattern = None
+        if self.replacements:
+            terms = sorted(self.replacements, key=len, reverse=True)
+            self.pattern = re.compile('|'.join(re.escape(term) for term in terms), re.IGNORECASE)
+
+    def _replacement(self, match):
+        matched = match.group(0)
+        replacement = self.replacements.get(matched.lower())
+        if replacement is None:
+            # Case-insensitive matching folds a few characters that lower() does not (e.g. 'ſ' and 's');
+            # leave the text as it was if no term maps back to it
+            replacement = next((new_word for term, new_word in self.replacements.items()
+                                if re.fullmatch(re.escape(term), matched, re.IGNORECASE)), matched)
+        return replacement
+
+    def __call__(self, text):
+        if self.pattern is None or not text:
+            return text
+        return self.pattern.sub(self._replacement, text)
+
+def process_subtitle_text(text, replacer, all_caps, max_words_per_line):
     """Apply text transformations: replacements, all caps, and optional line splitting."""
-    for old_word, new_word in replace_dict.items():
-        text = re.sub(re.escape(old_word), new_word, text, flags=re.IGNORECASE)
+    text = replacer(text)
     if all_caps:
         text = text.upper()
     if max_words_per_line > 0:
@@ -248,10 +278,9 @@ def create_style_line(style_options, video_resolution):
     Create the style line for ASS subtitles.
     """
     font_family = style_options.get('font_family', 'Arial')
-    available_fonts = get_available_fonts()
-    if font_family not in available_fonts:
+    if not font_index.has_family(font_family):
         logger.warning(f"Font '{font_family}' not found.")
-        return {'error': f"Font '{font_family}' not available.", 'available_fonts': available_fonts}
+        return {'error': f"Font '{font_family}' not available.", 'available_fonts': get_available_fonts()}
 
     line_color = rgb_to_ass_color(style_options.get('line_color', '#FFFFFF'))
     secondary_color = line_color
@@ -311,7 +340,7 @@ Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour,
 
 ### STYLE HANDLERS ###
 
-def handle_classic(transcription_result, style_options, replace_dict, video_resolution):
+def handle_classic(transcription_result, style_options, replacer, video_resolution):
     """
     Classic style handler: Centers the text based on position and alignment.
     """
@@ -337,7 +366,7 @@ def handle_classic(transcription_result, style_options, replace_dict, video_reso
     for segment in transcription_result['segments']:
         text = segment['text'].strip().replace('\n', ' ')
         lines = split_lines(text, max_words_per_line)
-        processed_text = '\\N'.join(process_subtitle_text(line, replace_dict, all_caps, 0) for line in lines)
+        processed_text = '\\N'.join(process_subtitle_text(line, replacer, all_caps, 0) for line in lines)
         start_time = format_ass_time(segment['start'])
         end_time = format_ass_time(segment['end'])
         position_tag = f"{{\\an{an_code}\\pos({final_x},{final_y})}}"
@@ -345,7 +374,7 @@ def handle_classic(transcription_result, style_options, replace_dict, video_reso
     logger.info(f"Handled {len(events)} dialogues in classic style.")
     return "\n".join(events)
 
-def handle_karaoke(transcription_result, style_options, replace_dict, video_resolution):
+def handle_karaoke(transcription_result, style_options, replacer, video_resolution):
     """
     Karaoke style handler: Highlights words as they are spoken.
     """
@@ -379,7 +408,7 @@ def handle_karaoke(transcription_result, style_options, replace_dict, video_reso
             current_line = []
             current_line_words = 0
             for w_info in words:
-                w = process_subtitle_text(w_info.get('word', ''), replace_dict, all_caps, 0)
+                w = process_subtitle_text(w_info.get('word', ''), replacer, all_caps, 0)
                 duration_cs = int(round((w_info['end'] - w_info['start']) * 100))
                 highlighted_word = f"{{\\k{duration_cs}}}{w} "
                 current_line.append(highlighted_word)
@@ -393,7 +422,7 @@ def handle_karaoke(transcription_result, style_options, replace_dict, video_reso
         else:
             line_content = []
             for w_info in words:
-                w = process_subtitle_text(w_info.get('word', ''), replace_dict, all_caps, 0)
+                w = process_subtitle_text(w_info.get('word', ''), replacer, all_caps, 0)
                 duration_cs = int(round((w_info['end'] - w_info['start']) * 100))
                 highlighted_word = f"{{\\k{duration_cs}}}{w} "
                 line_content.append(highlighted_word)
@@ -407,7 +436,7 @@ def handle_karaoke(transcription_result, style_options, replace_dict, video_reso
     logger.info(f"Handled {len(events)} dialogues in karaoke style.")
     return "\n".join(events)
 
-def handle_highlight(transcription_result, style_options, replace_dict, video_resolution):
+def handle_highlight(transcription_result, style_options, replacer, video_resolution):
     """
     Highlight style handler: Highlights words sequentially.
     """
@@ -441,7 +470,7 @@ def handle_highlight(transcription_result, style_options, replace_dict, video_re
         # Process all words in the segment
         processed_words = []
         for w_info in words:
-            w = process_subtitle_text(w_info.get('word', ''), replace_dict, all_caps, 0)
+            w = process_subtitle_text(w_info.get('word', ''), replacer, all_caps, 0)
             if w:
                 processed_words.append((w, w_info['start'], w_info['end']))
 
@@ -487,7 +516,7 @@ def handle_highlight(transcription_result, style_options, replace_dict, video_re
     logger.info(f"Handled {len(events)} dialogues in highlight style.")
     return "\n".join(events)
 
-def handle_underline(transcription_result, style_options, replace_dict, video_resolution):
+def handle_underline(transcription_result, style_options, replacer, video_resolution):
     """
     Underline style handler: Underlines the current word.
     """
@@ -517,7 +546,7 @@ def handle_underline(transcription_result, style_options, replace_dict, video_re
             continue
         processed_words = []
         for w_info in words:
-            w = process_subtitle_text(w_info.get('word', ''), replace_dict, all_caps, 0)
+            w = process_subtitle_text(w_info.get('word', ''), replacer, all_caps, 0)
             if w:
                 processed_words.append((w, w_info['start'], w_info['end']))
 
@@ -545,7 +574,7 @@ def handle_underline(transcription_result, style_options, replace_dict, video_re
     logger.info(f"Handled {len(events)} dialogues in underline style.")
     return "\n".join(events)
 
-def handle_word_by_word(transcription_result, style_options, replace_dict, video_resolution):
+def handle_word_by_word(transcription_result, style_options, replacer, video_resolution):
     """
     Word-by-Word style handler: Displays each word individually.
     """
@@ -581,7 +610,7 @@ def handle_word_by_word(transcription_result, style_options, replace_dict, video
 
         for word_group in grouped_words:
             for w_info in word_group:
-                w = process_subtitle_text(w_info.get('word', ''), replace_dict, all_caps, 0)
+                w = process_subtitle_text(w_info.get('word', ''), replacer, all_caps, 0)
                 if not w:
                     continue
                 start_time = format_ass_time(w_info['start'])
@@ -639,7 +668,8 @@ def srt_to_ass(transcription_result, style_type, settings, replace_dict, video_r
         logger.warning(f"Unknown style '{style_type}', defaulting to 'classic'.")
         handler = handle_classic
 
-    dialogue_lines = handler(transcription_result, style_options, replace_dict, video_resolution)
+    # Compile the replacements once for every caption line in the request
+    dialogue_lines = handler(transcription_result, style_options, TextReplacer(replace_dict), video_resolution)
     logger.info("Converted transcription result to ASS format.")
     return ass_header + dialogue_lines + "\n"
 
@@ -737,50 +767,71 @@ def normalize_exclude_time_ranges(exclude_time_ranges):
         norm.append({"start": start, "end": end})
     return norm
 
-def generate_ass_captions_v1(video_url, captions, settings, replace, exclude_time_ranges, job_id, language='auto', PlayResX=None, PlayResY=None):
+def prepare_caption_options(settings, replace, exclude_time_ranges, job_id):
     """
-    Captioning process with transcription fallback and multiple styles.
-    Integrates with the updated logic for positioning and alignment.
-    If PlayResX and PlayResY are provided, use them for ASS generation; otherwise, get from video.
+    Validate and normalize the styling inputs. Touches no media, so callers can
+    run it before fetching anything.
+
+    Returns:
+        tuple: ((style_options, replace_dict, exclude_time_ranges), None) on success,
+            or (None, error dict) when the input is invalid or the font is not installed
     """
-    try:
-        # Normalize exclude_time_ranges to ensure start/end are floats
-        if exclude_time_ranges:
+    # Normalize exclude_time_ranges to ensure start/end are floats
+    if exclude_time_ranges:
+        try:
             exclude_time_ranges = normalize_exclude_time_ranges(exclude_time_ranges)
+        except ValueError as e:
+            logger.error(f"Job {job_id}: Invalid exclude_time_ranges: {str(e)}")
+            return None, {"error": str(e)}
+
+    if not isinstance(settings, dict):
+        logger.error(f"Job {job_id}: 'settings' should be a dictionary.")
+        return None, {"error": "'settings' should be a dictionary."}
+
+    # Normalize keys by replacing hyphens with underscores
+    style_options = {k.replace('-', '_'): v for k, v in settings.items()}
+
+    if not isinstance(replace, list):
+        logger.error(f"Job {job_id}: 'replace' should be a list of objects with 'find' and 'replace' keys.")
+        return None, {"error": "'replace' should be a list of objects with 'find' and 'replace' keys."}
+
+    # Convert 'replace' list to dictionary
+    replace_dict = {}
+    for item in replace:
+        if 'find' in item and 'replace' in item:
+            replace_dict[item['find']] = item['replace']
+        else:
+            logger.warning(f"Job {job_id}: Invalid replace item {item}. Skipping.")
 
-        if not isinstance(settings, dict):
-            logger.error(f"Job {job_id}: 'settings' should be a dictionary.")
-            return {"error": "'settings' should be a dictionary."}
-
-        # Normalize keys by replacing hyphens with underscores
-        style_options = {k.replace('-', '_'): v for k, v in settings.items()}
-
-        if not isinstance(replace, list):
-            logger.error(f"Job {job_id}: 'replace' should be a list of objects with 'find' and 'replace' keys.")
-            return {"error": "'replace' should be a list of objects with 'find' and 'replace' keys."}
-
-        # Convert 'replace' list to dictionary
-        replace_dict = {}
-        for item in replace:
-            if 'find' in item and 'replace' in item:
-                replace_dict[item['find']] = item['replace']
-            else:
-                logger.warning(f"Job {job_id}: Invalid replace item {item}. Skipping.")
+    # Handle deprecated 'highlight_color' by merging it into 'word_color'
+    if 'highlight_color' in style_options:
+        logger.warning(f"Job {job_id}: 'highlight_color' is deprecated; merging into 'word_color'.")
+        style_options['word_color'] = style_options.pop('highlight_color')
 
-        # Handle deprecated 'highlight_color' by merging it into 'word_color'
-        if 'highlight_color' in style_options:
-            logger.warning(f"Job {job_id}: 'highlight_color' is deprecated; merging into 'word_color'.")
-            style_options['word_color'] = style_options.pop('highlight_color')
+    # Check font availability
+    font_family = style_options.get('font_family', 'Arial')
+    if not font_index.has_family(font_family):
+        logger.warning(f"Job {job_id}: Font '{font_family}' not found.")
+        # Return font error with available_fonts
+        return None, {"error": f"Font '{font_family}' not available.", "available_fonts": get_available_fonts()}
 
-        # Check font availability
-        font_family = style_options.get('font_family', 'Arial')
-        available_fonts = get_available_fonts()
-        if font_family not in available_fonts:
-            logger.warning(f"Job {job_id}: Font '{font_family}' not found.")
-            # Return font error with available_fonts
-            return {"error": f"Font '{font_family}' not available.", "available_fonts": available_fonts}
+    logger.info(f"Job {job_id}: Font '{font_family}' is available.")
+    return (style_options, replace_dict, exclude_time_ranges), None
 
-        logger.info(f"Job {job_id}: Font '{font_family}' is available.")
+def generate_ass_captions_v1(video_url, captions, settings, replace, exclude_time_ranges, job_id, language='auto', PlayResX=None, PlayResY=None, model=None, backend=None, video_path=None):
+    """
+    Captioning process with transcription fallback and multiple styles.
+    Integrates with the updated logic for positioning and alignment.
+    If PlayResX and PlayResY are provided, use them for ASS generation; otherwise, get from video.
+    If video_path is given, that local copy of video_url is read; otherwise nothing is
+    downloaded: the resolution comes from a remote ffprobe of the header and a
+    transcription extracts only the audio track from the URL.
+    """
+    try:
+        options, error = prepare_caption_options(settings, replace, exclude_time_ranges, job_id)
+        if error:
+            return error
+        style_options, replace_dict, exclude_time_ranges = options
 
         # Determine if captions is a URL or raw content
         if captions and is_url(captions):
@@ -796,21 +847,23 @@ def generate_ass_captions_v1(video_url, captions, settings, replace, exclude_tim
         else:
             captions_content = None
 
-        # Download the video
-        try:
-            video_path = download_file(video_url, LOCAL_STORAGE_PATH)
-            logger.info(f"Job {job_id}: Video downloaded to {video_path}")
-        except Exception as e:
-            logger.error(f"Job {job_id}: Video download error: {str(e)}")
-            # For non-font errors, do NOT include available_fonts
-            return {"error": str(e)}
+        # Read the media where it is, unless the caller already has a local copy
+        source = video_path or video_url
 
         # Get video resolution, unless provided
         if PlayResX is not None and PlayResY is not None:
             video_resolution = (PlayResX, PlayResY)
             logger.info(f"Job {job_id}: Using provided PlayResX/PlayResY = {PlayResX}x{PlayResY}")
         else:
-            video_resolution = get_video_resolution(video_path)
+            # ffprobe reads only the container header, over HTTP range requests for a URL.
+            # With nothing downloaded, a failed probe is the only sign of a bad URL
+            try:
+                video_resolution = get_video_resolution(source, raise_errors=video_path is None)
+            except Exception as e:
+                stderr = getattr(e, 'stderr', None)
+                detail = stderr.decode('utf-8', 'replace').strip() if isinstance(stderr, bytes) else str(e)
+                logger.error(f"Job {job_id}: Could not read media from {video_url}: {detail}")
+                return {"error": f"Could not read media from {video_url}: {detail}"}
             logger.info(f"Job {job_id}: Video resolution detected = {video_resolution[0]}x{video_resolution[1]}")
 
         # Determine style type
@@ -840,7 +893,7 @@ def generate_ass_captions_v1(video_url, captions, settings, replace, exclude_tim
         else:
             # No captions provided, generate transcription
             logger.info(f"Job {job_id}: No captions provided, generating transcription.")
-            transcription_result = generate_transcription(video_path, language=language)
+            transcription_result = generate_transcription(source, language=language, model=model, backend=backend, cache_key=video_url)
             # Generate ASS based on chosen style
             subtitle_content = process_subtitle_events(transcription_result, style_type, style_options, replace_dict, video_resolution)
             subtitle_type = 'ass'
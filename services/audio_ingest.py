@@ -0,0 +1,265 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+# Audio-only ingest.
+#
+# Speech and audio analysis only need 16 kHz mono audio, so instead of
+# downloading whole (often video) files, ffmpeg reads the source URL and
+# writes just the first audio track as raw float32 PCM. The result is cached
+# per source under LOCAL_STORAGE_PATH/audio_cache and opened as a NumPy
+# memmap, so transcription, silence detection and other analysis share one
+# decode and page the samples in from disk instead of copying them.
+#
+# The modification time of the PCM file is the entry's last use: every hit
+# touches it, and both expiry (AUDIO_CACHE_TTL) and size pruning read it.
+
+import os
+import json
+import time
+import uuid
+import hashlib
+import logging
+import threading
+import subprocess
+import numpy as np
+from config import LOCAL_STORAGE_PATH, AUDIO_CACHE_TTL, AUDIO_CACHE_MAX_BYTES
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+SAMPLE_DTYPE = np.float32
+PCM_FORMAT = 'f32le'  # ffmpeg name for SAMPLE_DTYPE
+CACHE_DIR = os.path.join(LOCAL_STORAGE_PATH, 'audio_cache')
+
+_key_locks = {}
+_key_locks_lock = threading.Lock()
+
+def get_source_key(source):
+    """
+    Cache key for a source. URLs are keyed by the URL itself (an entry unused
+    for AUDIO_CACHE_TTL is decoded again); local files also include size and
+    modification time.
+    """
+    identity = source
+    if os.path.exists(source):
+        stat = os.stat(source)
+        identity = f"{os.path.abspath(source)}:{stat.st_size}:{stat.st_mtime_ns}"
+    return hashlib.sha256(identity.encode('utf-8')).hexdigest()
+
+def _cache_paths(key):
+    return os.path.join(CACHE_DIR, f"{key}.pcm"), os.path.join(CACHE_DIR, f"{key}.json")
+
+def _read_sidecar(key):
+    """Return the sidecar for a complete cache entry, or None."""
+    pcm_path, meta_path = _cache_paths(key)
+    try:
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+        stat = os.stat(pcm_path)
+    except (OSError, ValueError):
+        return None
+    if stat.st_size != meta.get('samples', -1) * np.dtype(SAMPLE_DTYPE).itemsize:
+        return None
+    if time.time() - stat.st_mtime > AUDIO_CACHE_TTL:
+        return None
+    return meta
+
+def _touch(pcm_path):
+    """Mark a cache entry as used now, for expiry and pruning alike."""
+    try:
+        os.utime(pcm_path)
+    except FileNotFoundError:
+        pass
+
+def _key_lock(key):
+    with _key_locks_lock:
+        return _key_locks.setdefault(key, threading.Lock())
+
+def _format_window(start, end):
+    return f"{start or 0:.3f}-{'' if end is None else f'{end:.3f}'}"
+
+def _copy_window(full_pcm_path, temp_path, start, end):
+    """Cut a window out of an already cached full decode instead of fetching it again."""
+    audio = np.memmap(full_pcm_path, dtype=SAMPLE_DTYPE, mode='r')
+    first = int((start or 0) * SAMPLE_RATE)
+    last = len(audio) if end is None else min(len(audio), int(end * SAMPLE_RATE))
+    with open(temp_path, 'wb') as f:
+        audio[first:max(first, last)].tofile(f)
+
+def extract_pcm(source, cache_key=None, job_id=None, start=None, end=None):
+    """
+    Decode the first audio track of a URL or local file to cached 16 kHz mono PCM.
+
+    Args:
+        source (str): Media URL or local path, read directly by ffmpeg
+        cache_key (str, optional): Source to key the cache on, e.g. the original
+            URL when `source` is a local download of it
+        start, end (float, optional): Decode only this window, in seconds. The
+            seek happens at the demuxer, so for seekable sources over HTTP only
+            the byte ranges around the window are fetched.
+
+    Returns:
+        str: Path to the raw PCM file (SAMPLE_DTYPE samples at SAMPLE_RATE)
+    """
+    windowed = bool(start) or end is not None
+    identity = cache_key or source
+    key = full_key = get_source_key(identity)
+    if windowed:
+        key = hashlib.sha256(f"{full_key}#{_format_window(start, end)}".encode('utf-8')).hexdigest()
+        identity = f"{identity} [{_format_window(start, end)}]"
+    pcm_path, meta_path = _cache_paths(key)
+
+    # Jobs in this process wait for an extraction of the same source in progress
+    with _key_lock(key):
+        if _read_sidecar(key) is not None:
+            _touch(pcm_path)
+            logger.info(f"Job {job_id}: Reusing cached audio for {identity}")
+            return pcm_path
+
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        temp_path = f"{pcm_path}.{uuid.uuid4()}.tmp"
+        start_time = time.time()
+        try:
+            if windowed and _read_sidecar(full_key) is not None:
+                _touch(_cache_paths(full_key)[0])
+                _copy_window(_cache_paths(full_key)[0], temp_path, start, end)
+            else:
+                command = ['ffmpeg', '-nostdin', '-v', 'error']
+                if start:
+                    # Input seeking: the demuxer jumps to the window instead of decoding up to it
+                    command += ['-ss', str(start)]
+                command += ['-i', source]
+                if end is not None:
+                    command += ['-t', str(end - (start or 0))]
+                command += [
+                    '-map', '0:a:0', '-vn', '-sn', '-dn',
+                    '-ac', '1', '-ar', str(SAMPLE_RATE), '-f', PCM_FORMAT, '-y', temp_path
+                ]
+                result = subprocess.run(command, stderr=subprocess.PIPE, text=True)
+                if result.returncode != 0:
+                    raise RuntimeError(f"Audio extraction failed: {result.stderr.strip()}")
+            samples = os.path.getsize(temp_path) // np.dtype(SAMPLE_DTYPE).itemsize
+            # Publish the PCM before its sidecar; a reader only trusts complete pairs
+            os.replace(temp_path, pcm_path)
+            meta = {
+                'source': identity,
+                'sample_rate': SAMPLE_RATE,
+                'dtype': np.dtype(SAMPLE_DTYPE).name,
+                'samples': samples
+            }
+            with open(f"{meta_path}.tmp", 'w') as f:
+                json.dump(meta, f)
+            os.replace(f"{meta_path}.tmp", meta_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    logger.info(f"Job {job_id}: Extracted {samples / SAMPLE_RATE:.1f}s of audio in {time.time() - start_time:.2f}s")
+    prune_audio_cache(keep=key)
+    return pcm_path
+
+def load_pcm(pcm_path):
+    """
+    Open a PCM file as a copy-on-write memmap.
+
+    The array is writable (as torch.from_numpy requires) but nothing is ever
+    written back to the shared cache file. Opening a cached file counts as a
+    use, so entries read by other processes are not pruned as idle.
+    """
+    if pcm_path.startswith(CACHE_DIR + os.sep):
+        _touch(pcm_path)
+    return np.memmap(pcm_path, dtype=SAMPLE_DTYPE, mode='c')
+
+def get_audio(source, cache_key=None, job_id=None, start=None, end=None):
+    """Return the 16 kHz mono waveform of a source (or a window of it) as a memmapped float32 array."""
+    return load_pcm(extract_pcm(source, cache_key=cache_key, job_id=job_id, start=start, end=end))
+
+def get_content_hash(pcm_path):
+    """
+    SHA-256 of the decoded samples, so the same audio behind different URLs
+    shares downstream caches. Stored in the sidecar after the first call.
+    """
+    meta_path = os.path.splitext(pcm_path)[0] + '.json'
+    try:
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        meta = None
+    if meta and meta.get('content_hash'):
+        return meta['content_hash']
+
+    sha256 = hashlib.sha256()
+    with open(pcm_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            sha256.update(block)
+    content_hash = sha256.hexdigest()
+
+    if meta is not None:
+        meta['content_hash'] = content_hash
+        temp_path = f"{meta_path}.{uuid.uuid4()}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(temp_path, meta_path)
+    return content_hash
+
+def probe_duration(source):
+    """Container duration of a URL or local file in seconds, or None when ffprobe cannot tell."""
+    command = ['ffprobe', '-v', 'error', '-show_entries', 'format=duration',
+               '-of', 'default=noprint_wrappers=1:nokey=1', source]
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    try:
+        return float(result.stdout.strip())
+    except ValueError:
+        return None
+
+def ffmpeg_input_args(pcm_path):
+    """ffmpeg arguments that read a cached PCM file without probing or decoding."""
+    return ['-f', PCM_FORMAT, '-ar', str(SAMPLE_RATE), '-ac', '1', '-i', pcm_path]
+
+def prune_audio_cache(keep=None):
+    """Drop expired entries, then least recently used ones until under AUDIO_CACHE_MAX_BYTES."""
+    try:
+        names = os.listdir(CACHE_DIR)
+    except FileNotFoundError:
+        return
+
+    now = time.time()
+    entries = []
+    for name in names:
+        if not name.endswith('.pcm'):
+            continue
+        path = os.path.join(CACHE_DIR, name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, name[:-len('.pcm')]))
+
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    for last_used, size, key in entries:
+        if key == keep or (now - last_used <= AUDIO_CACHE_TTL and total <= AUDIO_CACHE_MAX_BYTES):
+            continue
+        # Open memmaps keep working after unlink; the space is freed when they close
+        for path in _cache_paths(key):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        total -= size
+        logger.info(f"Pruned cached audio {key}")
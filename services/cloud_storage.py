@@ -17,11 +17,19 @@
 
 
 import os
+import io
+import json
+import time
+import hashlib
 import logging
+import threading
 from abc import ABC, abstractmethod
-from services.gcp_toolkit import upload_to_gcs
-from services.s3_toolkit import upload_to_s3
-from config import validate_env_vars
+from concurrent.futures import ThreadPoolExecutor
+from services.gcp_toolkit import upload_to_gcs, stream_to_gcs, gcs_object_exists, get_gcs_object_url
+from services.s3_toolkit import upload_to_s3, stream_to_s3, s3_object_exists, get_s3_object_url
+from services.file_management import download_file
+from config import (validate_env_vars, UPLOAD_MAX_WORKERS, LOCAL_STORAGE_PATH,
+                    CLOUD_STORAGE_DEDUPE, CLOUD_STORAGE_DEDUPE_INDEX_TTL)
 from urllib.parse import urlparse
 
 logger = logging.getLogger(__name__)
@@ -40,15 +48,46 @@ def parse_s3_url(s3_url):
 
 class CloudStorageProvider(ABC):
     @abstractmethod
-    def upload_file(self, file_path: str) -> str:
+    def upload_file(self, file_path: str, object_name: str = None) -> str:
+        pass
+
+    @abstractmethod
+    def upload_stream(self, fileobj, filename: str, content_type: str = None) -> str:
+        pass
+
+    @abstractmethod
+    def object_exists(self, object_name: str) -> bool:
+        pass
+
+    @abstractmethod
+    def object_url(self, object_name: str) -> str:
+        pass
+
+    @property
+    @abstractmethod
+    def location(self) -> str:
+        """Identifies the bucket objects land in; used to namespace the dedupe index."""
         pass
 
 class GCPStorageProvider(CloudStorageProvider):
     def __init__(self):
         self.bucket_name = os.getenv('GCP_BUCKET_NAME')
 
-    def upload_file(self, file_path: str) -> str:
-        return upload_to_gcs(file_path, self.bucket_name)
+    @property
+    def location(self) -> str:
+        return f"gcs:{self.bucket_name}"
+
+    def upload_file(self, file_path: str, object_name: str = None) -> str:
+        return upload_to_gcs(file_path, self.bucket_name, object_name)
+
+    def upload_stream(self, fileobj, filename: str, content_type: str = None) -> str:
+        return stream_to_gcs(fileobj, filename, self.bucket_name, content_type)
+
+    def object_exists(self, object_name: str) -> bool:
+        return gcs_object_exists(object_name, self.bucket_name)
+
+    def object_url(self, object_name: str) -> str:
+        return get_gcs_object_url(object_name, self.bucket_name)
 
 class S3CompatibleProvider(CloudStorageProvider):
     def __init__(self):
@@ -83,10 +122,37 @@ class S3CompatibleProvider(CloudStorageProvider):
             except Exception as e:
                 logger.warning(f"Failed to parse Digital Ocean URL: {e}. Using provided values.")
 
-    def upload_file(self, file_path: str) -> str:
-        return upload_to_s3(file_path, self.endpoint_url, self.access_key, self.secret_key, self.bucket_name, self.region)
+    @property
+    def location(self) -> str:
+        return f"s3:{self.endpoint_url}/{self.bucket_name}"
+
+    def upload_file(self, file_path: str, object_name: str = None) -> str:
+        return upload_to_s3(file_path, self.endpoint_url, self.access_key, self.secret_key, self.bucket_name, self.region, object_name)
+
+    def upload_stream(self, fileobj, filename: str, content_type: str = None) -> str:
+        return stream_to_s3(fileobj, filename, self.endpoint_url, self.access_key, self.secret_key, self.bucket_name, self.region, content_type)
+
+    def object_exists(self, object_name: str) -> bool:
+        return s3_object_exists(object_name, self.endpoint_url, self.access_key, self.secret_key, self.bucket_name, self.region)
+
+    def object_url(self, object_name: str) -> str:
+        return get_s3_object_url(self.endpoint_url, self.bucket_name, object_name)
+
+# Providers are built (and env vars validated) once per worker process
+_storage_provider = None
+_storage_provider_lock = threading.Lock()
 
 def get_storage_provider() -> CloudStorageProvider:
+    global _storage_provider
+
+    if _storage_provider is None:
+        with _storage_provider_lock:
+            if _storage_provider is None:
+                _storage_provider = create_storage_provider()
+                logger.info(f"Initialized cloud storage provider: {type(_storage_provider).__name__}")
+    return _storage_provider
+
+def create_storage_provider() -> CloudStorageProvider:
     
     if os.getenv('S3_ENDPOINT_URL'):
 
@@ -105,14 +171,200 @@ def get_storage_provider() -> CloudStorageProvider:
     
     raise ValueError(f"No cloud storage settings provided.")
 
-def upload_file(file_path: str) -> str:
+# Content-addressed uploads. Objects are keyed by the SHA-256 of their bytes, so
+# re-rendering an identical output reuses the existing object. The local index
+# maps content keys to URLs so repeat uploads skip the HEAD request as well.
+DEDUPE_INDEX_DIR = os.path.join(LOCAL_STORAGE_PATH, 'upload_index')
+HASH_CHUNK_SIZE = 1024 * 1024
+
+class HashingReader(io.RawIOBase):
+    """Pass-through reader that hashes every byte read from the wrapped stream."""
+
+    def __init__(self, fileobj):
+        self._fileobj = fileobj
+        self.hasher = hashlib.sha256()
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if hasattr(self._fileobj, 'readinto'):
+            read = self._fileobj.readinto(buffer)
+        else:
+            data = self._fileobj.read(len(buffer))
+            read = len(data)
+            buffer[:read] = data
+        if read:
+            self.hasher.update(memoryview(buffer)[:read])
+        return read
+
+def hash_file(file_path):
+    """Return the hex SHA-256 digest of a file."""
+    hasher = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+def get_content_key(digest, filename):
+    """Object name for content with this digest, keeping the original extension."""
+    return f"{digest}{os.path.splitext(filename)[1].lower()}"
+
+def _index_path(provider, content_key):
+    namespace = hashlib.sha1(provider.location.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(DEDUPE_INDEX_DIR, namespace, f"{content_key}.json")
+
+def _lookup_index(provider, content_key):
+    """Return the indexed URL for a content key, re-checking the object once the entry is stale."""
+    index_path = _index_path(provider, content_key)
+    try:
+        with open(index_path, 'r') as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if time.time() - entry.get('checked_at', 0) <= CLOUD_STORAGE_DEDUPE_INDEX_TTL:
+        return entry['url']
+
+    # The bucket may have lifecycle rules, so confirm the object is still there
+    if provider.object_exists(entry['object_name']):
+        _record_index(provider, content_key, entry['object_name'], entry['url'])
+        return entry['url']
+
+    try:
+        os.remove(index_path)
+    except FileNotFoundError:
+        # Another worker already dropped or replaced the entry
+        pass
+    return None
+
+def _record_index(provider, content_key, object_name, url):
+    index_path = _index_path(provider, content_key)
+    os.makedirs(os.path.dirname(index_path), exist_ok=True)
+    # Write then rename so concurrent readers never see a partial entry
+    temp_path = f"{index_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump({'object_name': object_name, 'url': url, 'checked_at': time.time()}, f)
+    os.replace(temp_path, index_path)
+
+def _upload_file_deduplicated(provider, file_path):
+    content_key = get_content_key(hash_file(file_path), file_path)
+
+    url = _lookup_index(provider, content_key)
+    if url:
+        logger.info(f"Skipping upload of {file_path}; identical content indexed at {url}")
+        return url
+
+    if provider.object_exists(content_key):
+        url = provider.object_url(content_key)
+        logger.info(f"Skipping upload of {file_path}; identical content already stored at {url}")
+    else:
+        url = provider.upload_file(file_path, content_key)
+
+    _record_index(provider, content_key, content_key, url)
+    return url
+
+def upload_file(file_path: str, dedupe: bool = None) -> str:
+    """
+    Upload a local file and return its public URL.
+
+    With dedupe enabled (CLOUD_STORAGE_DEDUPE by default) the object is stored
+    under its content hash and an existing identical object is reused.
+    """
     provider = get_storage_provider()
+    if dedupe is None:
+        dedupe = CLOUD_STORAGE_DEDUPE
     try:
         logger.info(f"Uploading file to cloud storage: {file_path}")
-        url = provider.upload_file(file_path)
+        if dedupe:
+            url = _upload_file_deduplicated(provider, file_path)
+        else:
+            url = provider.upload_file(file_path)
         logger.info(f"File uploaded successfully: {url}")
         return url
     except Exception as e:
         logger.error(f"Error uploading file to cloud storage: {e}")
         raise
-    
\ No newline at end of file
+
+def upload_stream(fileobj, filename: str, content_type: str = None, dedupe: bool = None) -> str:
+    """
+    Upload a readable stream under the given object name without touching local disk.
+
+    The content hash is only known once the stream is exhausted, so streams are
+    always uploaded; with dedupe enabled the hash is computed on the fly and
+    indexed, letting later file uploads of the same bytes reuse this object.
+    """
+    provider = get_storage_provider()
+    if dedupe is None:
+        dedupe = CLOUD_STORAGE_DEDUPE
+    try:
+        logger.info(f"Streaming upload to cloud storage: {filename}")
+        if dedupe:
+            reader = HashingReader(fileobj)
+            url = provider.upload_stream(io.BufferedReader(reader, buffer_size=HASH_CHUNK_SIZE), filename, content_type)
+            _record_index(provider, get_content_key(reader.hasher.hexdigest(), filename), filename, url)
+        else:
+            url = provider.upload_stream(fileobj, filename, content_type)
+        logger.info(f"Stream uploaded successfully: {url}")
+        return url
+    except Exception as e:
+        logger.error(f"Error streaming upload to cloud storage: {e}")
+        raise
+
+class UploadBatch:
+    """
+    Upload several files concurrently through a bounded thread pool.
+
+    Files can be submitted as soon as they are produced, while later outputs
+    are still being encoded. results() returns the URLs in submission order.
+
+    Example:
+        with UploadBatch(remove_after_upload=True) as batch:
+            for path in produce_outputs():
+                batch.submit(path)
+            urls = batch.results()
+    """
+
+    def __init__(self, max_workers=None, remove_after_upload=False):
+        self.remove_after_upload = remove_after_upload
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or UPLOAD_MAX_WORKERS)
+        self._futures = []
+
+    def _upload(self, file_path):
+        url = upload_file(file_path)
+        if self.remove_after_upload and os.path.exists(file_path):
+            os.remove(file_path)
+        return url
+
+    def submit(self, file_path):
+        """Queue a file for upload and return a Future resolving to its URL."""
+        future = self._executor.submit(self._upload, file_path)
+        self._futures.append(future)
+        return future
+
+    def submit_download(self, url, target_dir):
+        """Queue a remote file to be downloaded into target_dir and uploaded; returns a Future of its URL."""
+        future = self._executor.submit(lambda: self._upload(download_file(url, target_dir)))
+        self._futures.append(future)
+        return future
+
+    def results(self):
+        """Wait for every submitted upload; raises the first upload error encountered."""
+        return [future.result() for future in self._futures]
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+def upload_files(file_paths, max_workers=None, remove_after_upload=False):
+    """Upload a list of files concurrently and return their URLs in input order."""
+    with UploadBatch(max_workers, remove_after_upload) as batch:
+        for file_path in file_paths:
+            batch.submit(file_path)
+        return batch.results()
@@ -0,0 +1,204 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+# Index of installed font families.
+#
+# Maps each family name to its font files and styles. The index is read from
+# fontconfig (fc-list, which reads fontconfig's own cache) and saved as JSON
+# at FONT_INDEX_PATH (or FONT_INDEX_FALLBACK_PATH when that is read-only)
+# together with a signature of the font and fontconfig
+# cache directories. Workers load it once and only rebuild when the
+# signature changes, which is checked at most every FONT_INDEX_CHECK_INTERVAL
+# seconds. Without fc-list the index falls back to scanning with matplotlib.
+#
+# Build ahead of time (e.g. in the image) with: python -m services.font_index
+
+import os
+import json
+import time
+import uuid
+import hashlib
+import logging
+import threading
+import subprocess
+from config import FONT_INDEX_PATH, FONT_INDEX_FALLBACK_PATH, FONT_INDEX_CHECK_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+FONT_DIRS = [
+    '/usr/share/fonts',
+    '/usr/local/share/fonts',
+    os.path.expanduser('~/.fonts'),
+    os.path.expanduser('~/.local/share/fonts')
+]
+FONTCONFIG_CACHE_DIRS = ['/var/cache/fontconfig', os.path.expanduser('~/.cache/fontconfig')]
+
+_index = None
+_signature = None
+_checked_at = 0
+_lock = threading.Lock()
+
+def get_signature():
+    """
+    Hash of the modification times of every font directory and the fontconfig
+    cache directories. Adding or removing fonts (or running fc-cache) changes it.
+    """
+    entries = []
+    for root in FONT_DIRS:
+        for dirpath, _, _ in os.walk(root):
+            try:
+                entries.append(f"{dirpath}:{os.stat(dirpath).st_mtime_ns}")
+            except FileNotFoundError:
+                continue
+    for cache_dir in FONTCONFIG_CACHE_DIRS:
+        try:
+            entries.append(f"{cache_dir}:{os.stat(cache_dir).st_mtime_ns}")
+        except FileNotFoundError:
+            continue
+    return hashlib.sha256('\n'.join(sorted(entries)).encode('utf-8')).hexdigest()
+
+def _add(families, family, path, style):
+    family = family.strip()
+    if family:
+        families.setdefault(family, []).append({'file': path, 'style': style})
+
+def _scan_fontconfig():
+    result = subprocess.run(['fc-list', '--format', '%{family}\t%{style}\t%{file}\n'],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip())
+
+    families = {}
+    for line in result.stdout.splitlines():
+        parts = line.split('\t')
+        if len(parts) != 3:
+            continue
+        family_names, styles, path = parts
+        # fontconfig lists every name a family is known by (e.g. localized names), comma separated
+        style = styles.split(',')[0].strip() or 'Regular'
+        for family in family_names.split(','):
+            _add(families, family, path, style)
+    return families
+
+def _scan_matplotlib():
+    import matplotlib.font_manager as fm
+
+    families = {}
+    for path in fm.findSystemFonts(fontpaths=None, fontext='ttf'):
+        try:
+            font_prop = fm.FontProperties(fname=path)
+            _add(families, font_prop.get_name(), path, font_prop.get_style().capitalize())
+        except Exception:
+            continue
+    return families
+
+def build_index():
+    """Scan the installed fonts. Returns {family: [{'file', 'style'}, ...]}."""
+    start_time = time.time()
+    try:
+        families = _scan_fontconfig()
+    except (OSError, RuntimeError) as e:
+        logger.warning(f"fc-list unavailable ({e}); scanning fonts with matplotlib")
+        try:
+            families = _scan_matplotlib()
+        except ImportError:
+            logger.error("Neither fontconfig nor matplotlib is available; no fonts indexed")
+            families = {}
+    for entries in families.values():
+        entries.sort(key=lambda entry: (entry['style'], entry['file']))
+    logger.info(f"Indexed {len(families)} font families in {time.time() - start_time:.2f}s")
+    return families
+
+def _index_paths():
+    if FONT_INDEX_FALLBACK_PATH == FONT_INDEX_PATH:
+        return [FONT_INDEX_PATH]
+    return [FONT_INDEX_PATH, FONT_INDEX_FALLBACK_PATH]
+
+def _read_saved(signature):
+    """The first saved index that matches the installed fonts, or None."""
+    for path in _index_paths():
+        try:
+            with open(path) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if saved.get('version') == FORMAT_VERSION and saved.get('signature') == signature:
+            return saved['families']
+    return None
+
+def _save(signature, families):
+    """Save to FONT_INDEX_PATH, or to FONT_INDEX_FALLBACK_PATH if that fails. Returns the path or None."""
+    for path in _index_paths():
+        temp_path = f"{path}.{uuid.uuid4()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            with open(temp_path, 'w') as f:
+                json.dump({'version': FORMAT_VERSION, 'signature': signature, 'families': families}, f)
+            os.replace(temp_path, path)
+            return path
+        except OSError as e:
+            logger.warning(f"Could not save font index to {path}: {e}")
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+    return None
+
+def load_index(force=False):
+    """
+    Load the saved index if it matches the installed fonts, otherwise rebuild
+    and save it. Called at worker start; lookups call it lazily.
+    """
+    global _index, _signature, _checked_at
+    with _lock:
+        signature = get_signature()
+        if not force and _index is not None and signature == _signature:
+            _checked_at = time.time()
+            return _index
+
+        families = None if force else _read_saved(signature)
+        if families is None:
+            families = build_index()
+            _save(signature, families)
+        _index, _signature, _checked_at = families, signature, time.time()
+        return _index
+
+def get_index():
+    """The current index; the font directories are re-checked at most every FONT_INDEX_CHECK_INTERVAL seconds."""
+    if _index is None or time.time() - _checked_at > FONT_INDEX_CHECK_INTERVAL:
+        return load_index()
+    return _index
+
+def has_family(family):
+    return family in get_index()
+
+def get_family(family):
+    """Font files and styles of a family, or None if it is not installed."""
+    return get_index().get(family)
+
+def get_families():
+    return sorted(get_index())
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    signature = get_signature()
+    families = build_index()
+    path = _save(signature, families)
+    if path is None:
+        raise SystemExit("Could not save the font index")
+    print(f"Saved {len(families)} font families to {path}")
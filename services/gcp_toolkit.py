@@ -31,6 +31,7 @@ logger = logging.getLogger(__name__)
 # GCS environment variables
 GCP_BUCKET_NAME = os.getenv('GCP_BUCKET_NAME')
 STORAGE_PATH = "/tmp/"
+GCS_STREAM_CHUNK_SIZE = 8 * 1024 * 1024  # Must be a multiple of 256 KB
 gcs_client = None
 
 def initialize_gcp_client():
@@ -57,14 +58,14 @@ def initialize_gcp_client():
 # Initialize the GCS client
 gcs_client = initialize_gcp_client()
 
-def upload_to_gcs(file_path, bucket_name=GCP_BUCKET_NAME):
+def upload_to_gcs(file_path, bucket_name=GCP_BUCKET_NAME, object_name=None):
     if not gcs_client:
         raise ValueError("GCS client is not initialized. Skipping file upload.")
 
     try:
         logger.info(f"Uploading file to Google Cloud Storage: {file_path}")
         bucket = gcs_client.bucket(bucket_name)
-        blob = bucket.blob(os.path.basename(file_path))
+        blob = bucket.blob(object_name or os.path.basename(file_path))
         blob.upload_from_filename(file_path)
         logger.info(f"File uploaded successfully to GCS: {blob.public_url}")
         return blob.public_url
@@ -72,6 +73,35 @@ def upload_to_gcs(file_path, bucket_name=GCP_BUCKET_NAME):
         logger.error(f"Error uploading file to GCS: {e}")
         raise
 
+def gcs_object_exists(object_name, bucket_name=GCP_BUCKET_NAME):
+    """Check whether an object already exists in the bucket (metadata request only)."""
+    if not gcs_client:
+        raise ValueError("GCS client is not initialized.")
+    return gcs_client.bucket(bucket_name).blob(object_name).exists()
+
+def get_gcs_object_url(object_name, bucket_name=GCP_BUCKET_NAME):
+    """Public URL of an object, in the same form upload_to_gcs returns."""
+    if not gcs_client:
+        raise ValueError("GCS client is not initialized.")
+    return gcs_client.bucket(bucket_name).blob(object_name).public_url
+
+def stream_to_gcs(fileobj, filename, bucket_name=GCP_BUCKET_NAME, content_type=None):
+    """Upload a readable, non-seekable stream to GCS using a resumable upload."""
+    if not gcs_client:
+        raise ValueError("GCS client is not initialized. Skipping file upload.")
+
+    try:
+        logger.info(f"Streaming upload to Google Cloud Storage: {filename}")
+        bucket = gcs_client.bucket(bucket_name)
+        # A chunk size forces a resumable upload that only buffers one chunk at a time
+        blob = bucket.blob(filename, chunk_size=GCS_STREAM_CHUNK_SIZE)
+        blob.upload_from_file(fileobj, rewind=False, content_type=content_type)
+        logger.info(f"Stream uploaded successfully to GCS: {blob.public_url}")
+        return blob.public_url
+    except Exception as e:
+        logger.error(f"Error streaming file to GCS: {e}")
+        raise
+
 
 def trigger_cloud_run_job(job_name, location="us-central1", overrides=None):
     # Retrieve service account credentials
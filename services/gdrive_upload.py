@@ -0,0 +1,388 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+import requests
+from google.oauth2.service_account import Credentials
+from google.auth.transport.requests import Request
+from config import LOCAL_STORAGE_PATH
+
+logger = logging.getLogger(__name__)
+
+GCP_SA_CREDENTIALS = os.getenv('GCP_SA_CREDENTIALS')
+GDRIVE_USER = os.getenv('GDRIVE_USER')
+
+MB = 1024 * 1024
+# Drive requires every chunk except the last to be a multiple of 256 KB
+CHUNK_ALIGNMENT = 256 * 1024
+MIN_CHUNK_SIZE = 1 * MB
+MAX_CHUNK_SIZE = 64 * MB
+# Chunk size is tuned so each PUT takes roughly this long at the measured throughput
+TARGET_CHUNK_SECONDS = 4.0
+SOURCE_READ_SIZE = 1 * MB
+
+MAX_RETRIES = 5
+RETRY_BASE_DELAY = 2  # seconds, doubled on every retry
+
+# Resumable session URIs are valid for a week; stop trusting persisted ones a bit earlier
+SESSION_DIR = os.path.join(LOCAL_STORAGE_PATH, 'gdrive_sessions')
+SESSION_MAX_AGE = 6 * 24 * 3600
+
+class SessionExpiredError(Exception):
+    pass
+
+def get_access_token():
+    """
+    Retrieves an access token for Google APIs using service account credentials.
+    """
+    credentials_info = json.loads(GCP_SA_CREDENTIALS)
+    credentials = Credentials.from_service_account_info(
+        credentials_info,
+        scopes=['https://www.googleapis.com/auth/drive']
+    )
+    delegated_credentials = credentials.with_subject(GDRIVE_USER)
+    if not delegated_credentials.valid or delegated_credentials.expired:
+        delegated_credentials.refresh(Request())
+    access_token = delegated_credentials.token
+    return access_token
+
+def initiate_resumable_upload(filename, folder_id, mime_type='application/octet-stream'):
+    """
+    Initiates a resumable upload session with Google Drive and returns the upload URL.
+    """
+    url = 'https://www.googleapis.com/upload/drive/v3/files?uploadType=resumable'
+    headers = {
+        'Authorization': f'Bearer {get_access_token()}',
+        'Content-Type': 'application/json; charset=UTF-8',
+        'X-Upload-Content-Type': mime_type
+    }
+    metadata = {
+        'name': filename,
+        'parents': [folder_id]
+    }
+    response = requests.post(url, headers=headers, data=json.dumps(metadata))
+    response.raise_for_status()
+    upload_url = response.headers['Location']
+    return upload_url
+
+def align_chunk_size(size):
+    """Round down to the Drive chunk alignment, clamped to the allowed range."""
+    size = max(MIN_CHUNK_SIZE, min(MAX_CHUNK_SIZE, int(size)))
+    return max(CHUNK_ALIGNMENT, size - size % CHUNK_ALIGNMENT)
+
+def next_chunk_size(current_size, bytes_sent, elapsed):
+    """Pick the next chunk size from the throughput of the last PUT, changing at most 2x per step."""
+    if elapsed <= 0 or bytes_sent <= 0:
+        return current_size
+    target = (bytes_sent / elapsed) * TARGET_CHUNK_SECONDS
+    target = max(current_size / 2, min(current_size * 2, target))
+    return align_chunk_size(target)
+
+# Persisted upload sessions
+
+def get_session_key(file_url, folder_id, filename, total_size):
+    """Identify an upload so a retried request finds the session a previous worker started."""
+    raw = json.dumps([file_url, folder_id, filename, total_size])
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+def _session_path(session_key):
+    return os.path.join(SESSION_DIR, f"{session_key}.json")
+
+def load_session(session_key):
+    """Return the persisted session for this key, or None if missing or too old."""
+    try:
+        with open(_session_path(session_key), 'r') as f:
+            session = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if time.time() - session.get('created_at', 0) > SESSION_MAX_AGE:
+        delete_session(session_key)
+        return None
+    return session
+
+def save_session(session_key, session):
+    os.makedirs(SESSION_DIR, exist_ok=True)
+    path = _session_path(session_key)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(session, f)
+    os.replace(temp_path, path)
+
+def delete_session(session_key):
+    try:
+        os.remove(_session_path(session_key))
+    except FileNotFoundError:
+        pass
+
+# Drive protocol helpers
+
+def _parse_committed_offset(response):
+    """Bytes Drive has persisted, from the Range header of a 308 response."""
+    range_header = response.headers.get('Range')
+    if not range_header:
+        return 0
+    return int(range_header.rsplit('-', 1)[1]) + 1
+
+def query_upload_status(upload_url, total_size):
+    """
+    Ask Drive how much of a resumable upload it has persisted.
+
+    Returns:
+        tuple: (offset, file_id); file_id is set when the upload already completed
+    """
+    response = requests.put(
+        upload_url,
+        headers={'Content-Length': '0', 'Content-Range': f'bytes */{total_size}'},
+        timeout=60
+    )
+    if response.status_code in (200, 201):
+        return total_size, response.json()['id']
+    if response.status_code == 308:
+        return _parse_committed_offset(response), None
+    if response.status_code in (404, 410):
+        raise SessionExpiredError(f"Upload session expired (status {response.status_code})")
+    raise Exception(f"Upload status query failed with status code {response.status_code}")
+
+class PrefetchReader:
+    """
+    Reads the source on a background thread so the next chunk is downloading
+    while the current one uploads. Buffered data is capped at `capacity` bytes.
+    """
+
+    def __init__(self, source, capacity):
+        self._source = source
+        self._buffer = bytearray()
+        self._condition = threading.Condition()
+        self._eof = False
+        self._error = None
+        self._closed = False
+        self.capacity = capacity
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            while True:
+                with self._condition:
+                    while len(self._buffer) >= self.capacity and not self._closed:
+                        self._condition.wait()
+                    if self._closed:
+                        return
+                data = self._source.read(SOURCE_READ_SIZE)
+                with self._condition:
+                    if not data:
+                        self._eof = True
+                        self._condition.notify_all()
+                        return
+                    self._buffer += data
+                    self._condition.notify_all()
+        except Exception as e:
+            with self._condition:
+                self._error = e
+                self._condition.notify_all()
+
+    def set_capacity(self, capacity):
+        with self._condition:
+            self.capacity = capacity
+            self._condition.notify_all()
+
+    def read(self, size):
+        """Block until `size` bytes are buffered (or EOF) and return them."""
+        with self._condition:
+            while len(self._buffer) < size and not self._eof and self._error is None:
+                self._condition.wait()
+            if self._error is not None:
+                raise self._error
+            data = bytes(self._buffer[:size])
+            del self._buffer[:size]
+            self._condition.notify_all()
+            return data
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+def open_source(file_url, offset):
+    """Open the source stream positioned at `offset`, using a Range request when supported."""
+    headers = {'Range': f'bytes={offset}-'} if offset else None
+    response = requests.get(file_url, stream=True, headers=headers, timeout=60)
+    response.raise_for_status()
+    response.raw.decode_content = True
+
+    if offset and response.status_code != 206:
+        # Server ignored the Range header; skip what Drive already has
+        logger.info(f"Source does not support range requests, skipping {offset} bytes")
+        remaining = offset
+        while remaining:
+            skipped = response.raw.read(min(remaining, SOURCE_READ_SIZE))
+            if not skipped:
+                raise Exception("Source ended before the resume offset")
+            remaining -= len(skipped)
+    return response
+
+def _resync_offset(upload_url, total_size, job_id):
+    """Query the committed offset after a failed PUT, retrying the query itself."""
+    for attempt in range(MAX_RETRIES):
+        try:
+            return query_upload_status(upload_url, total_size)
+        except requests.exceptions.RequestException as e:
+            delay = RETRY_BASE_DELAY * (2 ** attempt)
+            logger.warning(f"Job {job_id}: Status query failed ({e}), retrying in {delay} seconds")
+            time.sleep(delay)
+    raise Exception("Unable to query upload status after multiple retries.")
+
+def upload_url_to_drive(file_url, filename, folder_id, total_size, mime_type='application/octet-stream',
+                        chunk_size=None, job_id=None, progress_callback=None):
+    """
+    Copy a remote file into Google Drive through a resumable upload.
+
+    The next chunk is prefetched from the source while the current one is
+    being sent, and the chunk size follows the measured upload throughput.
+    The session URI and committed offset are persisted under SESSION_DIR, so
+    a retried request resumes with a status query instead of starting over.
+
+    Args:
+        file_url (str): Source URL
+        filename (str): Name of the file in Drive
+        folder_id (str): Parent folder ID
+        total_size (int): Size of the source in bytes
+        mime_type (str): MIME type of the file
+        chunk_size (int, optional): Initial chunk size in bytes
+        job_id (str, optional): Used in log messages
+        progress_callback (callable, optional): Called with the number of bytes Drive has committed
+
+    Returns:
+        str: The Drive file ID
+    """
+    session_key = get_session_key(file_url, folder_id, filename, total_size)
+    session = load_session(session_key)
+    offset = 0
+
+    if session:
+        try:
+            offset, file_id = _resync_offset(session['upload_url'], total_size, job_id)
+            if file_id:
+                logger.info(f"Job {job_id}: Upload was already completed by a previous worker")
+                delete_session(session_key)
+                return file_id
+            logger.info(f"Job {job_id}: Resuming upload session at byte {offset} of {total_size}")
+        except SessionExpiredError:
+            logger.info(f"Job {job_id}: Persisted upload session expired, starting over")
+            session = None
+
+    if not session:
+        session = {
+            'upload_url': initiate_resumable_upload(filename, folder_id, mime_type),
+            'total_size': total_size,
+            'created_at': time.time(),
+            'offset': 0
+        }
+        save_session(session_key, session)
+
+    upload_url = session['upload_url']
+    chunk_size = align_chunk_size(chunk_size or 8 * MB)
+    if progress_callback:
+        progress_callback(offset)
+
+    with open_source(file_url, offset) as source_response:
+        reader = PrefetchReader(source_response.raw, chunk_size * 2)
+        try:
+            # Bytes read from the source but not yet committed by Drive, starting at `offset`
+            pending = b''
+            attempt = 0
+            while True:
+                if len(pending) < chunk_size:
+                    pending += reader.read(chunk_size - len(pending))
+                if offset + len(pending) > total_size:
+                    raise Exception("Source is larger than its reported Content-Length")
+                if not pending:
+                    if offset < total_size:
+                        raise Exception("Source ended before the reported Content-Length")
+                    # Everything is committed but Drive never answered with the file
+                    _, file_id = _resync_offset(upload_url, total_size, job_id)
+                    if not file_id:
+                        raise Exception("Drive did not finalize the upload")
+                    delete_session(session_key)
+                    return file_id
+
+                end = offset + len(pending) - 1
+                headers = {
+                    'Content-Length': str(len(pending)),
+                    'Content-Range': f'bytes {offset}-{end}/{total_size}',
+                }
+                started = time.time()
+                try:
+                    response = requests.put(upload_url, headers=headers, data=pending, timeout=300)
+                    if response.status_code >= 500 or response.status_code == 429:
+                        raise requests.exceptions.RequestException(f"Server returned {response.status_code}")
+                except requests.exceptions.RequestException as e:
+                    if attempt >= MAX_RETRIES - 1:
+                        logger.error(f"Job {job_id}: Max retries reached. Upload failed.")
+                        raise
+                    delay = RETRY_BASE_DELAY * (2 ** attempt)
+                    attempt += 1
+                    logger.warning(f"Job {job_id}: Chunk upload failed ({e}), resyncing in {delay} seconds")
+                    time.sleep(delay)
+                    committed, file_id = _resync_offset(upload_url, total_size, job_id)
+                    if file_id:
+                        delete_session(session_key)
+                        return file_id
+                    # Drive may have kept part of the chunk; resend only the remainder
+                    pending = pending[committed - offset:]
+                    offset = committed
+                    continue
+
+                elapsed = time.time() - started
+                attempt = 0
+
+                if response.status_code in (200, 201):
+                    logger.info(f"Job {job_id}: Upload complete.")
+                    if progress_callback:
+                        progress_callback(total_size)
+                    delete_session(session_key)
+                    return response.json()['id']
+
+                if response.status_code != 308:
+                    logger.error(f"Job {job_id}: Unexpected status code: {response.status_code}")
+                    if response.status_code in (404, 410):
+                        delete_session(session_key)
+                    raise Exception(f"Upload failed with status code {response.status_code}")
+
+                committed = _parse_committed_offset(response)
+                sent = committed - offset
+                pending = pending[sent:]
+                offset = committed
+
+                session['offset'] = offset
+                save_session(session_key, session)
+                if progress_callback:
+                    progress_callback(offset)
+
+                new_chunk_size = next_chunk_size(chunk_size, sent, elapsed)
+                if new_chunk_size != chunk_size:
+                    logger.info(f"Job {job_id}: Adjusting chunk size from {chunk_size} to {new_chunk_size} bytes")
+                    chunk_size = new_chunk_size
+                    reader.set_capacity(chunk_size * 2)
+        finally:
+            reader.close()
@@ -0,0 +1,129 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+import io
+import logging
+import mimetypes
+import subprocess
+import threading
+from collections import deque
+from services.cloud_storage import upload_stream
+
+logger = logging.getLogger(__name__)
+
+# Output formats that can be muxed to a non-seekable pipe, mapped to the
+# ffmpeg output options (ffmpeg-python keyword style) needed to do so.
+STREAMABLE_FORMATS = {
+    'mp4': {'format': 'mp4', 'movflags': 'frag_keyframe+empty_moov+default_base_moof'},
+    'mov': {'format': 'mov', 'movflags': 'frag_keyframe+empty_moov+default_base_moof'},
+    'ts': {'format': 'mpegts'},
+    'mpegts': {'format': 'mpegts'},
+    'mp3': {'format': 'mp3'},
+    'aac': {'format': 'adts'},
+    'ogg': {'format': 'ogg'},
+    'opus': {'format': 'opus'}
+}
+
+# Buffer handed to the uploader; parts are assembled from this by the storage client
+PIPE_BUFFER_SIZE = 1024 * 1024
+STDERR_TAIL_LINES = 50
+
+def is_streamable_format(output_format):
+    """Return True if ffmpeg can write this format straight to a pipe."""
+    return bool(output_format) and output_format.lower() in STREAMABLE_FORMATS
+
+def get_streaming_output_options(output_format):
+    """ffmpeg-python output kwargs that make `output_format` pipe-safe."""
+    if not is_streamable_format(output_format):
+        raise ValueError(f"Format '{output_format}' cannot be streamed to cloud storage")
+    return dict(STREAMABLE_FORMATS[output_format.lower()])
+
+def get_streaming_output_args(output_format):
+    """Command-line equivalent of get_streaming_output_options, ending with the pipe target."""
+    options = get_streaming_output_options(output_format)
+    args = ['-f', options.pop('format')]
+    for key, value in options.items():
+        args.extend([f"-{key}", str(value)])
+    args.append('pipe:1')
+    return args
+
+class FFmpegProcessStream(io.RawIOBase):
+    """
+    Read-only view over an ffmpeg process's stdout.
+
+    Reaching EOF waits for the process and raises if ffmpeg exited with an
+    error, so the uploader aborts instead of committing a truncated object.
+    """
+
+    def __init__(self, process):
+        self._process = process
+        self._stderr_tail = deque(maxlen=STDERR_TAIL_LINES)
+        self._stderr_thread = threading.Thread(target=self._drain_stderr, daemon=True)
+        self._stderr_thread.start()
+
+    def _drain_stderr(self):
+        # ffmpeg blocks if its stderr pipe fills up, so keep it drained
+        for line in iter(self._process.stderr.readline, b''):
+            self._stderr_tail.append(line.decode('utf-8', errors='replace'))
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        read = self._process.stdout.readinto(buffer)
+        if not read:
+            self._check_exit()
+        return read
+
+    def _check_exit(self):
+        returncode = self._process.wait()
+        self._stderr_thread.join()
+        if returncode != 0:
+            raise RuntimeError(f"FFmpeg exited with code {returncode}: {''.join(self._stderr_tail)}")
+
+    def close(self):
+        if self._process.poll() is None:
+            self._process.kill()
+            self._process.wait()
+        super().close()
+
+def stream_ffmpeg_to_cloud(cmd, filename, content_type=None):
+    """
+    Run an ffmpeg command that writes to `pipe:1` and upload its output directly.
+
+    Args:
+        cmd (list): Full ffmpeg command; its output target must be `pipe:1`
+        filename (str): Object name to store the output under
+        content_type (str, optional): MIME type, guessed from the filename if omitted
+
+    Returns:
+        str: Cloud URL of the uploaded output
+    """
+    if 'pipe:1' not in cmd:
+        raise ValueError("FFmpeg command must write its output to pipe:1")
+
+    if content_type is None:
+        content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+    logger.info(f"Streaming FFmpeg output to cloud storage as {filename}: {' '.join(cmd)}")
+    process = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stream = io.BufferedReader(FFmpegProcessStream(process), buffer_size=PIPE_BUFFER_SIZE)
+    try:
+        return upload_stream(stream, filename, content_type)
+    finally:
+        stream.close()
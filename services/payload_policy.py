@@ -0,0 +1,109 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+import os
+import gzip
+import json
+import logging
+from urllib.parse import urlparse
+from services.cloud_storage import upload_file
+from config import LOCAL_STORAGE_PATH, PAYLOAD_MAX_INLINE_BYTES, WEBHOOK_GZIP, WEBHOOK_GZIP_HOSTS, LOG_PAYLOAD_MAX_CHARS
+
+logger = logging.getLogger(__name__)
+
+# Bodies smaller than this are not worth compressing
+GZIP_MIN_BYTES = 1024
+
+# Hosts that answered a compressed body with 415 Unsupported Media Type; sent plain from then on
+_gzip_rejected_hosts = set()
+
+def truncate_for_log(data, max_chars=None):
+    """Render a payload for logging, cut to max_chars with a note of the full size."""
+    max_chars = LOG_PAYLOAD_MAX_CHARS if max_chars is None else max_chars
+    text = data if isinstance(data, str) else json.dumps(data, default=str)
+    if len(text) <= max_chars:
+        return text
+    return f"{text[:max_chars]}... [truncated, {len(text)} chars total]"
+
+def apply_payload_policy(response_obj, job_id):
+    """
+    Move an oversized job result out of the response object.
+
+    When the serialized "response" field is larger than PAYLOAD_MAX_INLINE_BYTES
+    it is uploaded to cloud storage as a JSON artifact and replaced with
+    "response_url" and "response_size". The object is returned unchanged if it
+    is small enough or the upload fails.
+
+    Returns:
+        dict: The response object to store and send
+    """
+    result = response_obj.get("response")
+    if result is None or PAYLOAD_MAX_INLINE_BYTES <= 0:
+        return response_obj
+
+    body = json.dumps(result).encode('utf-8')
+    if len(body) <= PAYLOAD_MAX_INLINE_BYTES:
+        return response_obj
+
+    artifact_path = os.path.join(LOCAL_STORAGE_PATH, f"{job_id}_response.json")
+    try:
+        with open(artifact_path, 'wb') as f:
+            f.write(body)
+        response_url = upload_file(artifact_path)
+    except Exception as e:
+        logger.warning(f"Job {job_id}: Could not offload {len(body)} byte response, keeping it inline: {e}")
+        return response_obj
+    finally:
+        if os.path.exists(artifact_path):
+            os.remove(artifact_path)
+
+    logger.info(f"Job {job_id}: Offloaded {len(body)} byte response to {response_url}")
+    offloaded = dict(response_obj)
+    offloaded["response"] = None
+    offloaded["response_url"] = response_url
+    offloaded["response_size"] = len(body)
+    return offloaded
+
+def gzip_accepted(webhook_url):
+    """Whether to compress bodies for this receiver: WEBHOOK_GZIP for all, or its host in WEBHOOK_GZIP_HOSTS."""
+    host = (urlparse(webhook_url).hostname or '').lower()
+    if host in _gzip_rejected_hosts:
+        return False
+    return WEBHOOK_GZIP or host in WEBHOOK_GZIP_HOSTS
+
+def mark_gzip_rejected(webhook_url):
+    host = (urlparse(webhook_url).hostname or '').lower()
+    logger.warning(f"Webhook receiver {host} rejected a gzip body; sending it uncompressed from now on")
+    _gzip_rejected_hosts.add(host)
+
+def encode_webhook_body(data, webhook_url=None, compress=None):
+    """
+    Serialize a webhook payload, gzip-compressing it for receivers that accept it
+    (see gzip_accepted). `compress` overrides the per-receiver choice.
+
+    Returns:
+        tuple: (body bytes, headers dict)
+    """
+    body = json.dumps(data).encode('utf-8')
+    headers = {'Content-Type': 'application/json'}
+    if compress is None:
+        compress = webhook_url is not None and gzip_accepted(webhook_url)
+    if compress and len(body) >= GZIP_MIN_BYTES:
+        body = gzip.compress(body, compresslevel=6)
+        headers['Content-Encoding'] = 'gzip'
+    return body, headers
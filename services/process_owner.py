@@ -0,0 +1,58 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+# Owner tags for files that a process holds under LOCAL_STORAGE_PATH
+# (webhook claims, thread budget leases).
+#
+# LOCAL_STORAGE_PATH can outlive the container, and after a restart gunicorn
+# workers get the same low PIDs again, so a PID alone cannot tell a live owner
+# from a dead one. A tag is "<pid>-<start time>", where the start time comes
+# from /proc; without /proc it is just "<pid>" and liveness falls back to a
+# signal check.
+
+import os
+
+def process_start_time(pid):
+    """Start time of a process (clock ticks since boot), or None if it does not exist or /proc is unavailable."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # Fields after the parenthesised command name; starttime is field 22
+    return stat.rsplit(')', 1)[1].split()[19]
+
+def get_owner_tag():
+    """Tag identifying this process. Contains no '.' so it can be embedded in file names."""
+    pid = os.getpid()
+    start_time = process_start_time(pid)
+    return f"{pid}-{start_time}" if start_time else str(pid)
+
+def owner_alive(tag):
+    """Whether the process a tag was made for is still running."""
+    pid, _, start_time = tag.partition('-')
+    pid = int(pid)
+    if start_time:
+        return process_start_time(pid) == start_time
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
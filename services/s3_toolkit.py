@@ -19,31 +19,109 @@
 import os
 import boto3
 import logging
+import threading
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from boto3.s3.transfer import TransferConfig
 from urllib.parse import urlparse, quote
+from config import S3_MULTIPART_THRESHOLD_MB, S3_MULTIPART_CHUNKSIZE_MB, S3_MAX_CONCURRENCY
 
 logger = logging.getLogger(__name__)
 
-def upload_to_s3(file_path, s3_url, access_key, secret_key, bucket_name, region):
+MB = 1024 * 1024
+
+# Process-wide client registry. boto3 clients are thread-safe but must not be
+# shared across a fork, so the registry is rebuilt if the PID changes.
+_s3_clients = {}
+_s3_clients_pid = None
+_s3_clients_lock = threading.Lock()
+_transfer_config = None
+
+def get_s3_client(endpoint_url, access_key, secret_key, region):
+    """Return the cached S3 client for these settings, creating it on first use."""
+    global _s3_clients_pid
+
+    key = (endpoint_url, access_key, secret_key, region)
+    with _s3_clients_lock:
+        if _s3_clients_pid != os.getpid():
+            _s3_clients.clear()
+            _s3_clients_pid = os.getpid()
+
+        client = _s3_clients.get(key)
+        if client is None:
+            session = boto3.Session(
+                aws_access_key_id=access_key,
+                aws_secret_access_key=secret_key,
+                region_name=region
+            )
+            # Keep enough pooled connections for every concurrent part upload
+            client_config = Config(max_pool_connections=max(10, S3_MAX_CONCURRENCY * 2))
+            client = session.client('s3', endpoint_url=endpoint_url, config=client_config)
+            _s3_clients[key] = client
+            logger.info(f"Created S3 client for endpoint {endpoint_url} in PID {os.getpid()}")
+        return client
+
+def get_transfer_config():
+    """Return the shared TransferConfig used for parallel multipart uploads."""
+    global _transfer_config
+    if _transfer_config is None:
+        _transfer_config = TransferConfig(
+            multipart_threshold=S3_MULTIPART_THRESHOLD_MB * MB,
+            multipart_chunksize=S3_MULTIPART_CHUNKSIZE_MB * MB,
+            max_concurrency=S3_MAX_CONCURRENCY,
+            use_threads=True
+        )
+    return _transfer_config
+
+def get_s3_object_url(s3_url, bucket_name, object_name):
+    """Public URL of an object, in the same form upload_to_s3 returns."""
+    # URL encode the filename for the URL
+    return f"{s3_url}/{bucket_name}/{quote(object_name)}"
+
+def s3_object_exists(object_name, s3_url, access_key, secret_key, bucket_name, region):
+    """HEAD an object; returns False only when the object is missing."""
+    client = get_s3_client(s3_url, access_key, secret_key, region)
+    try:
+        client.head_object(Bucket=bucket_name, Key=object_name)
+        return True
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+            return False
+        raise
+
+def upload_to_s3(file_path, s3_url, access_key, secret_key, bucket_name, region, object_name=None):
     # Parse the S3 URL into bucket, region, and endpoint
     #bucket_name, region, endpoint_url = parse_s3_url(s3_url)
     
-    session = boto3.Session(
-        aws_access_key_id=access_key,
-        aws_secret_access_key=secret_key,
-        region_name=region
-    )
-    
-    client = session.client('s3', endpoint_url=s3_url)
+    client = get_s3_client(s3_url, access_key, secret_key, region)
+    object_name = object_name or os.path.basename(file_path)
 
     try:
         # Upload the file to the specified S3 bucket
         with open(file_path, 'rb') as data:
-            client.upload_fileobj(data, bucket_name, os.path.basename(file_path), ExtraArgs={'ACL': 'public-read'})
+            client.upload_fileobj(data, bucket_name, object_name, ExtraArgs={'ACL': 'public-read'}, Config=get_transfer_config())
 
-        # URL encode the filename for the URL
-        encoded_filename = quote(os.path.basename(file_path))
-        file_url = f"{s3_url}/{bucket_name}/{encoded_filename}"
-        return file_url
+        return get_s3_object_url(s3_url, bucket_name, object_name)
     except Exception as e:
         logger.error(f"Error uploading file to S3: {e}")
         raise
+
+def stream_to_s3(fileobj, filename, s3_url, access_key, secret_key, bucket_name, region, content_type=None):
+    """Upload a readable, non-seekable stream to S3 using a multipart upload.
+
+    boto3 reads the stream in part-sized chunks, so memory use stays bounded
+    regardless of the total object size.
+    """
+    client = get_s3_client(s3_url, access_key, secret_key, region)
+
+    extra_args = {'ACL': 'public-read'}
+    if content_type:
+        extra_args['ContentType'] = content_type
+
+    try:
+        client.upload_fileobj(fileobj, bucket_name, filename, ExtraArgs=extra_args, Config=get_transfer_config())
+
+        return get_s3_object_url(s3_url, bucket_name, filename)
+    except Exception as e:
+        logger.error(f"Error streaming file to S3: {e}")
+        raise
@@ -0,0 +1,181 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+# Host-wide CPU thread budget.
+#
+# torch and ffmpeg each size their thread pools to the whole machine, so two
+# gunicorn workers running Whisper and an x264 encode at once oversubscribe
+# the cores several times over. Every running job holds a lease file under
+# LOCAL_STORAGE_PATH/thread_budget (shared by all workers on the host), and
+# torch and ffmpeg are given THREAD_BUDGET_CORES divided by the number of
+# live leases. The count is read again whenever threads are handed out, so
+# later stages of a long job shrink or grow as other jobs start and finish.
+#
+# With THREAD_BUDGET_AFFINITY, a job's thread is also pinned to its own
+# slice of the cores; ffmpeg processes and threads it starts inherit that.
+
+import os
+import sys
+import time
+import uuid
+import logging
+import threading
+from contextlib import contextmanager
+from services.process_owner import get_owner_tag, owner_alive
+from config import LOCAL_STORAGE_PATH, THREAD_BUDGET_ENABLED, THREAD_BUDGET_CORES, THREAD_BUDGET_AFFINITY
+
+logger = logging.getLogger(__name__)
+
+LEASE_DIR = os.path.join(LOCAL_STORAGE_PATH, 'thread_budget')
+
+_torch_default_threads = None
+_torch_lock = threading.Lock()
+
+def get_cores():
+    """Cores the budget divides: THREAD_BUDGET_CORES, else the CPUs this process may run on."""
+    if THREAD_BUDGET_CORES > 0:
+        return THREAD_BUDGET_CORES
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def _live_leases():
+    """Lease file names of running jobs, oldest first; leases of dead processes are removed."""
+    try:
+        names = os.listdir(LEASE_DIR)
+    except FileNotFoundError:
+        return []
+
+    leases = []
+    for name in names:
+        if not name.endswith('.lease'):
+            continue
+        path = os.path.join(LEASE_DIR, name)
+        try:
+            # Lease names start with the owner tag; PIDs alone repeat after a container restart
+            alive = owner_alive(name.split('.', 1)[0])
+            created = os.path.getmtime(path)
+        except (ValueError, FileNotFoundError):
+            continue
+        if not alive:
+            # Left behind by a worker that was killed mid-job
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            continue
+        leases.append((created, name))
+    return [name for _, name in sorted(leases)]
+
+def active_jobs():
+    return max(1, len(_live_leases()))
+
+def get_threads():
+    """Threads one job may use right now."""
+    if not THREAD_BUDGET_ENABLED:
+        return get_cores()
+    return max(1, get_cores() // active_jobs())
+
+def ffmpeg_global_args():
+    """
+    Global ffmpeg options (place right after 'ffmpeg') that size the filter
+    graph thread pools. Empty when the job has the machine to itself, so
+    ffmpeg keeps its own defaults.
+    """
+    if not THREAD_BUDGET_ENABLED or active_jobs() <= 1:
+        return []
+    threads = str(get_threads())
+    return ['-filter_threads', threads, '-filter_complex_threads', threads]
+
+def ffmpeg_output_args():
+    """
+    Output options limiting encoder threads; libx264/libx265 use this as
+    their own thread count. Empty when the job has the machine to itself.
+    """
+    if not THREAD_BUDGET_ENABLED or active_jobs() <= 1:
+        return []
+    return ['-threads', str(get_threads())]
+
+def ffmpeg_output_options():
+    """ffmpeg_output_args() as ffmpeg-python output keyword arguments."""
+    args = ffmpeg_output_args()
+    return dict(zip((arg.lstrip('-') for arg in args[::2]), args[1::2]))
+
+def apply_torch_threads():
+    """Resize torch's intra-op pool (process-wide) to the current budget, if torch is loaded."""
+    global _torch_default_threads
+    if not THREAD_BUDGET_ENABLED or 'torch' not in sys.modules:
+        return
+    torch = sys.modules['torch']
+    with _torch_lock:
+        if _torch_default_threads is None:
+            _torch_default_threads = torch.get_num_threads()
+        # Never raise it above torch's own choice (physical cores)
+        threads = min(_torch_default_threads, get_threads())
+        if torch.get_num_threads() != threads:
+            torch.set_num_threads(threads)
+
+def _affinity_slice(lease_name, leases, cores):
+    """Contiguous share of the allowed CPUs for the job at this lease's position."""
+    try:
+        allowed = sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        return None
+    allowed = allowed[:cores]
+    count = max(1, len(leases))
+    position = leases.index(lease_name) % count if lease_name in leases else 0
+    size = max(1, len(allowed) // count)
+    return set(allowed[position * size:(position + 1) * size]) or set(allowed)
+
+@contextmanager
+def job_budget(job_id):
+    """
+    Hold a lease for the duration of a job. Used by the job runner around
+    every job it executes.
+    """
+    if not THREAD_BUDGET_ENABLED:
+        yield
+        return
+
+    os.makedirs(LEASE_DIR, exist_ok=True)
+    lease_name = f"{get_owner_tag()}.{uuid.uuid4().hex[:8]}.{job_id}.lease"
+    lease_path = os.path.join(LEASE_DIR, lease_name)
+    with open(lease_path, 'w') as f:
+        f.write(str(time.time()))
+
+    previous_affinity = None
+    try:
+        leases = _live_leases()
+        threads = max(1, get_cores() // max(1, len(leases)))
+        if THREAD_BUDGET_AFFINITY and hasattr(os, 'sched_setaffinity'):
+            cpus = _affinity_slice(lease_name, leases, get_cores())
+            if cpus:
+                previous_affinity = os.sched_getaffinity(0)
+                # pid 0 is the calling thread; processes and threads it starts inherit the mask
+                os.sched_setaffinity(0, cpus)
+        logger.info(f"Job {job_id}: Thread budget {threads} of {get_cores()} cores ({len(leases)} active jobs)")
+        apply_torch_threads()
+        yield
+    finally:
+        if previous_affinity is not None:
+            os.sched_setaffinity(0, previous_affinity)
+        try:
+            os.remove(lease_path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,250 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+# Transcript cache.
+#
+# Transcribe, caption and generate/ass often run Whisper on the same audio.
+# Results are cached under LOCAL_STORAGE_PATH/transcript_cache, keyed by the
+# decoded audio's content hash plus model, backend, language, task and
+# word_timestamps. Each entry is one .npz file that stores segments and words
+# as parallel arrays, with strings packed into a single UTF-8 buffer plus
+# offsets, so nothing needs pickling.
+
+import os
+import json
+import time
+import uuid
+import hashlib
+import logging
+import numpy as np
+from services.audio_ingest import get_content_hash
+from config import (LOCAL_STORAGE_PATH, WHISPER_DEFAULT_MODEL, WHISPER_BACKEND,
+                    TRANSCRIPT_CACHE_TTL, TRANSCRIPT_CACHE_MAX_BYTES)
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.path.join(LOCAL_STORAGE_PATH, 'transcript_cache')
+FORMAT_VERSION = 1
+
+# Numeric per-segment fields kept as columns
+SEGMENT_FLOAT_FIELDS = ('start', 'end', 'temperature', 'avg_logprob', 'compression_ratio', 'no_speech_prob')
+
+def get_cache_key(content_hash, model_name=None, backend=None, language=None, task='transcribe', word_timestamps=False, variant=None):
+    parts = {
+        'audio': content_hash,
+        'model': model_name or WHISPER_DEFAULT_MODEL,
+        'backend': backend or WHISPER_BACKEND,
+        'language': language or 'auto',
+        'task': task or 'transcribe',
+        'word_timestamps': bool(word_timestamps),
+        'version': FORMAT_VERSION
+    }
+    if variant:
+        # Pipeline variations that change the output, e.g. 'vad'
+        parts['variant'] = variant
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode('utf-8')).hexdigest()
+
+def _offsets(lengths):
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(lengths, dtype=np.int64)
+    return offsets
+
+def _pack_strings(strings):
+    encoded = [string.encode('utf-8') for string in strings]
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), _offsets([len(data) for data in encoded])
+
+def _unpack_strings(data, offsets):
+    buffer = data.tobytes()
+    return [buffer[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(len(offsets) - 1)]
+
+def _pack_ragged(lists, dtype):
+    flat = np.array([value for values in lists for value in values], dtype=dtype)
+    return flat, _offsets([len(values) for values in lists])
+
+def encode_result(result):
+    """Convert a whisper-shaped result into columnar arrays for np.savez."""
+    segments = result['segments']
+    arrays = {
+        'seg_seek': np.array([segment.get('seek', 0) for segment in segments], dtype=np.int64)
+    }
+    for field in SEGMENT_FLOAT_FIELDS:
+        arrays[f'seg_{field}'] = np.array([segment.get(field, np.nan) for segment in segments], dtype=np.float64)
+    arrays['seg_text'], arrays['seg_text_offsets'] = _pack_strings([segment['text'] for segment in segments])
+    arrays['seg_tokens'], arrays['seg_tokens_offsets'] = _pack_ragged([segment.get('tokens', []) for segment in segments], np.int32)
+
+    has_words = any('words' in segment for segment in segments)
+    if has_words:
+        words = [word for segment in segments for word in segment.get('words', [])]
+        arrays['word_offsets'] = _offsets([len(segment.get('words', [])) for segment in segments])
+        arrays['word_start'] = np.array([word['start'] for word in words], dtype=np.float64)
+        arrays['word_end'] = np.array([word['end'] for word in words], dtype=np.float64)
+        arrays['word_probability'] = np.array([word.get('probability', np.nan) for word in words], dtype=np.float32)
+        arrays['word_text'], arrays['word_text_offsets'] = _pack_strings([word['word'] for word in words])
+
+    text_data, _ = _pack_strings([result.get('text', '')])
+    arrays['text'] = text_data
+    arrays['language'] = np.array(result.get('language') or '')
+    if result.get('vad'):
+        arrays['vad'] = np.array(json.dumps(result['vad']))
+    return arrays
+
+def _optional_float(value):
+    return None if np.isnan(value) else float(value)
+
+def decode_result(arrays, include_words=True):
+    """Rebuild a whisper-shaped result from encode_result() arrays."""
+    texts = _unpack_strings(arrays['seg_text'], arrays['seg_text_offsets'])
+    tokens, token_offsets = arrays['seg_tokens'], arrays['seg_tokens_offsets']
+    has_words = include_words and 'word_offsets' in arrays
+    if has_words:
+        word_offsets = arrays['word_offsets']
+        word_texts = _unpack_strings(arrays['word_text'], arrays['word_text_offsets'])
+
+    segments = []
+    for i, text in enumerate(texts):
+        segment = {'id': i, 'seek': int(arrays['seg_seek'][i]), 'text': text,
+                   'tokens': tokens[token_offsets[i]:token_offsets[i + 1]].tolist()}
+        for field in SEGMENT_FLOAT_FIELDS:
+            value = _optional_float(arrays[f'seg_{field}'][i])
+            if value is not None:
+                segment[field] = value
+        if has_words:
+            segment['words'] = [
+                {'word': word_texts[j], 'start': float(arrays['word_start'][j]), 'end': float(arrays['word_end'][j]),
+                 'probability': _optional_float(arrays['word_probability'][j])}
+                for j in range(word_offsets[i], word_offsets[i + 1])
+            ]
+        segments.append(segment)
+
+    result = {
+        'text': arrays['text'].tobytes().decode('utf-8'),
+        'segments': segments,
+        'language': str(arrays['language']) or None
+    }
+    if 'vad' in arrays:
+        result['vad'] = json.loads(str(arrays['vad']))
+    return result
+
+def _entry_path(key):
+    return os.path.join(CACHE_DIR, f"{key}.npz")
+
+def load(key, include_words=True):
+    """Return the cached result for a key, or None if missing or expired."""
+    path = _entry_path(key)
+    try:
+        if time.time() - os.path.getmtime(path) > TRANSCRIPT_CACHE_TTL:
+            return None
+        with np.load(path, allow_pickle=False) as arrays:
+            result = decode_result(arrays, include_words)
+        os.utime(path)  # mark as recently used for pruning
+        return result
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable transcript cache entry {key}: {e}")
+        return None
+
+def store(key, result):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = _entry_path(key)
+    temp_path = f"{path}.{uuid.uuid4()}.tmp"
+    try:
+        with open(temp_path, 'wb') as f:
+            np.savez_compressed(f, **encode_result(result))
+        os.replace(temp_path, path)
+    except Exception as e:
+        logger.warning(f"Could not cache transcript {key}: {e}")
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    prune_transcript_cache()
+
+def lookup(audio, model_name=None, backend=None, variant=None, **options):
+    """
+    Find the cached transcript for `audio`.
+
+    A request without word timestamps is also served from an entry that has
+    them, with the words left out.
+
+    Returns:
+        tuple: (key to store a fresh result under, cached result or None)
+    """
+    content_hash = get_content_hash(audio.filename)
+    key_args = (content_hash, model_name, backend, options.get('language'), options.get('task'))
+    word_timestamps = bool(options.get('word_timestamps'))
+
+    key = get_cache_key(*key_args, word_timestamps=word_timestamps, variant=variant)
+    result = load(key)
+    if result is None and not word_timestamps:
+        result = load(get_cache_key(*key_args, word_timestamps=True, variant=variant), include_words=False)
+    return key, result
+
+def get_or_transcribe(audio, transcribe_fn, model_name=None, backend=None, job_id=None, on_segment=None, variant=None, **options):
+    """
+    Return the cached transcript for `audio` or compute and cache it.
+
+    Args:
+        audio (numpy.memmap): Cached PCM from services.audio_ingest
+        transcribe_fn (callable): Produces the whisper-shaped result on a miss
+        model_name, backend: Model selection, as passed to whisper_models.transcribe
+        on_segment (callable, optional): Receives each cached segment on a hit;
+            on a miss transcribe_fn is expected to report segments itself
+        variant (str, optional): Extra key component for pipeline options such as VAD
+        options: Whisper options; language, task and word_timestamps are part of the key
+    """
+    if TRANSCRIPT_CACHE_TTL <= 0:
+        return transcribe_fn()
+
+    key, result = lookup(audio, model_name, backend, variant, **options)
+    if result is not None:
+        logger.info(f"Job {job_id}: Using cached transcript {key[:12]}")
+        if on_segment is not None:
+            for segment in result['segments']:
+                on_segment(segment)
+        return result
+
+    result = transcribe_fn()
+    store(key, result)
+    return result
+
+def prune_transcript_cache():
+    """Drop expired entries, then least recently used ones until under TRANSCRIPT_CACHE_MAX_BYTES."""
+    try:
+        names = [name for name in os.listdir(CACHE_DIR) if name.endswith('.npz')]
+    except FileNotFoundError:
+        return
+
+    now = time.time()
+    entries = []
+    for name in names:
+        try:
+            stat = os.stat(os.path.join(CACHE_DIR, name))
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, name))
+
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    for last_used, size, name in entries:
+        if now - last_used <= TRANSCRIPT_CACHE_TTL and total <= TRANSCRIPT_CACHE_MAX_BYTES:
+            continue
+        try:
+            os.remove(os.path.join(CACHE_DIR, name))
+        except FileNotFoundError:
+            pass
+        total -= size
@@ -0,0 +1,334 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+import logging
+from abc import ABC, abstractmethod
+
+logger = logging.getLogger(__name__)
+
+# Model sizes accepted in requests; every backend understands these names
+MODEL_SIZES = [
+    "tiny", "tiny.en", "base", "base.en", "small", "small.en",
+    "medium", "medium.en", "large", "large-v1", "large-v2", "large-v3", "turbo"
+]
+
+# Whisper's decoding thresholds, used to judge batched single-pass decodes
+COMPRESSION_RATIO_THRESHOLD = 2.4
+LOGPROB_THRESHOLD = -1.0
+NO_SPEECH_THRESHOLD = 0.6
+TIMESTAMP_SECONDS = 0.02
+
+# Incremental decoding for engines without a segment callback: the audio is
+# transcribed in windows of about this length, cut at the quietest frame near
+# the window end
+STREAM_WINDOW_SECONDS = 30
+STREAM_CUT_SEARCH_SECONDS = 5
+STREAM_FRAME_SECONDS = 0.02
+SAMPLE_RATE = 16000
+
+class TranscriptionBackend(ABC):
+    """
+    A speech-to-text engine. Every backend returns results shaped like
+    openai-whisper's transcribe(): {'text', 'segments', 'language'}, with
+    per-segment 'words' when word_timestamps is requested.
+
+    When `on_segment` is given, it is called with each segment (already in
+    its final form) as soon as it is decoded.
+    """
+
+    name = None
+
+    @abstractmethod
+    def default_precision(self, device: str) -> str:
+        pass
+
+    @abstractmethod
+    def load(self, model_name: str, device: str, precision: str):
+        pass
+
+    @abstractmethod
+    def transcribe(self, model, audio, precision: str, on_segment=None, **options) -> dict:
+        pass
+
+    def transcribe_batch(self, model, audios, precision: str, **options) -> list:
+        """Transcribe several waveforms on one model; engines that can batch across inputs override this."""
+        return [self.transcribe(model, audio, precision, **options) for audio in audios]
+
+    @abstractmethod
+    def detect_language(self, model, windows, precision: str) -> list:
+        """Language probabilities ({code: probability}) for each 16 kHz waveform in `windows`."""
+        pass
+
+def find_stream_cut(audio, start, target):
+    """Sample index of the quietest frame in the few seconds before `target`."""
+    import numpy as np
+
+    frame = int(STREAM_FRAME_SECONDS * SAMPLE_RATE)
+    search_start = max(start + frame, target - int(STREAM_CUT_SEARCH_SECONDS * SAMPLE_RATE))
+    region = np.asarray(audio[search_start:target])
+    frames = len(region) // frame
+    if frames == 0:
+        return target
+    energy = np.square(region[:frames * frame].reshape(frames, frame)).mean(axis=1)
+    return search_start + int(np.argmin(energy)) * frame + frame // 2
+
+class WhisperBackend(TranscriptionBackend):
+    """openai-whisper on PyTorch."""
+
+    name = "whisper"
+
+    def default_precision(self, device):
+        # fp16 only helps on GPU; whisper falls back to fp32 on CPU with a warning
+        return 'fp16' if device.startswith('cuda') else 'fp32'
+
+    def load(self, model_name, device, precision):
+        import whisper
+        return whisper.load_model(model_name, device=device)
+
+    def transcribe(self, model, audio, precision, on_segment=None, **options):
+        options.setdefault('fp16', precision == 'fp16')
+        if on_segment is None or isinstance(audio, str):
+            result = model.transcribe(audio, **options)
+            if on_segment is not None:
+                for segment in result['segments']:
+                    on_segment(segment)
+            return result
+        return self._transcribe_windows(model, audio, on_segment, **options)
+
+    def transcribe_batch(self, model, audios, precision, **options):
+        """
+        Clips of up to 30 seconds are decoded together: one encoder pass and
+        one batched greedy decode for the whole group. Clips that are longer,
+        need word timestamps or a prompt, or whose batched decode looks
+        unreliable (whisper's compression ratio and log-probability
+        thresholds) go through the regular transcribe() with its temperature
+        fallback.
+        """
+        import numpy as np
+        import torch
+        import whisper
+        from whisper.tokenizer import get_tokenizer
+
+        results = [None] * len(audios)
+        needs_full_pass = options.get('word_timestamps') or options.get('initial_prompt')
+        batch = [] if needs_full_pass else [i for i, audio in enumerate(audios) if 0 < len(audio) <= whisper.audio.N_SAMPLES]
+
+        if batch:
+            mels = torch.stack([
+                whisper.log_mel_spectrogram(whisper.pad_or_trim(torch.from_numpy(np.asarray(audios[i], dtype=np.float32))),
+                                            model.dims.n_mels)
+                for i in batch
+            ]).to(model.device)
+            fp16 = options.get('fp16', precision == 'fp16')
+            if fp16:
+                mels = mels.half()
+            # English-only models have no language token to detect
+            language = options.get('language') or (None if model.is_multilingual else 'en')
+            decoded = whisper.decode(model, mels, whisper.DecodingOptions(
+                task=options.get('task', 'transcribe'), language=language, temperature=0.0, fp16=fp16
+            ))
+            tokenizer = get_tokenizer(model.is_multilingual, num_languages=model.num_languages)
+
+            compression_threshold = options.get('compression_ratio_threshold', COMPRESSION_RATIO_THRESHOLD)
+            logprob_threshold = options.get('logprob_threshold', LOGPROB_THRESHOLD)
+            no_speech_threshold = options.get('no_speech_threshold', NO_SPEECH_THRESHOLD)
+            for i, result in zip(batch, decoded):
+                duration = len(audios[i]) / SAMPLE_RATE
+                low_confidence = logprob_threshold is not None and result.avg_logprob < logprob_threshold
+                if no_speech_threshold is not None and result.no_speech_prob > no_speech_threshold and low_confidence:
+                    results[i] = {'text': '', 'segments': [], 'language': result.language}
+                elif not low_confidence and (compression_threshold is None or result.compression_ratio <= compression_threshold):
+                    results[i] = self._result_from_tokens(tokenizer, result, duration)
+
+        for i, audio in enumerate(audios):
+            if results[i] is None:
+                results[i] = self.transcribe(model, audio, precision, **options)
+        return results
+
+    def _result_from_tokens(self, tokenizer, decoded, duration):
+        """Split a timestamped decode into whisper-style segments."""
+        segments = []
+        start, text_tokens = None, []
+
+        def close(end):
+            # Text without an opening timestamp continues from the previous segment
+            segment_start = start if start is not None else (segments[-1]['end'] if segments else 0.0)
+            segments.append({
+                'id': len(segments), 'seek': 0, 'start': segment_start, 'end': min(end, duration),
+                'text': tokenizer.decode(text_tokens), 'tokens': list(text_tokens), 'temperature': 0.0,
+                'avg_logprob': decoded.avg_logprob, 'compression_ratio': decoded.compression_ratio,
+                'no_speech_prob': decoded.no_speech_prob
+            })
+
+        for token in decoded.tokens:
+            if token < tokenizer.timestamp_begin:
+                text_tokens.append(token)
+                continue
+            time = (token - tokenizer.timestamp_begin) * TIMESTAMP_SECONDS
+            if text_tokens:
+                close(time)
+                start, text_tokens = None, []
+            else:
+                start = time
+        if text_tokens:
+            close(duration)
+
+        return {
+            'text': ''.join(segment['text'] for segment in segments),
+            'segments': segments,
+            'language': decoded.language
+        }
+
+    def detect_language(self, model, windows, precision):
+        import numpy as np
+        import torch
+        import whisper
+
+        if not model.is_multilingual:
+            return [{'en': 1.0} for _ in windows]
+        # Each window becomes one 30s log-mel frame and all of them go through
+        # the encoder and the language token in a single batch
+        mels = torch.stack([
+            whisper.log_mel_spectrogram(whisper.pad_or_trim(torch.from_numpy(np.asarray(window, dtype=np.float32))),
+                                        model.dims.n_mels)
+            for window in windows
+        ]).to(model.device)
+        if precision == 'fp16':
+            mels = mels.half()
+        _, probs = model.detect_language(mels)
+        return probs
+
+    def _transcribe_windows(self, model, audio, on_segment, **options):
+        """
+        whisper has no per-segment callback, so decode window by window and
+        report each window's segments as it finishes. The previous window's
+        text is passed as the prompt to keep context across cuts, after the
+        caller's own initial_prompt, which (as in whisper) applies throughout.
+        """
+        window = STREAM_WINDOW_SECONDS * SAMPLE_RATE
+        segments = []
+        language = options.get('language')
+        position = 0
+        while position < len(audio):
+            end = len(audio) if len(audio) - position <= window else find_stream_cut(audio, position, position + window)
+            window_options = dict(options, language=language)
+            if segments and options.get('condition_on_previous_text', True):
+                previous_text = ''.join(segment['text'] for segment in segments[-5:])
+                window_options['initial_prompt'] = (options.get('initial_prompt') or '') + previous_text
+            result = model.transcribe(audio[position:end], **window_options)
+            # Later windows reuse the detected language instead of detecting it again
+            language = language or result.get('language')
+
+            offset = position / SAMPLE_RATE
+            for segment in result['segments']:
+                segment['id'] = len(segments)
+                segment['start'] += offset
+                segment['end'] += offset
+                for word in segment.get('words', []):
+                    word['start'] += offset
+                    word['end'] += offset
+                segments.append(segment)
+                on_segment(segment)
+            position = end
+
+        return {
+            'text': ''.join(segment['text'] for segment in segments),
+            'segments': segments,
+            'language': language
+        }
+
+class FasterWhisperBackend(TranscriptionBackend):
+    """CTranslate2 via faster-whisper; int8 weights by default on CPU."""
+
+    name = "faster_whisper"
+
+    # whisper.transcribe options that map directly onto faster-whisper
+    PASSTHROUGH_OPTIONS = (
+        'task', 'language', 'word_timestamps', 'initial_prompt', 'temperature',
+        'condition_on_previous_text', 'compression_ratio_threshold',
+        'no_speech_threshold', 'beam_size', 'best_of', 'patience'
+    )
+
+    def default_precision(self, device):
+        return 'float16' if device.startswith('cuda') else 'int8'
+
+    def load(self, model_name, device, precision):
+        try:
+            from faster_whisper import WhisperModel
+        except ImportError:
+            raise RuntimeError("The faster_whisper backend requires the faster-whisper package")
+        return WhisperModel(model_name, device=device, compute_type=precision)
+
+    def transcribe(self, model, audio, precision, on_segment=None, **options):
+        kwargs = {key: options[key] for key in self.PASSTHROUGH_OPTIONS if options.get(key) is not None}
+        if 'logprob_threshold' in options:
+            kwargs['log_prob_threshold'] = options['logprob_threshold']
+        word_timestamps = kwargs.get('word_timestamps', False)
+
+        segments, info = model.transcribe(audio, **kwargs)
+
+        # Rebuild whisper's result layout so downstream SRT/ASS code is backend-agnostic
+        result_segments = []
+        for index, segment in enumerate(segments):
+            result_segment = {
+                'id': index,
+                'seek': segment.seek,
+                'start': segment.start,
+                'end': segment.end,
+                'text': segment.text,
+                'tokens': list(segment.tokens),
+                'temperature': segment.temperature,
+                'avg_logprob': segment.avg_logprob,
+                'compression_ratio': segment.compression_ratio,
+                'no_speech_prob': segment.no_speech_prob
+            }
+            if word_timestamps:
+                result_segment['words'] = [
+                    {'word': word.word, 'start': word.start, 'end': word.end, 'probability': word.probability}
+                    for word in (segment.words or [])
+                ]
+            result_segments.append(result_segment)
+            # faster-whisper decodes lazily, so each segment is reported as it is produced
+            if on_segment is not None:
+                on_segment(result_segment)
+
+        return {
+            'text': ''.join(segment['text'] for segment in result_segments),
+            'segments': result_segments,
+            'language': info.language
+        }
+
+    def detect_language(self, model, windows, precision):
+        import numpy as np
+
+        results = []
+        for window in windows:
+            # transcribe() detects the language up front and decodes lazily, so
+            # leaving the segment generator unconsumed costs one encoder pass
+            _, info = model.transcribe(np.asarray(window, dtype=np.float32))
+            probs = info.all_language_probs or [(info.language, info.language_probability)]
+            results.append(dict(probs))
+        return results
+
+BACKENDS = {backend.name: backend for backend in (WhisperBackend(), FasterWhisperBackend())}
+
+def get_backend(name):
+    try:
+        return BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown transcription backend '{name}'. Available: {', '.join(BACKENDS)}")
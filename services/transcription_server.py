@@ -0,0 +1,243 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+# Shared transcription sidecar.
+#
+# When TRANSCRIPTION_SERVER_SOCKET is set, gunicorn starts one instance of this
+# module next to the workers. It owns the Whisper models (loaded once per
+# container instead of once per worker) and workers send transcription requests
+# to it over a Unix socket. Requests from all workers are grouped by model so a
+# batch runs on one warm model; waveforms with the same options in a batch go
+# through the backend's batched transcribe_batch together.
+#
+# Run standalone with: python -m services.transcription_server
+
+import os
+import sys
+import time
+import pickle
+import hashlib
+import logging
+import threading
+import subprocess
+from collections import OrderedDict, deque
+from multiprocessing.connection import Listener, Client
+from config import (TRANSCRIPTION_SERVER_SOCKET, TRANSCRIPTION_SERVER_WORKERS,
+                    TRANSCRIPTION_SERVER_MAX_BATCH)
+
+logger = logging.getLogger(__name__)
+
+CONNECT_RETRIES = 3
+
+def get_authkey():
+    """Connections are authenticated with a key derived from the API key."""
+    return hashlib.sha256(f"transcription-server:{os.environ.get('API_KEY', '')}".encode('utf-8')).digest()
+
+class TranscriptionRequest:
+    def __init__(self, key, audio, options):
+        self.key = key
+        self.audio = audio
+        self.options = options
+        self.response = None
+        self.done = threading.Event()
+
+class TranscriptionServer:
+    """Accepts requests on a Unix socket and runs them grouped by model key."""
+
+    def __init__(self, socket_path, workers=1, max_batch=8):
+        self.socket_path = socket_path
+        self.workers = workers
+        self.max_batch = max_batch
+        # model key -> queued requests, in order of each key's oldest request
+        self._pending = OrderedDict()
+        self._condition = threading.Condition()
+
+    def submit(self, request):
+        with self._condition:
+            self._pending.setdefault(request.key, deque()).append(request)
+            self._condition.notify()
+
+    def _next_batch(self):
+        """Take up to max_batch queued requests for the model with the oldest waiting request."""
+        with self._condition:
+            while not self._pending:
+                self._condition.wait()
+            key, queue = next(iter(self._pending.items()))
+            batch = [queue.popleft() for _ in range(min(self.max_batch, len(queue)))]
+            if queue:
+                # Requeue behind other models so one busy model cannot starve the rest
+                self._pending.move_to_end(key)
+            else:
+                del self._pending[key]
+            return key, batch
+
+    @staticmethod
+    def _group_by_options(batch):
+        """Waveform requests with identical options share a group; file paths run on their own."""
+        groups = OrderedDict()
+        for request in batch:
+            if isinstance(request.audio, str):
+                groups[id(request)] = [request]
+            else:
+                groups.setdefault(repr(sorted(request.options.items())), []).append(request)
+        return list(groups.values())
+
+    @staticmethod
+    def _run_group(backend, model, precision, requests):
+        if len(requests) > 1:
+            try:
+                results = backend.transcribe_batch(model, [request.audio for request in requests], precision,
+                                                   **requests[0].options)
+                for request, result in zip(requests, results):
+                    request.response = {'ok': True, 'result': result}
+                    request.done.set()
+                return
+            except Exception as e:
+                # Retry one by one so each request gets its own result or error
+                logger.warning(f"Batched transcription of {len(requests)} requests failed, running them separately: {e}")
+
+        for request in requests:
+            try:
+                result = backend.transcribe(model, request.audio, precision, **request.options)
+                request.response = {'ok': True, 'result': result}
+            except Exception as e:
+                logger.error(f"Transcription failed: {e}")
+                request.response = {'ok': False, 'error': str(e)}
+            request.done.set()
+
+    def _run_batches(self):
+        from services import whisper_models
+        from services.transcription_backends import get_backend
+
+        while True:
+            key, batch = self._next_batch()
+            start_time = time.time()
+            try:
+                # Hold the model once for the whole batch
+                with whisper_models.use_model(*key) as model:
+                    backend = get_backend(key[3])
+                    for requests in self._group_by_options(batch):
+                        self._run_group(backend, model, key[2], requests)
+            except Exception as e:
+                logger.error(f"Could not load model {key}: {e}")
+                for request in batch:
+                    if not request.done.is_set():
+                        request.response = {'ok': False, 'error': str(e)}
+                        request.done.set()
+            logger.info(f"Ran batch of {len(batch)} request(s) on {key} in {time.time() - start_time:.2f}s")
+
+    def _handle_connection(self, conn):
+        from services import whisper_models
+
+        try:
+            message = conn.recv()
+            # Resolve device/precision here so workers never need to import torch
+            key = whisper_models.get_model_key(*message['model'])
+            audio = message['audio']
+            if isinstance(audio, dict):
+                from services.audio_ingest import load_pcm
+                audio = load_pcm(audio['pcm_path'])
+            request = TranscriptionRequest(key, audio, message['options'])
+            self.submit(request)
+            request.done.wait()
+            conn.send(request.response)
+        except EOFError:
+            pass
+        except Exception as e:
+            logger.error(f"Error handling transcription request: {e}")
+        finally:
+            conn.close()
+
+    def serve_forever(self):
+        from services import whisper_models
+
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        listener = Listener(self.socket_path, family='AF_UNIX', authkey=get_authkey())
+        os.chmod(self.socket_path, 0o600)
+
+        whisper_models.preload_models()
+        for _ in range(self.workers):
+            threading.Thread(target=self._run_batches, daemon=True).start()
+        logger.info(f"Transcription server listening on {self.socket_path} (PID {os.getpid()})")
+
+        try:
+            while True:
+                try:
+                    conn = listener.accept()
+                except Exception as e:
+                    # A failed handshake should not take the server down
+                    logger.warning(f"Rejected transcription client: {e}")
+                    continue
+                threading.Thread(target=self._handle_connection, args=(conn,), daemon=True).start()
+        finally:
+            listener.close()
+
+def is_enabled():
+    return bool(TRANSCRIPTION_SERVER_SOCKET)
+
+def transcribe_remote(audio, model_name=None, device=None, precision=None, backend=None, **options):
+    """
+    Send a transcription to the sidecar and wait for the result.
+
+    Args:
+        audio: Path to a media file (shared filesystem), a float32 waveform, or
+            a memmap of cached PCM from services.audio_ingest
+        model_name, device, precision, backend: Model selection, resolved by the server
+        options: Keyword arguments for model.transcribe
+
+    Raises:
+        ConnectionError: if the server cannot be reached or the connection breaks
+            before a response arrives (e.g. the server exits mid-request)
+        RuntimeError: if the transcription failed on the server
+    """
+    for attempt in range(CONNECT_RETRIES):
+        try:
+            conn = Client(TRANSCRIPTION_SERVER_SOCKET, family='AF_UNIX', authkey=get_authkey())
+            break
+        except (FileNotFoundError, ConnectionRefusedError) as e:
+            if attempt == CONNECT_RETRIES - 1:
+                raise ConnectionError(f"Transcription server unavailable at {TRANSCRIPTION_SERVER_SOCKET}: {e}")
+            time.sleep(1)
+
+    # A memmap of a whole cached PCM file is sent by path instead of by value
+    pcm_path = getattr(audio, 'filename', None)
+    if pcm_path and audio.nbytes == os.path.getsize(pcm_path):
+        audio = {'pcm_path': pcm_path}
+
+    try:
+        with conn:
+            conn.send({'model': [model_name, device, precision, backend], 'audio': audio, 'options': options})
+            response = conn.recv()
+    except (EOFError, OSError, pickle.UnpicklingError) as e:
+        raise ConnectionError(f"Lost connection to transcription server at {TRANSCRIPTION_SERVER_SOCKET}: {e!r}")
+    if not response['ok']:
+        raise RuntimeError(f"Transcription server error: {response['error']}")
+    return response['result']
+
+def start_server_process():
+    """Launch the sidecar as a separate process (used by the gunicorn on_starting hook)."""
+    logger.info(f"Starting transcription server on {TRANSCRIPTION_SERVER_SOCKET}")
+    return subprocess.Popen([sys.executable, '-m', 'services.transcription_server'], cwd=os.getcwd())
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    if not TRANSCRIPTION_SERVER_SOCKET:
+        raise SystemExit("TRANSCRIPTION_SERVER_SOCKET is not set")
+    TranscriptionServer(TRANSCRIPTION_SERVER_SOCKET, TRANSCRIPTION_SERVER_WORKERS,
+                        TRANSCRIPTION_SERVER_MAX_BATCH).serve_forever()
@@ -21,6 +21,7 @@ import subprocess
 import json
 import re
 from services.file_management import download_file
+from services import thread_budget
 from config import LOCAL_STORAGE_PATH
 
 def get_extension_from_format(format_name):
@@ -101,10 +102,14 @@ def process_ffmpeg_compose(data, job_id):
     command = ["ffmpeg"]
     
     # Add global options
-    for option in data.get("global_options", []):
+    global_options = data.get("global_options", [])
+    for option in global_options:
         command.append(option["option"])
         if "argument" in option and option["argument"] is not None:
             command.append(str(option["argument"]))
+    # Thread counts the caller set explicitly take precedence over the host budget
+    if not any(option["option"] in ("-filter_threads", "-filter_complex_threads") for option in global_options):
+        command.extend(thread_budget.ffmpeg_global_args())
     
     # Add inputs
     input_paths = []
@@ -152,6 +157,8 @@ def process_ffmpeg_compose(data, job_id):
             command.append(option["option"])
             if "argument" in option and option["argument"] is not None:
                 command.append(str(option["argument"]))
+        if not any(option["option"] == "-threads" for option in output["options"]):
+            command.extend(thread_budget.ffmpeg_output_args())
         command.append(output_filename)
     
     # Execute FFmpeg command
@@ -0,0 +1,228 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+# Segment-parallel video encoding.
+#
+# A single libx264 process stops scaling after a handful of threads, so long
+# inputs are split on the timeline at keyframes and the chunks are encoded by
+# several ffmpeg processes at once, all with the same settings. The audio is
+# encoded once as a whole (chunked AAC would leave priming gaps at every
+# boundary) and the video chunks are joined to it with the concat demuxer
+# and stream copy, so the stitch itself is lossless.
+#
+# A video filter is applied to every chunk with the chunk's frames at their
+# original timestamps, so it must be time-local: the output at time t may only
+# depend on the input at time t (ASS burn-in, scaling, overlays, fades at
+# fixed times). Filters that carry state across frames are not safe here.
+
+import os
+import json
+import shutil
+import logging
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from services import thread_budget
+from config import LOCAL_STORAGE_PATH, PARALLEL_ENCODE_WORKERS, PARALLEL_ENCODE_MIN_CHUNK_SECONDS
+
+logger = logging.getLogger(__name__)
+
+THREADS_PER_WORKER = 4  # x264 threads per chunk process when the worker count is derived
+CHUNKS_PER_WORKER = 2   # Extra chunks so a slow chunk does not leave other workers idle
+
+def get_workers():
+    """Encoder processes to run at once: PARALLEL_ENCODE_WORKERS, else derived from the thread budget."""
+    if PARALLEL_ENCODE_WORKERS > 0:
+        return PARALLEL_ENCODE_WORKERS
+    return max(1, thread_budget.get_threads() // THREADS_PER_WORKER)
+
+def probe_media(path):
+    """Return (start_time, duration, has_audio) of a media file."""
+    cmd = [
+        'ffprobe', '-v', 'error',
+        '-show_entries', 'format=start_time,duration:stream=codec_type',
+        '-of', 'json', path
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise Exception(f"FFprobe error: {result.stderr}")
+    info = json.loads(result.stdout)
+    media_format = info.get('format', {})
+    has_audio = any(stream.get('codec_type') == 'audio' for stream in info.get('streams', []))
+    return float(media_format.get('start_time') or 0), float(media_format.get('duration') or 0), has_audio
+
+def find_keyframes(path, times, start_time=0):
+    """
+    Keyframe timestamps at or just before each of `times` (seconds from the
+    start of the file). Only one packet is read after a seek to each time, so
+    the cost does not grow with the length of the file.
+    """
+    if not times:
+        return []
+    intervals = ','.join(f"{start_time + t:.3f}%+#1" for t in times)
+    cmd = [
+        'ffprobe', '-v', 'error',
+        '-select_streams', 'v:0',
+        '-read_intervals', intervals,
+        '-show_entries', 'packet=pts_time,flags',
+        '-of', 'csv=p=0', path
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise Exception(f"FFprobe error: {result.stderr}")
+
+    keyframes = set()
+    for line in result.stdout.splitlines():
+        pts_time, _, flags = line.partition(',')
+        if 'K' in flags and pts_time not in ('', 'N/A'):
+            keyframes.add(round(float(pts_time) - start_time, 6))
+    return sorted(keyframes)
+
+def plan_chunks(path, ranges, start_time, workers):
+    """
+    Split each (start, end) range into chunks that start at keyframes, about
+    CHUNKS_PER_WORKER per worker overall and none shorter than
+    PARALLEL_ENCODE_MIN_CHUNK_SECONDS. Range edges are kept as they are.
+
+    Returns:
+        list: (start, end) of every chunk, in output order
+    """
+    total = sum(end - start for start, end in ranges)
+    chunk_length = max(PARALLEL_ENCODE_MIN_CHUNK_SECONDS, total / (workers * CHUNKS_PER_WORKER))
+
+    targets = []
+    for start, end in ranges:
+        count = int((end - start) // chunk_length)
+        targets.extend(start + (end - start) * i / count for i in range(1, count))
+    keyframes = find_keyframes(path, targets, start_time)
+
+    chunks = []
+    min_gap = PARALLEL_ENCODE_MIN_CHUNK_SECONDS / 2
+    for start, end in ranges:
+        boundaries = [start]
+        for keyframe in keyframes:
+            if boundaries[-1] + min_gap <= keyframe <= end - min_gap:
+                boundaries.append(keyframe)
+        boundaries.append(end)
+        chunks.extend(zip(boundaries, boundaries[1:]))
+    return chunks
+
+def _run(cmd, description):
+    logger.info(f"Running FFmpeg for {description}: {' '.join(cmd)}")
+    process = subprocess.run(cmd, capture_output=True, text=True)
+    if process.returncode != 0:
+        logger.error(f"Error during {description}: {process.stderr}")
+        raise Exception(f"FFmpeg error: {process.stderr}")
+
+def _video_filter_args(video_filter, offset):
+    if not video_filter:
+        return []
+    # Give the filter each frame at its original timestamp, then restart the chunk at zero
+    return ['-vf', f"setpts=PTS-STARTPTS+{offset:.6f}/TB,{video_filter},setpts=PTS-STARTPTS"]
+
+def encode_chunked(input_path, output_path, video_args, audio_args=(), ranges=None, video_filter=None,
+                   output_args=(), job_id=None):
+    """
+    Encode the video in keyframe-aligned chunks in parallel and stitch them losslessly.
+
+    Args:
+        input_path (str): Local source file
+        output_path (str): Output file
+        video_args (list): Video encoder options, identical for every chunk (e.g. ['-c:v', 'libx264', '-crf', '23'])
+        audio_args (list, optional): Audio encoder options for the first audio track (e.g. ['-c:a', 'copy'])
+        ranges (list, optional): (start, end) seconds of the source to keep, in output order;
+            the whole file if omitted
+        video_filter (str, optional): Time-local filter graph applied to every chunk (e.g. "subtitles='x.ass'")
+        output_args (list, optional): Options for the final output (e.g. ['-f', 'mp4'])
+        job_id (str, optional): Job identifier used for logging and temporary file names
+
+    Returns:
+        str: output_path
+    """
+    start_time, duration, has_audio = probe_media(input_path)
+    ranges = [(max(0, start), min(end, duration) if duration else end) for start, end in (ranges or [(0, duration)])]
+    ranges = [(start, end) for start, end in ranges if end > start]
+    if not ranges:
+        raise ValueError("Nothing to encode: the requested ranges are empty")
+
+    workers = get_workers()
+    chunks = plan_chunks(input_path, ranges, start_time, workers) if workers > 1 else list(ranges)
+    video_args = list(video_args)
+    if '-threads' not in video_args:
+        video_args += ['-threads', str(max(1, thread_budget.get_threads() // min(workers, len(chunks))))]
+
+    if len(chunks) == 1:
+        # Not worth splitting: one regular encode
+        start, end = chunks[0]
+        cmd = ['ffmpeg', '-y', '-ss', f"{start:.6f}", '-i', input_path, '-t', f"{end - start:.6f}",
+               *_video_filter_args(video_filter, start), *video_args, *(audio_args if has_audio else ['-an']),
+               *output_args, output_path]
+        _run(cmd, f"job {job_id} single-pass encode")
+        return output_path
+
+    logger.info(f"Job {job_id}: Encoding {len(chunks)} chunks with {workers} parallel workers")
+    work_dir = tempfile.mkdtemp(prefix=f"{job_id}_chunks_", dir=LOCAL_STORAGE_PATH)
+    try:
+        chunk_paths = [os.path.join(work_dir, f"chunk_{index:04d}.mkv") for index in range(len(chunks))]
+        audio_path = os.path.join(work_dir, 'audio.mka')
+
+        def encode_chunk(index):
+            start, end = chunks[index]
+            cmd = ['ffmpeg', '-y', '-ss', f"{start:.6f}", '-i', input_path, '-t', f"{end - start:.6f}",
+                   '-map', '0:v:0', '-an', '-sn', *_video_filter_args(video_filter, start), *video_args,
+                   chunk_paths[index]]
+            _run(cmd, f"job {job_id} chunk {index + 1}/{len(chunks)} ({start:.2f}s-{end:.2f}s)")
+
+        def encode_audio():
+            # The concat demuxer cuts the source to the ranges, so copy and re-encode both work
+            audio_list = os.path.join(work_dir, 'audio.txt')
+            with open(audio_list, 'w') as f:
+                for start, end in ranges:
+                    # inpoint/outpoint are file timestamps, unlike -ss which counts from the start
+                    f.write(f"file '{os.path.abspath(input_path)}'\n"
+                            f"inpoint {start_time + start:.6f}\noutpoint {start_time + end:.6f}\n")
+            cmd = ['ffmpeg', '-y', '-f', 'concat', '-safe', '0', '-i', audio_list,
+                   '-map', '0:a:0', '-vn', *audio_args, audio_path]
+            _run(cmd, f"job {job_id} audio")
+
+        with ThreadPoolExecutor(max_workers=workers + 1) as executor:
+            futures = [executor.submit(encode_chunk, index) for index in range(len(chunks))]
+            if has_audio:
+                futures.append(executor.submit(encode_audio))
+            try:
+                for future in futures:
+                    future.result()
+            except Exception:
+                # Do not start the remaining chunks once one has failed
+                for future in futures:
+                    future.cancel()
+                raise
+
+        video_list = os.path.join(work_dir, 'video.txt')
+        with open(video_list, 'w') as f:
+            for chunk_path in chunk_paths:
+                f.write(f"file '{chunk_path}'\n")
+
+        cmd = ['ffmpeg', '-y', '-f', 'concat', '-safe', '0', '-i', video_list]
+        if has_audio:
+            cmd += ['-i', audio_path, '-map', '0:v:0', '-map', '1:a:0']
+        cmd += ['-c', 'copy', *output_args, output_path]
+        _run(cmd, f"job {job_id} chunk concatenation")
+        return output_path
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
@@ -21,6 +21,7 @@ import subprocess
 import logging
 from services.file_management import download_file
 from PIL import Image
+from services import thread_budget
 from config import LOCAL_STORAGE_PATH
 logger = logging.getLogger(__name__)
 
@@ -56,9 +57,9 @@ def process_image_to_video(image_url, length, frame_rate, zoom_speed, job_id, we
 
         # Prepare FFmpeg command with fps filter to ensure correct frame rate
         cmd = [
-            'ffmpeg', '-framerate', str(frame_rate), '-loop', '1', '-i', image_path,
+            'ffmpeg', *thread_budget.ffmpeg_global_args(), '-framerate', str(frame_rate), '-loop', '1', '-i', image_path,
             '-vf', f"scale={scale_dims},zoompan=z='min(1+({zoom_speed}*{length})*on/{total_frames}, {zoom_factor})':d={total_frames}:x='iw/2-(iw/zoom/2)':y='ih/2-(ih/zoom/2)':s={output_dims},fps={frame_rate}",
-            '-c:v', 'libx264', '-r', str(frame_rate), '-t', str(length), '-pix_fmt', 'yuv420p', output_path
+            '-c:v', 'libx264', *thread_budget.ffmpeg_output_args(), '-r', str(frame_rate), '-t', str(length), '-pix_fmt', 'yuv420p', output_path
         ]
 
         logger.info(f"Running FFmpeg command: {' '.join(cmd)}")
@@ -0,0 +1,168 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+# Batch transcription of many (typically short) files in one job.
+#
+# Files are fetched and decoded TRANSCRIBE_BATCH_PREFETCH at a time in the
+# background while earlier ones are transcribed. Decoded files are grouped
+# into batches of up to TRANSCRIBE_BATCH_SIZE and passed to the model in one
+# hold of the cached model (batched through the encoder and decoder where
+# the backend supports it). Each file's result is published as soon as its
+# batch finishes.
+
+import logging
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import srt
+from services import whisper_models, transcript_cache
+from services.audio_ingest import get_audio, SAMPLE_RATE
+from services.webhook import enqueue_webhook
+from app_utils import update_job_status
+from config import TRANSCRIBE_BATCH_SIZE, TRANSCRIBE_BATCH_PREFETCH, TRANSCRIPT_CACHE_TTL
+
+logger = logging.getLogger(__name__)
+
+def format_srt(segments):
+    return srt.compose([
+        srt.Subtitle(index, timedelta(seconds=segment['start']), timedelta(seconds=segment['end']), segment['text'].strip())
+        for index, segment in enumerate(segments, start=1)
+    ])
+
+class BatchResults:
+    """
+    Collects per-file results and publishes each one as it arrives: the job
+    status record gets the results so far under "progress", and the optional
+    progress webhook receives one "file" event per file.
+    """
+
+    def __init__(self, job_id, media_urls, include_srt=False, include_segments=False, progress_webhook_url=None, request_id=None):
+        self.job_id = job_id
+        self.media_urls = media_urls
+        self.include_srt = include_srt
+        self.include_segments = include_segments
+        self.progress_webhook_url = progress_webhook_url
+        self.request_id = request_id
+        self.results = [None] * len(media_urls)
+        self.sequence = 0
+
+    @property
+    def failed(self):
+        return sum(1 for result in self.results if result is not None and result['error'] is not None)
+
+    def add(self, index, transcript=None, duration=None, error=None):
+        result = {"index": index, "media_url": self.media_urls[index], "error": error}
+        if transcript is not None:
+            result.update(text=transcript['text'], language=transcript.get('language'),
+                          duration=round(duration, 3) if duration is not None else None)
+            if self.include_srt:
+                result['srt'] = format_srt(transcript['segments'])
+            if self.include_segments:
+                result['segments'] = transcript['segments']
+        self.results[index] = result
+        self.publish(result)
+
+    def publish(self, result):
+        completed = [result for result in self.results if result is not None]
+        try:
+            update_job_status(self.job_id, {"progress": {
+                "files_done": len(completed),
+                "files_failed": self.failed,
+                "files_total": len(self.results),
+                "results": completed
+            }})
+        except Exception as e:
+            logger.warning(f"Job {self.job_id}: Could not record batch progress: {e}")
+
+        if self.progress_webhook_url:
+            # Deliveries may arrive out of order; receivers can order them by sequence
+            self.sequence += 1
+            enqueue_webhook(self.progress_webhook_url, dict(
+                result, event="file", job_id=self.job_id, id=self.request_id, sequence=self.sequence,
+                files_done=len(completed), files_total=len(self.results)
+            ))
+
+def transcribe_batch(media_urls, job_id, task='transcribe', language=None, word_timestamps=False, include_srt=False,
+                     include_segments=False, model=None, backend=None, progress_webhook_url=None, request_id=None):
+    """
+    Transcribe a list of media URLs on one warm model.
+
+    A file that cannot be fetched or transcribed is reported with an `error`
+    and does not fail the rest of the batch.
+
+    Returns:
+        dict: 'results' in input order, 'files_total' and 'files_failed'
+    """
+    options = {"task": task, "word_timestamps": word_timestamps, "verbose": False}
+    if language:
+        options["language"] = language
+
+    results = BatchResults(job_id, media_urls, include_srt, include_segments, progress_webhook_url, request_id)
+    pending = []  # (index, audio, transcript cache key)
+
+    def flush():
+        if not pending:
+            return
+        logger.info(f"Job {job_id}: Transcribing a batch of {len(pending)} files")
+        try:
+            transcripts = whisper_models.transcribe_batch([audio for _, audio, _ in pending], model_name=model,
+                                                          backend=backend, **options)
+        except Exception as e:
+            logger.error(f"Job {job_id}: Batch of {len(pending)} files failed: {e}")
+            for index, _, _ in pending:
+                results.add(index, error=str(e))
+        else:
+            for (index, audio, key), transcript in zip(pending, transcripts):
+                if key is not None:
+                    transcript_cache.store(key, transcript)
+                results.add(index, transcript, len(audio) / SAMPLE_RATE)
+        pending.clear()
+
+    def prepare(index, future):
+        try:
+            audio = future.result()
+        except Exception as e:
+            logger.error(f"Job {job_id}: Could not fetch {media_urls[index]}: {e}")
+            results.add(index, error=str(e))
+            return
+
+        key = None
+        if TRANSCRIPT_CACHE_TTL > 0:
+            key, cached = transcript_cache.lookup(audio, model, backend, **options)
+            if cached is not None:
+                results.add(index, cached, len(audio) / SAMPLE_RATE)
+                return
+        pending.append((index, audio, key))
+
+    with ThreadPoolExecutor(max_workers=max(1, min(TRANSCRIBE_BATCH_PREFETCH, len(media_urls)))) as executor:
+        futures = {executor.submit(get_audio, url, job_id=job_id): index for index, url in enumerate(media_urls)}
+        remaining = set(futures)
+        for future in as_completed(futures):
+            remaining.discard(future)
+            prepare(futures[future], future)
+            # Run a batch once it is full, or early when no other file is ready
+            # yet, so the model is not left idle while downloads finish
+            if len(pending) >= TRANSCRIBE_BATCH_SIZE or not any(other.done() for other in remaining):
+                flush()
+        flush()
+
+    logger.info(f"Job {job_id}: Batch transcription finished, {results.failed} of {len(media_urls)} files failed")
+    return {
+        "results": results.results,
+        "files_total": len(media_urls),
+        "files_failed": results.failed
+    }
@@ -19,13 +19,16 @@ import ffmpeg
 import subprocess
 import logging
 from services.file_management import download_file
+from services.output_sink import is_streamable_format, get_streaming_output_options, stream_ffmpeg_to_cloud
+from services import thread_budget
+from services.v1.ffmpeg.parallel_encode import encode_chunked
 from config import LOCAL_STORAGE_PATH
 
 # Set up logging
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
-def process_media_convert(media_url, job_id, output_format='mp4', video_codec='libx264', video_preset='medium', video_crf=23, audio_codec='aac', audio_bitrate='128k', webhook_url=None):
+def process_media_convert(media_url, job_id, output_format='mp4', video_codec='libx264', video_preset='medium', video_crf=23, audio_codec='aac', audio_bitrate='128k', webhook_url=None, stream_output=False, parallel_encode=False):
     """
     Convert media to specified format with customizable encoding settings.
     
@@ -39,9 +42,14 @@ def process_media_convert(media_url, job_id, output_format='mp4', video_codec='l
         audio_codec (str): Audio codec to use (default: 'aac')
         audio_bitrate (str): Audio bitrate (default: '128k')
         webhook_url (str, optional): URL to send completion webhook
+        stream_output (bool, optional): Pipe the encoder output straight into cloud storage
+            when the format allows it (fragmented MP4, MPEG-TS, MP3, ...)
+        parallel_encode (bool, optional): Encode keyframe-aligned chunks of the video in parallel
+            processes; ignored for audio-only formats, video copy and streamed outputs
         
     Returns:
-        str: Path to the converted output file
+        tuple: (location, streamed) - the cloud URL and True when the output was streamed,
+            otherwise the path to the local output file and False
     """
     input_filename = download_file(media_url, os.path.join(LOCAL_STORAGE_PATH, f"{job_id}_input"))
     output_filename = f"{job_id}.{output_format}"
@@ -93,16 +101,44 @@ def process_media_convert(media_url, job_id, output_format='mp4', video_codec='l
             # Apply audio bitrate when not using copy
             if audio_codec != 'copy':
                 output_options['b:a'] = audio_bitrate
+
+            # Share the cores with other running jobs
+            if video_codec != 'copy':
+                output_options.update(thread_budget.ffmpeg_output_options())
         
-        # Configure output
-        stream = ffmpeg.output(stream, output_path, **output_options)
-        
-        # Get the ffmpeg command for logging
-        cmd = ffmpeg.compile(stream)
-        logger.info(f"Running ffmpeg command: {' '.join(cmd)}")
-        
-        # Run the conversion
-        ffmpeg.run(stream, overwrite_output=True, capture_stdout=True, capture_stderr=True)
+        if stream_output and is_streamable_format(output_format):
+            output_options.update(get_streaming_output_options(output_format))
+            cmd = ffmpeg.compile(ffmpeg.output(stream, 'pipe:1', **output_options))
+            cloud_url = stream_ffmpeg_to_cloud(cmd, output_filename)
+
+            os.remove(input_filename)
+            logger.info(f"Media conversion streamed to cloud storage: {cloud_url} as format {output_format}")
+            return cloud_url, True
+        elif stream_output:
+            logger.warning(f"Format {output_format} cannot be streamed, falling back to a local output file")
+
+        if parallel_encode and output_format not in audio_only_formats and video_codec != 'copy':
+            audio_args = ['-c:a', audio_codec]
+            if audio_codec != 'copy':
+                audio_args += ['-b:a', audio_bitrate]
+            encode_chunked(
+                input_filename,
+                output_path,
+                ['-c:v', video_codec, '-preset', video_preset, '-crf', str(video_crf)],
+                audio_args,
+                output_args=['-f', output_format],
+                job_id=job_id
+            )
+        else:
+            # Configure output
+            stream = ffmpeg.output(stream, output_path, **output_options)
+
+            # Get the ffmpeg command for logging
+            cmd = ffmpeg.compile(stream)
+            logger.info(f"Running ffmpeg command: {' '.join(cmd)}")
+
+            # Run the conversion
+            ffmpeg.run(stream, overwrite_output=True, capture_stdout=True, capture_stderr=True)
         
         # Clean up input file
         os.remove(input_filename)
@@ -112,7 +148,7 @@ def process_media_convert(media_url, job_id, output_format='mp4', video_codec='l
         if not os.path.exists(output_path):
             raise FileNotFoundError(f"Output file {output_path} does not exist after conversion.")
 
-        return output_path
+        return output_path, False
 
     except Exception as e:
         error_msg = f"Media conversion failed: {str(e)}"
@@ -20,10 +20,16 @@ import os
 import ffmpeg
 import requests
 from services.file_management import download_file
+from services.output_sink import get_streaming_output_options, stream_ffmpeg_to_cloud
 from config import LOCAL_STORAGE_PATH
 
-def process_media_to_mp3(media_url, job_id, bitrate='128k', sample_rate=None):
-    """Convert media to MP3 format with specified bitrate and sample rate."""
+def process_media_to_mp3(media_url, job_id, bitrate='128k', sample_rate=None, stream_output=False):
+    """
+    Convert media to MP3 format with specified bitrate and sample rate.
+
+    With stream_output the encoder writes straight into cloud storage and the
+    cloud URL is returned instead of a local file path.
+    """
     input_filename = download_file(media_url, os.path.join(LOCAL_STORAGE_PATH, f"{job_id}_input"))
     output_filename = f"{job_id}.mp3"
     output_path = os.path.join(LOCAL_STORAGE_PATH, output_filename)
@@ -36,6 +42,16 @@ def process_media_to_mp3(media_url, job_id, bitrate='128k', sample_rate=None):
         # Only set sample rate if provided
         if sample_rate is not None:
             output_options['ar'] = sample_rate
+
+        if stream_output:
+            output_options.update(get_streaming_output_options('mp3'))
+            cmd = ffmpeg.compile(stream.output('pipe:1', **output_options))
+            try:
+                cloud_url = stream_ffmpeg_to_cloud(cmd, output_filename)
+            finally:
+                os.remove(input_filename)
+            print(f"Conversion streamed to cloud storage: {cloud_url} with bitrate {bitrate}")
+            return cloud_url
             
         # Convert media file to MP3 with specified options
         (
@@ -0,0 +1,111 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+# Spoken-language detection without transcription.
+#
+# A few short windows spread across the media are fetched with input seeking
+# (only those byte ranges are read for seekable sources), windows without
+# speech are dropped, and the rest go through the cached model's language
+# detection in one batch. Per-window probabilities are averaged, weighted by
+# the amount of speech in each window.
+
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from services import whisper_models, vad
+from services.audio_ingest import get_audio, probe_duration, SAMPLE_RATE
+from services.transcription_backends import get_backend
+
+logger = logging.getLogger(__name__)
+
+WINDOW_SECONDS = 10
+DEFAULT_WINDOWS = 3
+TOP_LANGUAGES = 5
+
+def plan_windows(duration, count=DEFAULT_WINDOWS, window_seconds=WINDOW_SECONDS):
+    """
+    (start, end) windows spaced evenly inside the media, away from the very
+    start and end where intros, outros and silence tend to be.
+    """
+    if duration is None:
+        return [(0, window_seconds)]
+    if duration <= window_seconds:
+        return [(0, None)]
+    count = max(1, min(count, int(duration // window_seconds)))
+    step = (duration - window_seconds) / (count + 1)
+    return [(round(step * (i + 1), 3), round(step * (i + 1) + window_seconds, 3)) for i in range(count)]
+
+def detect_language(media_url, model=None, backend=None, windows=DEFAULT_WINDOWS, job_id=None):
+    """
+    Detect the spoken language of a media file.
+
+    Returns:
+        dict: 'language', 'probability', the top 'languages' and per-window results
+    """
+    start_time = time.time()
+    duration = probe_duration(media_url)
+    planned = plan_windows(duration, windows)
+
+    with ThreadPoolExecutor(max_workers=len(planned)) as executor:
+        audio_windows = list(executor.map(
+            lambda window: get_audio(media_url, job_id=job_id, start=window[0], end=window[1]), planned
+        ))
+    logger.info(f"Job {job_id}: Fetched {len(planned)} audio windows in {time.time() - start_time:.2f}s")
+
+    speech = [sum(end - start for start, end in vad.detect_speech(audio)) / SAMPLE_RATE for audio in audio_windows]
+    selected = [i for i, seconds in enumerate(speech) if seconds > 0]
+    weights = speech
+    if not selected:
+        # No window has detectable speech; let the model judge all of them equally
+        selected = [i for i, audio in enumerate(audio_windows) if len(audio)]
+        weights = [1.0] * len(audio_windows)
+    if not selected:
+        raise ValueError("No audio could be decoded from the media")
+
+    key = whisper_models.get_model_key(model, backend=backend)
+    detect_start = time.time()
+    with whisper_models.use_model(*key) as loaded_model:
+        probabilities = get_backend(key[3]).detect_language(loaded_model, [audio_windows[i] for i in selected], key[2])
+    logger.info(f"Job {job_id}: Detected language on {len(selected)} windows in {time.time() - detect_start:.2f}s")
+
+    total_weight = sum(weights[i] for i in selected)
+    combined = {}
+    for i, probs in zip(selected, probabilities):
+        for language, probability in probs.items():
+            combined[language] = combined.get(language, 0.0) + probability * weights[i] / total_weight
+    ranked = sorted(combined.items(), key=lambda item: item[1], reverse=True)
+
+    window_results = []
+    for i, (start, end) in enumerate(planned):
+        window = {
+            'start': start,
+            'end': round(start + len(audio_windows[i]) / SAMPLE_RATE, 3),
+            'speech_seconds': round(speech[i], 2)
+        }
+        if i in selected:
+            language, probability = max(probabilities[selected.index(i)].items(), key=lambda item: item[1])
+            window.update(language=language, probability=round(probability, 4))
+        window_results.append(window)
+
+    return {
+        'language': ranked[0][0],
+        'probability': round(ranked[0][1], 4),
+        'languages': {language: round(probability, 4) for language, probability in ranked[:TOP_LANGUAGES]},
+        'windows': window_results,
+        'duration': duration
+    }
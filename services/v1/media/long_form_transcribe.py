@@ -0,0 +1,207 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+import re
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from services import vad as vad_filter, thread_budget
+from services.audio_ingest import SAMPLE_RATE, load_pcm
+from services.v1.media.silence import run_silencedetect
+from config import LONG_FORM_CHUNK_SECONDS, LONG_FORM_WORKERS, LONG_FORM_OVERLAP_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Split-point search: silences this quiet and long are candidate cut points
+SPLIT_NOISE_THRESHOLD = "-35dB"
+SPLIT_MIN_SILENCE = 0.3
+# A chunk may end anywhere between these fractions of the target length
+MIN_CHUNK_FRACTION = 0.5
+MAX_CHUNK_FRACTION = 1.5
+
+def plan_chunks(duration, silences, chunk_seconds=LONG_FORM_CHUNK_SECONDS, overlap=LONG_FORM_OVERLAP_SECONDS):
+    """
+    Split [0, duration] into chunks of roughly chunk_seconds, cutting in the
+    middle of a silence where possible.
+
+    Chunks cut inside speech (no usable silence) are extended by `overlap`
+    seconds on each side so the words at the cut are heard in full by one
+    of the two chunks; stitching keeps each word only once.
+
+    Returns:
+        list: dicts with 'start'/'end' (audio to transcribe) and
+              'own_start'/'own_end' (the range whose output this chunk keeps)
+    """
+    midpoints = [(start + end) / 2 for start, end, _ in silences]
+    cuts = []
+    position = 0.0
+    while duration - position > chunk_seconds * MAX_CHUNK_FRACTION:
+        target = position + chunk_seconds
+        window = [m for m in midpoints
+                  if position + chunk_seconds * MIN_CHUNK_FRACTION <= m <= position + chunk_seconds * MAX_CHUNK_FRACTION]
+        if window:
+            cut = min(window, key=lambda m: abs(m - target))
+            cuts.append((cut, True))
+        else:
+            cut = target
+            cuts.append((cut, False))
+        position = cut
+
+    boundaries = [(0.0, True)] + cuts + [(duration, True)]
+    chunks = []
+    for (own_start, start_clean), (own_end, end_clean) in zip(boundaries, boundaries[1:]):
+        chunks.append({
+            'start': own_start if start_clean else max(0.0, own_start - overlap),
+            'end': own_end if end_clean else min(duration, own_end + overlap),
+            'own_start': own_start,
+            'own_end': own_end
+        })
+    return chunks
+
+def _init_worker(threads_per_worker):
+    # Split the job's thread budget between workers instead of letting each torch
+    # pool claim all cores; the budget never raises a worker above this
+    try:
+        import torch
+        torch.set_num_threads(threads_per_worker)
+    except ImportError:
+        pass
+
+def _transcribe(audio, model_name, backend, vad, on_segment, options):
+    from services import whisper_models
+
+    transcribe = vad_filter.transcribe if vad else whisper_models.transcribe
+    return transcribe(audio, model_name=model_name, backend=backend, on_segment=on_segment, **options)
+
+def _transcribe_chunk(pcm_path, chunk, model_name, backend, vad, options):
+    """Transcribe one chunk of the shared PCM file (runs in a pool worker)."""
+    # A view into the memmap: the worker only pages in its own chunk
+    audio = load_pcm(pcm_path)[int(chunk['start'] * SAMPLE_RATE):int(chunk['end'] * SAMPLE_RATE)]
+    return _transcribe(audio, model_name, backend, vad, None, options)
+
+def _normalize_text(text):
+    return re.sub(r'[^\w]+', ' ', text.lower()).strip()
+
+def _owns(chunk, start, end, is_last):
+    midpoint = (start + end) / 2
+    # The last chunk keeps anything the model places at or past the end of the media
+    return midpoint >= chunk['own_start'] and (is_last or midpoint < chunk['own_end'])
+
+def stitch_chunk(merged, chunk, result, is_last):
+    """
+    Append one chunk's result to the stitched segments in `merged`.
+
+    Times are shifted by the chunk's start offset. Output from overlap
+    regions is kept only by the chunk that owns that time (by midpoint), at
+    word level when word timestamps exist. Any segment that still repeats the
+    previous one across a boundary is dropped.
+
+    Returns:
+        list: The segments appended (final; later chunks never change them)
+    """
+    added = []
+    offset = chunk['start']
+    for segment in result['segments']:
+        segment = dict(segment)
+        segment['start'] += offset
+        segment['end'] += offset
+
+        if 'words' in segment:
+            words = []
+            for word in segment['words']:
+                word = dict(word, start=word['start'] + offset, end=word['end'] + offset)
+                if _owns(chunk, word['start'], word['end'], is_last):
+                    words.append(word)
+            if not words:
+                continue
+            if len(words) != len(segment['words']):
+                # Trimmed at a boundary; rebuild the segment from the words it kept
+                segment['start'] = words[0]['start']
+                segment['end'] = words[-1]['end']
+                segment['text'] = ''.join(word['word'] for word in words)
+            segment['words'] = words
+        elif not _owns(chunk, segment['start'], segment['end'], is_last):
+            continue
+
+        if merged and segment['start'] < merged[-1]['end']:
+            previous = merged[-1]
+            overlap = min(previous['end'], segment['end']) - segment['start']
+            shorter = min(previous['end'] - previous['start'], segment['end'] - segment['start'])
+            previous_text, text = _normalize_text(previous['text']), _normalize_text(segment['text'])
+            if shorter > 0 and overlap / shorter > 0.5 and (text in previous_text or previous_text in text):
+                logger.info(f"Dropping duplicate boundary segment at {segment['start']:.2f}s: {segment['text'].strip()}")
+                continue
+
+        segment['id'] = len(merged)
+        merged.append(segment)
+        added.append(segment)
+    return added
+
+def build_result(merged, results):
+    languages = [result.get('language') for result in results if result.get('language')]
+    result = {
+        'text': ''.join(segment['text'] for segment in merged),
+        'segments': merged,
+        'language': max(set(languages), key=languages.count) if languages else None
+    }
+    if any('vad' in chunk_result for chunk_result in results):
+        result['vad'] = vad_filter.merge_stats([chunk_result['vad'] for chunk_result in results if 'vad' in chunk_result])
+    return result
+
+def transcribe_long_form(audio, model_name=None, backend=None, job_id=None, on_segment=None, vad=False, **options):
+    """
+    Transcribe long media by splitting it at silences and transcribing the
+    chunks in parallel worker processes. Media shorter than 1.5 chunks is
+    transcribed in a single pass.
+
+    Args:
+        audio (numpy.memmap): Cached 16 kHz mono PCM from services.audio_ingest;
+            workers reopen the file instead of receiving a copy of the samples
+        on_segment (callable, optional): Called with each stitched segment, in
+            order, as soon as the chunks up to it have finished
+        vad (bool, optional): Skip non-speech regions within each chunk
+
+    Returns:
+        dict: Whisper-shaped result with times relative to the full media
+    """
+    duration = len(audio) / SAMPLE_RATE
+    if duration <= LONG_FORM_CHUNK_SECONDS * MAX_CHUNK_FRACTION:
+        logger.info(f"Job {job_id}: {duration:.0f}s of media fits in one chunk, transcribing in a single pass")
+        return _transcribe(audio, model_name, backend, vad, on_segment, options)
+
+    silences = run_silencedetect(audio.filename, SPLIT_NOISE_THRESHOLD, SPLIT_MIN_SILENCE, pcm=True)
+    chunks = plan_chunks(duration, silences)
+    workers = max(1, min(LONG_FORM_WORKERS, len(chunks)))
+    threads_per_worker = max(1, thread_budget.get_threads() // workers)
+    logger.info(f"Job {job_id}: Split {duration:.0f}s of media into {len(chunks)} chunks, "
+                f"transcribing with {workers} workers x {threads_per_worker} threads")
+
+    # Spawned workers start without the parent's torch/CUDA state; each loads its model once
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=_init_worker, initargs=(threads_per_worker,)) as executor:
+        futures = [executor.submit(_transcribe_chunk, audio.filename, chunk, model_name, backend, vad, dict(options))
+                   for chunk in chunks]
+        merged, results = [], []
+        for index, (chunk, future) in enumerate(zip(chunks, futures)):
+            results.append(future.result())
+            for segment in stitch_chunk(merged, chunk, results[-1], index == len(chunks) - 1):
+                if on_segment is not None:
+                    on_segment(segment)
+
+    return build_result(merged, results)
@@ -17,31 +17,112 @@
 
 
 import os
-import whisper
+import time
 import srt
 from datetime import timedelta
 from whisper.utils import WriteSRT, WriteVTT
-from services.file_management import download_file
+from services import whisper_models, transcript_cache, vad as vad_filter
+from services.audio_ingest import get_audio, SAMPLE_RATE
+from services.v1.media.long_form_transcribe import transcribe_long_form
+from services.webhook import enqueue_webhook
+from app_utils import update_job_status
 import logging
-from config import LOCAL_STORAGE_PATH
+from config import LOCAL_STORAGE_PATH, TRANSCRIBE_PROGRESS_INTERVAL
 
 # Set up logging
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
-def process_transcribe_media(media_url, task, include_text, include_srt, include_segments, word_timestamps, response_type, language, job_id, words_per_line=None):
-    """Transcribe or translate media and return the transcript/translation, SRT or VTT file path."""
+class TranscriptionProgress:
+    """
+    Receives segments as they are decoded and publishes partial results: the
+    partial transcript goes into the job status record under "progress", new
+    segments go to the optional progress webhook, and every segment is passed
+    on to an optional listener (e.g. an SSE stream).
+
+    Job status updates and webhooks are throttled to one per
+    TRANSCRIBE_PROGRESS_INTERVAL seconds.
+    """
+
+    def __init__(self, job_id, duration, progress_webhook_url=None, request_id=None, listener=None, offset=0):
+        self.job_id = job_id
+        self.duration = duration
+        self.offset = offset  # start of the transcribed window in the original media
+        self.progress_webhook_url = progress_webhook_url
+        self.request_id = request_id
+        self.listener = listener
+        self.segments = []
+        self.sequence = 0
+        self._unpublished = []
+        self._last_publish = 0
+
+    def __call__(self, segment):
+        self.segments.append(segment)
+        self._unpublished.append(segment)
+        if self.listener is not None:
+            self.listener(segment)
+        if time.time() - self._last_publish >= TRANSCRIBE_PROGRESS_INTERVAL:
+            self.publish()
+
+    def publish(self):
+        if not self._unpublished:
+            return
+        processed = min(self.duration, self.segments[-1]['end'] - self.offset)
+        progress = {
+            "segments_done": len(self.segments),
+            "processed_seconds": round(processed, 2),
+            "duration": round(self.duration, 2),
+            "percent": round(100 * processed / self.duration, 1) if self.duration else None
+        }
+        try:
+            update_job_status(self.job_id, {"progress": dict(progress, partial_text=''.join(segment['text'] for segment in self.segments))})
+        except Exception as e:
+            logger.warning(f"Job {self.job_id}: Could not record transcription progress: {e}")
+
+        if self.progress_webhook_url:
+            # Deliveries may arrive out of order; receivers can order them by sequence
+            self.sequence += 1
+            enqueue_webhook(self.progress_webhook_url, dict(
+                progress, event="progress", job_id=self.job_id, id=self.request_id,
+                sequence=self.sequence, segments=self._unpublished
+            ))
+        self._unpublished = []
+        self._last_publish = time.time()
+
+    def finish(self, segments):
+        """Record the final transcript; segments already reported while decoding are not sent twice."""
+        if not self.segments:
+            self.segments = list(segments)
+            self._unpublished = list(segments)
+        self.publish()
+
+def shift_segment(segment, offset):
+    """Copy of a segment with its times (and its words' times) moved by `offset` seconds."""
+    segment = dict(segment, start=segment['start'] + offset, end=segment['end'] + offset)
+    if 'words' in segment:
+        segment['words'] = [dict(word, start=word['start'] + offset, end=word['end'] + offset) for word in segment['words']]
+    return segment
+
+def process_transcribe_media(media_url, task, include_text, include_srt, include_segments, word_timestamps, response_type, language, job_id, words_per_line=None, model=None, backend=None, long_form=False, progress_webhook_url=None, request_id=None, on_segment=None, vad=False, start=None, end=None):
+    """
+    Transcribe or translate media and return the transcript/translation, SRT or VTT file path,
+    plus a metadata dict (VAD statistics when `vad` is set).
+
+    With `start`/`end` (seconds) only that window is fetched and decoded;
+    timestamps stay on the original media's timeline.
+
+    With `on_segment` or `progress_webhook_url`, segments are published as they
+    are decoded (see TranscriptionProgress). Otherwise the model runs without a
+    per-segment callback (whisper's own transcribe(), or the transcription
+    server) and only the final transcript is recorded.
+    """
     logger.info(f"Starting {task} for media URL: {media_url}")
-    input_filename = download_file(media_url, os.path.join(LOCAL_STORAGE_PATH, f"{job_id}_input"))
-    logger.info(f"Downloaded media to local file: {input_filename}")
+    # Only the audio track (of the requested window) is fetched and decoded, once per source
+    audio = get_audio(media_url, job_id=job_id, start=start, end=end)
+    offset = start or 0
+    logger.info(f"Loaded {len(audio) / SAMPLE_RATE:.1f}s of audio for transcription, starting at {offset}s")
 
     try:
-        # Load a larger model for better translation quality
-        #model_size = "large" if task == "translate" else "base"
-        model_size = "base"
-        model = whisper.load_model(model_size)
-        logger.info(f"Loaded Whisper {model_size} model")
-
         # Configure transcription/translation options
         options = {
             "task": task,
@@ -53,7 +134,27 @@ def process_transcribe_media(media_url, task, include_text, include_srt, include
         if language:
             options["language"] = language
 
-        result = model.transcribe(input_filename, **options)
+        progress = TranscriptionProgress(job_id, len(audio) / SAMPLE_RATE, progress_webhook_url, request_id, on_segment, offset)
+        report_segment = None
+        if on_segment is not None or progress_webhook_url:
+            # The model sees only the window; segments are reported on the original timeline
+            report_segment = (lambda segment: progress(shift_segment(segment, offset))) if offset else progress
+
+        # Model size and backend can be chosen per request; WHISPER_DEFAULT_MODEL/WHISPER_BACKEND otherwise
+        def run_transcription():
+            if long_form:
+                # Split at silences and transcribe the chunks in parallel processes
+                return transcribe_long_form(audio, model_name=model, backend=backend, job_id=job_id, on_segment=report_segment, vad=vad, **options)
+            # With VAD, only detected speech is decoded and timestamps are mapped back
+            transcribe = vad_filter.transcribe if vad else whisper_models.transcribe
+            return transcribe(audio, model_name=model, backend=backend, on_segment=report_segment, **options)
+
+        result = transcript_cache.get_or_transcribe(audio, run_transcription, model_name=model, backend=backend, job_id=job_id,
+                                                    on_segment=report_segment, variant='vad' if vad else None, **options)
+        if offset:
+            result = dict(result, segments=[shift_segment(segment, offset) for segment in result['segments']])
+        progress.finish(result['segments'])
+        metadata = {"vad": result.get('vad')} if vad else {}
         
         # For translation task, the result['text'] will be in English
         text = None
@@ -121,12 +222,10 @@ def process_transcribe_media(media_url, task, include_text, include_srt, include
         if include_segments is True:
             segments_json = result['segments']
 
-        os.remove(input_filename)
-        logger.info(f"Removed local file: {input_filename}")
         logger.info(f"{task.capitalize()} successful, output type: {response_type}")
 
         if response_type == "direct":
-            return text, srt_text, segments_json
+            return text, srt_text, segments_json, metadata
         else:
             
             if include_text is True:
@@ -150,7 +249,7 @@ def process_transcribe_media(media_url, task, include_text, include_srt, include
             else:
                 segments_filename = None
 
-            return text_filename, srt_filename, segments_filename 
+            return text_filename, srt_filename, segments_filename, metadata
 
     except Exception as e:
         logger.error(f"{task.capitalize()} failed: {str(e)}")
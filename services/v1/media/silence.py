@@ -21,8 +21,7 @@ import json
 import subprocess
 import logging
 import re
-from services.file_management import download_file
-from config import LOCAL_STORAGE_PATH
+from services.audio_ingest import extract_pcm, ffmpeg_input_args
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -45,17 +44,13 @@ def detect_silence(media_url, start_time=None, end_time=None, noise_threshold="-
         list: List of dictionaries containing silence intervals with start, end, and duration
     """
     logger.info(f"Starting silence detection for media URL: {media_url}")
-    input_filename = download_file(media_url, os.path.join(LOCAL_STORAGE_PATH, f"{job_id}_input"))
-    logger.info(f"Downloaded media to local file: {input_filename}")
+    # Mono analysis reuses the shared 16 kHz mono decode; multichannel analysis
+    # streams the audio from the URL. Neither downloads the whole file.
+    pcm_path = extract_pcm(media_url, job_id=job_id) if mono else None
     
     try:
-        # For reliable silence detection with time constraints, we need a different approach
-        # We'll use FFmpeg without any time constraints and process the results later
-        cmd = ['ffmpeg', '-i', input_filename]
-        
-        # We won't use audio trim filters as they're causing issues with silence detection
-        # Instead, we'll filter the results after the analysis is complete
-        segment_filter = ""
+        # For reliable silence detection with time constraints, we run FFmpeg over the
+        # whole file without any time constraints and filter the results afterwards
         
         # Save the start and end times for post-processing
         start_seconds = 0
@@ -79,54 +74,15 @@ def detect_silence(media_url, start_time=None, end_time=None, noise_threshold="-
             except ValueError:
                 logger.warning(f"Could not parse end time '{end_time}', using infinity")
             
-        # Add audio processing options
-        cmd.extend(['-af'])
-        
-        # Build the filter string
-        filter_string = ""
-        
-        # First add the segment filter if needed
-        filter_string += segment_filter
-        
-        # Then add mono conversion if needed
-        if mono:
-            filter_string += "pan=mono|c0=0.5*c0+0.5*c1,"
-            
-        # Add the silencedetect filter
-        filter_string += f"silencedetect=noise={noise_threshold}:d={min_duration}"
-        cmd.append(filter_string)
-        
-        # Output to null, we only want the filter output
-        cmd.extend(['-f', 'null', '-'])
-        
-        logger.info(f"Running FFmpeg command: {' '.join(cmd)}")
-        
-        # Run the FFmpeg command and capture stderr for silence detection output
-        result = subprocess.run(cmd, stderr=subprocess.PIPE, text=True)
-        
-        # Parse the silence detection output
-        silence_intervals = []
-        
-        # Regular expressions to match the silence detection output
-        silence_start_pattern = r'silence_start: (\d+\.?\d*)'
-        silence_end_pattern = r'silence_end: (\d+\.?\d*) \| silence_duration: (\d+\.?\d*)'
-        
-        # Find all silence start times
-        silence_starts = re.findall(silence_start_pattern, result.stderr)
-        
-        # Find all silence end times and durations
-        silence_ends_durations = re.findall(silence_end_pattern, result.stderr)
+        # Run FFmpeg's silencedetect over the whole file
+        if pcm_path:
+            detected = run_silencedetect(pcm_path, noise_threshold, min_duration, pcm=True)
+        else:
+            detected = run_silencedetect(media_url, noise_threshold, min_duration)
         
         # Combine the results into a list of silence intervals
-        for i, (end, duration) in enumerate(silence_ends_durations):
-            # For the first silence period, the start time might not be detected correctly
-            # if the media starts with silence
-            start = silence_starts[i] if i < len(silence_starts) else "0.0"
-            
-            # Convert to float 
-            start_time_float = float(start) 
-            end_time_float = float(end)
-            duration_float = float(duration)
+        silence_intervals = []
+        for start_time_float, end_time_float, duration_float in detected:
             
             # Filter the results based on the specified time range
             # Only include silence periods that overlap with our requested range
@@ -151,19 +107,74 @@ def detect_silence(media_url, start_time=None, end_time=None, noise_threshold="-
                 "duration": round(duration_float, 2)
             })
         
-        # Clean up the downloaded file
-        os.remove(input_filename)
-        logger.info(f"Removed local file: {input_filename}")
-        
         return silence_intervals
         
     except Exception as e:
         logger.error(f"Silence detection failed: {str(e)}")
-        # Make sure to clean up even on error
-        if os.path.exists(input_filename):
-            os.remove(input_filename)
         raise
 
+def run_silencedetect(input_filename, noise_threshold="-30dB", min_duration=0.5, mono=False, pcm=False):
+    """
+    Run FFmpeg's silencedetect filter over a media file.
+    
+    Args:
+        input_filename (str): Path or URL of the media file
+        noise_threshold (str, optional): Noise tolerance threshold, default "-30dB"
+        min_duration (float, optional): Minimum silence duration to detect in seconds
+        mono (bool, optional): Whether to downmix stereo to mono before analysis
+        pcm (bool, optional): Whether the input is cached PCM from services.audio_ingest
+        
+    Returns:
+        list: (start, end, duration) tuples in seconds
+    """
+    # Only the audio is analysed, so skip decoding any video stream
+    if pcm:
+        cmd = ['ffmpeg'] + ffmpeg_input_args(input_filename) + ['-af']
+    else:
+        cmd = ['ffmpeg', '-i', input_filename, '-vn', '-af']
+    
+    # Build the filter string
+    filter_string = ""
+    
+    # Add mono conversion if needed (cached PCM is already mono)
+    if mono and not pcm:
+        filter_string += "pan=mono|c0=0.5*c0+0.5*c1,"
+        
+    # Add the silencedetect filter
+    filter_string += f"silencedetect=noise={noise_threshold}:d={min_duration}"
+    cmd.append(filter_string)
+    
+    # Output to null, we only want the filter output
+    cmd.extend(['-f', 'null', '-'])
+    
+    logger.info(f"Running FFmpeg command: {' '.join(cmd)}")
+    
+    # Run the FFmpeg command and capture stderr for silence detection output
+    result = subprocess.run(cmd, stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        # A missing or undecodable source must not look like "no silence found"
+        error_tail = '\n'.join(result.stderr.strip().splitlines()[-5:])
+        raise RuntimeError(f"Silence detection failed: {error_tail}")
+
+    # Regular expressions to match the silence detection output
+    silence_start_pattern = r'silence_start: (-?\d+\.?\d*)'
+    silence_end_pattern = r'silence_end: (\d+\.?\d*) \| silence_duration: (\d+\.?\d*)'
+    
+    # Find all silence start times
+    silence_starts = re.findall(silence_start_pattern, result.stderr)
+    
+    # Find all silence end times and durations
+    silence_ends_durations = re.findall(silence_end_pattern, result.stderr)
+    
+    intervals = []
+    for i, (end, duration) in enumerate(silence_ends_durations):
+        # For the first silence period, the start time might not be detected correctly
+        # if the media starts with silence
+        start = silence_starts[i] if i < len(silence_starts) else "0.0"
+        intervals.append((max(0.0, float(start)), float(end), float(duration)))
+    
+    return intervals
+
 def format_time(seconds):
     """
     Format time in seconds to HH:MM:SS.mmm format
@@ -16,30 +16,29 @@
 
 
 
+import io
 import os
-import boto3
+import queue
 import logging
+import threading
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse, unquote, quote
 import uuid
 import re
+from services.s3_toolkit import get_s3_client as get_cached_s3_client
+from config import S3_MULTIPART_CHUNKSIZE_MB, S3_MAX_CONCURRENCY
 
 logger = logging.getLogger(__name__)
 
 def get_s3_client():
-    """Create and return an S3 client using environment variables."""
+    """Return the shared S3 client for the configured environment variables."""
     endpoint_url = os.getenv('S3_ENDPOINT_URL')
     access_key = os.getenv('S3_ACCESS_KEY')
     secret_key = os.getenv('S3_SECRET_KEY')
     region = os.environ.get('S3_REGION', '')
     
-    session = boto3.Session(
-        aws_access_key_id=access_key,
-        aws_secret_access_key=secret_key,
-        region_name=region
-    )
-    
-    return session.client('s3', endpoint_url=endpoint_url)
+    return get_cached_s3_client(endpoint_url, access_key, secret_key, region)
 
 def get_filename_from_url(url):
     """Extract filename from URL."""
@@ -52,9 +51,76 @@ def get_filename_from_url(url):
     
     return filename
 
+MB = 1024 * 1024
+MIN_PART_SIZE = 5 * MB  # S3 minimum for every part except the last
+MAX_PARTS = 10000
+# Unknown-length sources double their part size every this many parts so the
+# upload can grow well past 50 GB without hitting the 10,000 part limit
+PART_SIZE_GROWTH_INTERVAL = 2000
+
+def get_part_size(part_number, base_part_size, total_size=None):
+    """
+    Return the size for a given part number.
+
+    When the total size is known the part size is raised just enough to fit
+    in MAX_PARTS; otherwise it grows geometrically as the upload progresses.
+    """
+    if total_size:
+        needed = -(-total_size // MAX_PARTS)  # Ceiling division
+        needed = -(-needed // MB) * MB  # Round up to a whole MB
+        return max(base_part_size, needed)
+    return base_part_size * (2 ** ((part_number - 1) // PART_SIZE_GROWTH_INTERVAL))
+
+class PartBody(io.RawIOBase):
+    """Seekable, read-only file object over a slice of a pooled part buffer (no copy)."""
+
+    def __init__(self, view):
+        self._view = view
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        remaining = len(self._view) - self._position
+        size = min(len(buffer), remaining)
+        buffer[:size] = self._view[self._position:self._position + size]
+        self._position += size
+        return size
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self._position = offset
+        elif whence == io.SEEK_CUR:
+            self._position += offset
+        else:
+            self._position = len(self._view) + offset
+        return self._position
+
+    def tell(self):
+        return self._position
+
+def fill_buffer(source, buffer, size):
+    """Read up to `size` bytes from the source into the buffer; returns the byte count."""
+    view = memoryview(buffer)
+    filled = 0
+    while filled < size:
+        read = source.readinto(view[filled:size])
+        if not read:
+            break
+        filled += read
+    return filled
+
 def stream_upload_to_s3(file_url, custom_filename=None, make_public=False, download_headers=None):
     """
     Stream a file from a URL directly to S3 without saving to disk.
+
+    The download fills parts from a fixed pool of reusable buffers while
+    S3_MAX_CONCURRENCY workers upload completed parts in parallel, so memory
+    is bounded by the pool size. Any failure aborts the multipart upload.
     
     Args:
         file_url (str): URL of the file to download
@@ -90,58 +156,19 @@ def stream_upload_to_s3(file_url, custom_filename=None, make_public=False, downl
         )
         
         upload_id = multipart_upload['UploadId']
-        
-        # Stream the file from URL
-        response = requests.get(file_url, stream=True, headers=download_headers)
-        response.raise_for_status()
-        
-        # Process in chunks using multipart upload
-        chunk_size = 5 * 1024 * 1024  # 5MB chunks (AWS minimum)
-        parts = []
-        part_number = 1
-        
-        buffer = bytearray()
-        
-        for chunk in response.iter_content(chunk_size=1024 * 1024):  # 1MB read chunks
-            buffer.extend(chunk)
-            
-            # When we have enough data for a part, upload it
-            if len(buffer) >= chunk_size:
-                logger.info(f"Uploading part {part_number}")
-                part = s3_client.upload_part(
-                    Bucket=bucket_name,
-                    Key=filename,
-                    PartNumber=part_number,
-                    UploadId=upload_id,
-                    Body=buffer
-                )
-                
-                parts.append({
-                    'PartNumber': part_number,
-                    'ETag': part['ETag']
-                })
-                
-                part_number += 1
-                buffer = bytearray()
-        
-        # Upload any remaining data as the final part
-        if buffer:
-            logger.info(f"Uploading final part {part_number}")
-            part = s3_client.upload_part(
-                Bucket=bucket_name,
-                Key=filename,
-                PartNumber=part_number,
-                UploadId=upload_id,
-                Body=buffer
-            )
-            
-            parts.append({
-                'PartNumber': part_number,
-                'ETag': part['ETag']
-            })
+
+        try:
+            parts = upload_parts_pipelined(s3_client, bucket_name, filename, upload_id, file_url, download_headers)
+        except Exception:
+            logger.error(f"Aborting multipart upload {upload_id} for {filename}")
+            try:
+                s3_client.abort_multipart_upload(Bucket=bucket_name, Key=filename, UploadId=upload_id)
+            except Exception as abort_error:
+                logger.error(f"Failed to abort multipart upload {upload_id}: {abort_error}")
+            raise
         
         # Complete the multipart upload
-        logger.info("Completing multipart upload")
+        logger.info(f"Completing multipart upload with {len(parts)} parts")
         s3_client.complete_multipart_upload(
             Bucket=bucket_name,
             Key=filename,
@@ -171,4 +198,78 @@ def stream_upload_to_s3(file_url, custom_filename=None, make_public=False, downl
         
     except Exception as e:
         logger.error(f"Error streaming file to S3: {e}")
-        raise
\ No newline at end of file
+        raise
+
+def upload_parts_pipelined(s3_client, bucket_name, filename, upload_id, file_url, download_headers=None):
+    """Download the source into pooled buffers and upload parts concurrently; returns the part list."""
+    concurrency = max(1, S3_MAX_CONCURRENCY)
+    base_part_size = max(MIN_PART_SIZE, S3_MULTIPART_CHUNKSIZE_MB * MB)
+
+    # One buffer per in-flight upload plus one being filled by the download
+    buffer_pool = queue.Queue()
+    failed = threading.Event()
+    futures = []
+
+    def upload_part(part_number, buffer, length):
+        try:
+            if failed.is_set():
+                raise RuntimeError(f"Skipping part {part_number} after an earlier part failed")
+            logger.info(f"Uploading part {part_number} ({length} bytes)")
+            part = s3_client.upload_part(
+                Bucket=bucket_name,
+                Key=filename,
+                PartNumber=part_number,
+                UploadId=upload_id,
+                Body=PartBody(memoryview(buffer)[:length]),
+                ContentLength=length
+            )
+            return {'PartNumber': part_number, 'ETag': part['ETag']}
+        except Exception:
+            failed.set()
+            raise
+        finally:
+            buffer_pool.put(buffer)
+
+    # Stream the file from URL
+    with requests.get(file_url, stream=True, headers=download_headers) as response:
+        response.raise_for_status()
+        response.raw.decode_content = True
+
+        # Content-Length is only the object size when the body is not re-encoded
+        total_size = None
+        if not response.headers.get('Content-Encoding') and response.headers.get('Content-Length'):
+            total_size = int(response.headers['Content-Length'])
+
+        first_part_size = get_part_size(1, base_part_size, total_size)
+        if first_part_size != base_part_size:
+            logger.info(f"Using {first_part_size} byte parts for a {total_size} byte object")
+        for _ in range(concurrency + 1):
+            buffer_pool.put(bytearray(first_part_size))
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            part_number = 1
+            while not failed.is_set():
+                if part_number > MAX_PARTS:
+                    raise ValueError(f"Object exceeds the S3 limit of {MAX_PARTS} parts")
+
+                part_size = get_part_size(part_number, base_part_size, total_size)
+                # Blocks until an upload worker hands a buffer back, bounding memory
+                buffer = buffer_pool.get()
+                if len(buffer) < part_size:
+                    buffer = bytearray(part_size)
+
+                length = fill_buffer(response.raw, buffer, part_size)
+                # An empty source still needs one (empty) part
+                if length == 0 and part_number > 1:
+                    buffer_pool.put(buffer)
+                    break
+
+                futures.append(executor.submit(upload_part, part_number, buffer, length))
+                part_number += 1
+
+                if length < part_size:
+                    break
+
+    # Raises the first upload error, if any
+    parts = [future.result() for future in futures]
+    return parts
@@ -24,6 +24,8 @@ import uuid
 import tempfile
 from services.file_management import download_file
 from services.cloud_storage import upload_file
+from services import thread_budget
+from services.v1.ffmpeg.parallel_encode import encode_chunked
 from config import LOCAL_STORAGE_PATH
 
 # Set up logging
@@ -54,7 +56,7 @@ def time_to_seconds(time_str):
         raise ValueError(f"Invalid time format: {time_str}. Expected HH:MM:SS[.mmm]")
 
 def cut_media(video_url, cuts, job_id=None, video_codec='libx264', video_preset='medium', 
-           video_crf=23, audio_codec='aac', audio_bitrate='128k'):
+           video_crf=23, audio_codec='aac', audio_bitrate='128k', parallel_encode=False):
     """
     Cuts specified segments from a video file with customizable encoding settings.
     
@@ -67,6 +69,7 @@ def cut_media(video_url, cuts, job_id=None, video_codec='libx264', video_preset=
         video_crf (int, optional): Constant Rate Factor for quality (0-51, default: 23)
         audio_codec (str, optional): Audio codec to use for encoding (default: 'aac')
         audio_bitrate (str, optional): Audio bitrate (default: '128k')
+        parallel_encode (bool, optional): Encode keyframe-aligned chunks in parallel processes (default: False)
         
     Returns:
         str: Path to the processed local file
@@ -138,6 +141,16 @@ def cut_media(video_url, cuts, job_id=None, video_codec='libx264', video_preset=
             merged_cuts.append((current_start, current_end))
         
         logger.info(f"Processing cuts: {merged_cuts}")
+
+        # The parts of the file that remain after the cuts
+        kept_ranges = []
+        last_end = 0
+        for start, end in merged_cuts:
+            if start > last_end:
+                kept_ranges.append((last_end, start))
+            last_end = end
+        if last_end < file_duration:
+            kept_ranges.append((last_end, file_duration))
         
         if not merged_cuts:
             logger.info("No valid cuts to apply, copying the original file")
@@ -148,6 +161,18 @@ def cut_media(video_url, cuts, job_id=None, video_codec='libx264', video_preset=
                 output_filename
             ]
             subprocess.run(cmd, check=True, capture_output=True, text=True)
+        elif parallel_encode and video_codec != 'copy' and kept_ranges:
+            # Encode the kept parts in chunks across processes and stitch them without re-encoding
+            encode_chunked(
+                input_filename,
+                output_filename,
+                ['-c:v', video_codec, '-preset', video_preset, '-crf', str(video_crf),
+                 '-pix_fmt', 'yuv420p', '-vsync', 'cfr', '-r', '30'],
+                ['-c:a', audio_codec, '-b:a', audio_bitrate],
+                ranges=kept_ranges,
+                output_args=['-movflags', '+faststart'],
+                job_id=job_id
+            )
         else:
             # Switch to a different approach: extract segments and concatenate
             segment_files = []
@@ -173,6 +198,7 @@ def cut_media(video_url, cuts, job_id=None, video_codec='libx264', video_preset=
                         '-crf', str(video_crf),
                         '-c:a', audio_codec,
                         '-b:a', audio_bitrate,
+                        *thread_budget.ffmpeg_output_args(),
                         '-pix_fmt', 'yuv420p',
                         '-vsync', 'cfr',
                         '-r', '30',
@@ -203,6 +229,7 @@ def cut_media(video_url, cuts, job_id=None, video_codec='libx264', video_preset=
                     '-crf', str(video_crf),
                     '-c:a', audio_codec,
                     '-b:a', audio_bitrate,
+                    *thread_budget.ffmpeg_output_args(),
                     '-pix_fmt', 'yuv420p',
                     '-vsync', 'cfr',
                     '-r', '30',
@@ -237,6 +264,7 @@ def cut_media(video_url, cuts, job_id=None, video_codec='libx264', video_preset=
                     '-crf', str(video_crf),
                     '-c:a', audio_codec,
                     '-b:a', audio_bitrate,
+                    *thread_budget.ffmpeg_output_args(),
                     '-vsync', 'cfr',
                     '-r', '30',
                     '-pix_fmt', 'yuv420p',
@@ -23,6 +23,7 @@ import logging
 import uuid
 from services.file_management import download_file
 from services.cloud_storage import upload_file
+from services import thread_budget
 from config import LOCAL_STORAGE_PATH
 
 # Set up logging
@@ -53,7 +54,7 @@ def time_to_seconds(time_str):
         raise ValueError(f"Invalid time format: {time_str}. Expected HH:MM:SS[.mmm]")
 
 def split_video(video_url, splits, job_id=None, video_codec='libx264', video_preset='medium', 
-               video_crf=23, audio_codec='aac', audio_bitrate='128k'):
+               video_crf=23, audio_codec='aac', audio_bitrate='128k', on_output=None):
     """
     Splits a video file into multiple segments with customizable encoding settings.
     
@@ -66,6 +67,8 @@ def split_video(video_url, splits, job_id=None, video_codec='libx264', video_pre
         video_crf (int, optional): Constant Rate Factor for quality (0-51, default: 23)
         audio_codec (str, optional): Audio codec to use for encoding (default: 'aac')
         audio_bitrate (str, optional): Audio bitrate (default: '128k')
+        on_output (callable, optional): Called with each split's path as soon as it is
+            written, e.g. to start uploading it while the next split encodes
         
     Returns:
         tuple: (list of output file paths, input file path)
@@ -147,6 +150,7 @@ def split_video(video_url, splits, job_id=None, video_codec='libx264', video_pre
                 '-crf', str(video_crf),
                 '-c:a', audio_codec,
                 '-b:a', audio_bitrate,
+                *thread_budget.ffmpeg_output_args(),
                 '-avoid_negative_ts', 'make_zero',
                 output_filename
             ]
@@ -163,6 +167,9 @@ def split_video(video_url, splits, job_id=None, video_codec='libx264', video_pre
             # Add the output file to the list
             output_files.append(output_filename)
             logger.info(f"Successfully created split {index+1}: {output_filename}")
+
+            if on_output:
+                on_output(output_filename)
         
         # Return the list of output files and the input filename
         return output_files, input_filename
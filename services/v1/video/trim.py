@@ -23,6 +23,8 @@ import logging
 import uuid
 from services.file_management import download_file
 from services.cloud_storage import upload_file
+from services import thread_budget
+from services.v1.ffmpeg.parallel_encode import encode_chunked
 from config import LOCAL_STORAGE_PATH
 
 # Set up logging
@@ -56,7 +58,7 @@ def time_to_seconds(time_str):
         raise ValueError(f"Invalid time format: {time_str}. Expected HH:MM:SS[.mmm]")
 
 def trim_video(video_url, start=None, end=None, job_id=None, video_codec='libx264', video_preset='medium', 
-               video_crf=23, audio_codec='aac', audio_bitrate='128k'):
+               video_crf=23, audio_codec='aac', audio_bitrate='128k', parallel_encode=False):
     """
     Trims a video by removing specified portions from the beginning and/or end with customizable encoding settings.
     
@@ -70,6 +72,7 @@ def trim_video(video_url, start=None, end=None, job_id=None, video_codec='libx26
         video_crf (int, optional): Constant Rate Factor for quality (0-51, default: 23)
         audio_codec (str, optional): Audio codec to use for encoding (default: 'aac')
         audio_bitrate (str, optional): Audio bitrate (default: '128k')
+        parallel_encode (bool, optional): Encode keyframe-aligned chunks in parallel processes (default: False)
         
     Returns:
         tuple: (output_filename, input_filename)
@@ -121,6 +124,18 @@ def trim_video(video_url, start=None, end=None, job_id=None, video_codec='libx26
         if start_seconds is not None and end_seconds is not None and start_seconds >= end_seconds:
             raise ValueError(f"Invalid trim: start time ({start}) must be before end time ({end})")
         
+        if parallel_encode and video_codec != 'copy':
+            logger.info(f"Trimming video from {start_seconds}s to {end_seconds}s in parallel chunks")
+            encode_chunked(
+                input_filename,
+                output_filename,
+                ['-c:v', video_codec, '-preset', video_preset, '-crf', str(video_crf)],
+                ['-c:a', audio_codec, '-b:a', audio_bitrate],
+                ranges=[(start_seconds, end_seconds)],
+                job_id=job_id
+            )
+            return output_filename, input_filename
+
         # Prepare FFmpeg command based on trim parameters
         cmd = ['ffmpeg', '-i', input_filename]
         
@@ -146,6 +161,7 @@ def trim_video(video_url, start=None, end=None, job_id=None, video_codec='libx26
             '-crf', str(video_crf),
             '-c:a', audio_codec,
             '-b:a', audio_bitrate,
+            *thread_budget.ffmpeg_output_args(),
             '-avoid_negative_ts', 'make_zero',
             output_filename
         ])
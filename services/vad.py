@@ -0,0 +1,192 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+# Energy-based voice activity detection.
+#
+# Frames whose energy rises clearly above the recording's noise floor are
+# treated as speech. Only those regions (with padding) are passed to the
+# model, joined by short gaps of silence, and the resulting timestamps are
+# mapped back onto the original timeline. This removes dead air and silence;
+# loud music is not speech but will still pass an energy detector.
+
+import bisect
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+FRAME_SECONDS = 0.03
+BLOCK_FRAMES = 2000            # frames analysed per block, so long memmaps are paged in gradually
+NOISE_FLOOR_PERCENTILE = 10
+MARGIN_DB = 12                 # speech must be this far above the noise floor...
+MIN_THRESHOLD_DB = -50         # ...and above this absolute level (dBFS)
+MIN_SPEECH_SECONDS = 0.25
+MIN_SILENCE_SECONDS = 0.6      # shorter pauses stay inside a speech region
+PADDING_SECONDS = 0.3
+JOIN_GAP_SECONDS = 0.2         # silence inserted between regions so words are not fused
+
+def frame_energy_db(audio):
+    """Mean energy per FRAME_SECONDS frame, in dBFS."""
+    frame = int(FRAME_SECONDS * SAMPLE_RATE)
+    frames = len(audio) // frame
+    energy = np.empty(frames, dtype=np.float32)
+    for start in range(0, frames, BLOCK_FRAMES):
+        end = min(frames, start + BLOCK_FRAMES)
+        block = np.asarray(audio[start * frame:end * frame], dtype=np.float32).reshape(end - start, frame)
+        energy[start:end] = np.square(block).mean(axis=1)
+    return 10 * np.log10(energy + 1e-10)
+
+def _runs(mask):
+    """(start, end) index pairs of consecutive True values."""
+    padded = np.concatenate(([False], mask, [False]))
+    changes = np.flatnonzero(padded[1:] != padded[:-1])
+    return list(zip(changes[::2], changes[1::2]))
+
+def detect_speech(audio):
+    """
+    Find speech regions in a 16 kHz mono waveform.
+
+    Returns:
+        list: (start, end) sample ranges, sorted and non-overlapping
+    """
+    energy = frame_energy_db(audio)
+    if len(energy) == 0:
+        return []
+    threshold = max(MIN_THRESHOLD_DB, float(np.percentile(energy, NOISE_FLOOR_PERCENTILE)) + MARGIN_DB)
+    frame = int(FRAME_SECONDS * SAMPLE_RATE)
+
+    regions = []
+    for start, end in _runs(energy > threshold):
+        start, end = start * frame, end * frame
+        if regions and start - regions[-1][1] < MIN_SILENCE_SECONDS * SAMPLE_RATE:
+            regions[-1] = (regions[-1][0], end)
+        else:
+            regions.append((start, end))
+
+    padding = int(PADDING_SECONDS * SAMPLE_RATE)
+    padded = []
+    for start, end in regions:
+        if end - start < MIN_SPEECH_SECONDS * SAMPLE_RATE:
+            continue
+        start, end = max(0, start - padding), min(len(audio), end + padding)
+        if padded and start <= padded[-1][1]:
+            padded[-1] = (padded[-1][0], end)
+        else:
+            padded.append((start, end))
+    return padded
+
+class SpeechTimeline:
+    """Maps times in the joined speech audio back to the original media."""
+
+    def __init__(self, regions):
+        gap = int(JOIN_GAP_SECONDS * SAMPLE_RATE)
+        self.joined_starts = []  # seconds, in the joined audio
+        self.original_starts = []
+        self.lengths = []
+        position = 0
+        for start, end in regions:
+            self.joined_starts.append(position / SAMPLE_RATE)
+            self.original_starts.append(start / SAMPLE_RATE)
+            self.lengths.append((end - start) / SAMPLE_RATE)
+            position += end - start + gap
+
+    def to_original(self, seconds):
+        if not self.joined_starts:
+            return seconds
+        index = max(0, bisect.bisect_right(self.joined_starts, seconds) - 1)
+        # Times inside a join gap snap to the end of the region before it
+        within = min(seconds - self.joined_starts[index], self.lengths[index])
+        return self.original_starts[index] + max(0.0, within)
+
+    def remap_segment(self, segment):
+        segment = dict(segment, start=self.to_original(segment['start']), end=self.to_original(segment['end']))
+        if 'words' in segment:
+            segment['words'] = [dict(word, start=self.to_original(word['start']), end=self.to_original(word['end']))
+                                for word in segment['words']]
+        return segment
+
+def join_regions(audio, regions):
+    """Concatenate the speech regions (a copy) with JOIN_GAP_SECONDS of silence between them."""
+    gap = np.zeros(int(JOIN_GAP_SECONDS * SAMPLE_RATE), dtype=np.float32)
+    parts = []
+    for start, end in regions:
+        if parts:
+            parts.append(gap)
+        parts.append(np.asarray(audio[start:end], dtype=np.float32))
+    return np.concatenate(parts) if parts else np.zeros(0, dtype=np.float32)
+
+def transcribe_speech(audio, transcribe_fn, on_segment=None):
+    """
+    Run `transcribe_fn(speech_audio, on_segment)` on the speech regions only.
+
+    Returns:
+        tuple: (whisper-shaped result on the original timeline, stats dict)
+    """
+    regions = detect_speech(audio)
+    total_seconds = len(audio) / SAMPLE_RATE
+    speech_seconds = sum(end - start for start, end in regions) / SAMPLE_RATE
+    timeline = SpeechTimeline(regions)
+
+    if regions:
+        speech_audio = join_regions(audio, regions)
+        remapped_callback = (lambda segment: on_segment(timeline.remap_segment(segment))) if on_segment else None
+        result = transcribe_fn(speech_audio, remapped_callback)
+        result = dict(result, segments=[timeline.remap_segment(segment) for segment in result['segments']])
+        decoded_seconds = len(speech_audio) / SAMPLE_RATE
+    else:
+        result = {'text': '', 'segments': [], 'language': None}
+        decoded_seconds = 0.0
+
+    stats = {
+        'total_seconds': round(total_seconds, 2),
+        'speech_seconds': round(speech_seconds, 2),
+        'speech_ratio': round(speech_seconds / total_seconds, 3) if total_seconds else 0.0,
+        'speech_regions': len(regions),
+        'decoded_seconds': round(decoded_seconds, 2),
+        # Decode time scales with audio length, so the audio skipped is the compute saved
+        'compute_saved_percent': round(100 * (1 - decoded_seconds / total_seconds), 1) if total_seconds else 0.0
+    }
+    logger.info(f"VAD kept {speech_seconds:.1f}s of {total_seconds:.1f}s in {len(regions)} regions")
+    return result, stats
+
+def transcribe(audio, model_name=None, backend=None, on_segment=None, **options):
+    """whisper_models.transcribe() over the speech regions only; the result gains a 'vad' stats entry."""
+    from services import whisper_models
+
+    result, stats = transcribe_speech(
+        audio,
+        lambda speech_audio, callback: whisper_models.transcribe(speech_audio, model_name=model_name, backend=backend,
+                                                                 on_segment=callback, **options),
+        on_segment
+    )
+    return dict(result, vad=stats)
+
+def merge_stats(stats_list):
+    """Combine transcribe_speech() stats from several chunks."""
+    total = sum(stats['total_seconds'] for stats in stats_list)
+    speech = sum(stats['speech_seconds'] for stats in stats_list)
+    decoded = sum(stats['decoded_seconds'] for stats in stats_list)
+    return {
+        'total_seconds': round(total, 2),
+        'speech_seconds': round(speech, 2),
+        'speech_ratio': round(speech / total, 3) if total else 0.0,
+        'speech_regions': sum(stats['speech_regions'] for stats in stats_list),
+        'decoded_seconds': round(decoded, 2),
+        'compute_saved_percent': round(100 * (1 - decoded / total), 1) if total else 0.0
+    }
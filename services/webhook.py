@@ -16,17 +16,296 @@
 
 
 
-import requests
+import os
+import json
+import time
+import uuid
+import random
 import logging
+import threading
+import requests
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+from app_utils import update_job_status
+from services.process_owner import get_owner_tag, owner_alive
+from services.payload_policy import encode_webhook_body, mark_gzip_rejected, truncate_for_log
+from config import (LOCAL_STORAGE_PATH, WEBHOOK_WORKERS, WEBHOOK_PER_HOST_LIMIT, WEBHOOK_TIMEOUT,
+                    WEBHOOK_MAX_ATTEMPTS, WEBHOOK_BACKOFF_BASE, WEBHOOK_BACKOFF_MAX)
 
 logger = logging.getLogger(__name__)
 
-def send_webhook(webhook_url, data):
-    """Send a POST request to a webhook URL with the provided data."""
+# Outbox layout: entries wait in pending/, are claimed into processing/ by an
+# atomic rename (so only one gunicorn worker sends each), and end up deleted
+# on success or moved to failed/ once retries are exhausted.
+OUTBOX_DIR = os.path.join(LOCAL_STORAGE_PATH, 'webhooks')
+PENDING_DIR = os.path.join(OUTBOX_DIR, 'pending')
+PROCESSING_DIR = os.path.join(OUTBOX_DIR, 'processing')
+FAILED_DIR = os.path.join(OUTBOX_DIR, 'failed')
+
+POLL_INTERVAL = 1.0  # seconds between outbox scans when nothing new was enqueued
+CONNECT_TIMEOUT = 5
+RECOVERY_INTERVAL = 60  # seconds between checks for abandoned claims
+# A delivery (including one uncompressed resend) never holds a claim longer than this
+CLAIM_LEASE_SECONDS = 2 * (CONNECT_TIMEOUT + WEBHOOK_TIMEOUT) + 60
+RETRYABLE_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    """Shared requests session so deliveries to the same host reuse connections."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=WEBHOOK_WORKERS, pool_maxsize=WEBHOOK_WORKERS)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _session = session
+        return _session
+
+def get_backoff_delay(attempts, retry_after=None):
+    """Exponential backoff with full jitter, honouring a server's Retry-After when given."""
+    if retry_after is not None:
+        return min(WEBHOOK_BACKOFF_MAX, retry_after)
+    delay = min(WEBHOOK_BACKOFF_MAX, WEBHOOK_BACKOFF_BASE * (2 ** (attempts - 1)))
+    return random.uniform(delay / 2, delay)
+
+def _parse_retry_after(response):
+    try:
+        return float(response.headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+def post_webhook(webhook_url, data):
+    """
+    POST a payload once.
+
+    Returns:
+        tuple: (delivered, retryable, status_code, error, retry_after)
+    """
+    body, headers = encode_webhook_body(data, webhook_url)
     try:
-        logger.info(f"Attempting to send webhook to {webhook_url} with data: {data}")
-        response = requests.post(webhook_url, json=data)
-        response.raise_for_status()
-        logger.info(f"Webhook sent: {data}")
+        response = get_session().post(webhook_url, data=body, headers=headers, timeout=(CONNECT_TIMEOUT, WEBHOOK_TIMEOUT))
+        if response.status_code == 415 and 'Content-Encoding' in headers:
+            # The receiver does not take compressed requests after all
+            mark_gzip_rejected(webhook_url)
+            body, headers = encode_webhook_body(data, compress=False)
+            response = get_session().post(webhook_url, data=body, headers=headers, timeout=(CONNECT_TIMEOUT, WEBHOOK_TIMEOUT))
     except requests.RequestException as e:
-        logger.error(f"Webhook failed: {e}")
+        return False, True, None, str(e), None
+
+    if response.ok:
+        return True, False, response.status_code, None, None
+    retryable = response.status_code in RETRYABLE_STATUS_CODES
+    return False, retryable, response.status_code, f"HTTP {response.status_code}", _parse_retry_after(response)
+
+def _report_status(job_id, status, **fields):
+    if not job_id:
+        return
+    try:
+        update_job_status(job_id, {"webhook": dict(status=status, **fields)})
+    except Exception as e:
+        logger.warning(f"Job {job_id}: Could not record webhook status: {e}")
+
+def send_webhook(webhook_url, data, job_id=None):
+    """
+    Deliver a webhook synchronously, retrying with backoff.
+
+    Used where the process cannot wait for the outbox (e.g. a Cloud Run Job
+    that exits right after the request). Returns True if delivered.
+    """
+    logger.info(f"Attempting to send webhook to {webhook_url} with data: {truncate_for_log(data)}")
+    for attempt in range(1, WEBHOOK_MAX_ATTEMPTS + 1):
+        delivered, retryable, status_code, error, retry_after = post_webhook(webhook_url, data)
+        if delivered:
+            logger.info(f"Webhook sent: {truncate_for_log(data)}")
+            _report_status(job_id, "delivered", attempts=attempt, last_status_code=status_code, delivered_at=time.time())
+            return True
+        if not retryable or attempt == WEBHOOK_MAX_ATTEMPTS:
+            break
+        delay = get_backoff_delay(attempt, retry_after)
+        logger.warning(f"Webhook to {webhook_url} failed ({error}), retrying in {delay:.1f} seconds")
+        time.sleep(delay)
+
+    logger.error(f"Webhook failed: {error}")
+    _report_status(job_id, "failed", attempts=attempt, last_status_code=status_code, last_error=error)
+    return False
+
+def _write_entry(path, entry):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(entry, f)
+    os.replace(temp_path, path)
+
+def enqueue_webhook(webhook_url, data, job_id=None):
+    """
+    Add a webhook to the persistent outbox and return immediately.
+
+    Delivery happens on the background pool; progress is written to the
+    job record under "webhook".
+    """
+    os.makedirs(PENDING_DIR, exist_ok=True)
+    entry = {
+        "id": str(uuid.uuid4()),
+        "job_id": job_id,
+        "url": webhook_url,
+        "payload": data,
+        "attempts": 0,
+        "created_at": time.time(),
+        "next_attempt_at": 0
+    }
+    _write_entry(os.path.join(PENDING_DIR, f"{entry['id']}.json"), entry)
+    _report_status(job_id, "pending", attempts=0)
+
+    dispatcher = start_webhook_dispatcher()
+    dispatcher.wake()
+    return entry["id"]
+
+class WebhookDispatcher:
+    """
+    Drains the outbox: claims due entries and hands them to a thread pool,
+    never running more than WEBHOOK_PER_HOST_LIMIT deliveries per host.
+    """
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=WEBHOOK_WORKERS, thread_name_prefix='webhook')
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._host_in_flight = defaultdict(int)
+        self._owner = get_owner_tag()
+        self._recovered_at = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        for directory in (PENDING_DIR, PROCESSING_DIR, FAILED_DIR):
+            os.makedirs(directory, exist_ok=True)
+        self._recover_orphans()
+        self._thread.start()
+
+    def wake(self):
+        self._wake.set()
+
+    def _recover_orphans(self):
+        """
+        Return claims to pending when their owner process has exited, or when
+        they have been held longer than CLAIM_LEASE_SECONDS (an owner that
+        cannot be identified, or a hung delivery).
+        """
+        self._recovered_at = time.time()
+        for name in os.listdir(PROCESSING_DIR):
+            path = os.path.join(PROCESSING_DIR, name)
+            try:
+                entry_id, owner, _ = name.rsplit('.', 2)
+                expired = time.time() - os.path.getmtime(path) > CLAIM_LEASE_SECONDS
+                if owner == self._owner or (owner_alive(owner) and not expired):
+                    continue
+                os.replace(path, os.path.join(PENDING_DIR, f"{entry_id}.json"))
+                logger.info(f"Recovered webhook {entry_id} claimed by {'expired' if expired else 'exited'} process {owner}")
+            except (ValueError, FileNotFoundError):
+                continue
+
+    def _run(self):
+        while True:
+            self._wake.wait(POLL_INTERVAL)
+            self._wake.clear()
+            try:
+                if time.time() - self._recovered_at > RECOVERY_INTERVAL:
+                    self._recover_orphans()
+                self._dispatch_due()
+            except Exception as e:
+                logger.error(f"Webhook dispatcher error: {e}")
+
+    def _dispatch_due(self):
+        now = time.time()
+        for name in sorted(os.listdir(PENDING_DIR)):
+            if not name.endswith('.json'):
+                continue
+            with self._lock:
+                if self._in_flight >= WEBHOOK_WORKERS:
+                    return
+
+            pending_path = os.path.join(PENDING_DIR, name)
+            try:
+                with open(pending_path, 'r') as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                continue
+
+            if entry.get("next_attempt_at", 0) > now:
+                continue
+
+            host = urlparse(entry["url"]).netloc
+            with self._lock:
+                if self._host_in_flight[host] >= WEBHOOK_PER_HOST_LIMIT:
+                    continue
+
+            # Claim the entry; losing the rename means another worker took it
+            processing_path = os.path.join(PROCESSING_DIR, f"{entry['id']}.{self._owner}.json")
+            try:
+                os.replace(pending_path, processing_path)
+                # The lease runs from the claim, not from when the entry was written
+                os.utime(processing_path)
+            except FileNotFoundError:
+                continue
+
+            with self._lock:
+                self._in_flight += 1
+                self._host_in_flight[host] += 1
+            self._executor.submit(self._deliver, entry, processing_path, host)
+
+    def _deliver(self, entry, processing_path, host):
+        job_id = entry.get("job_id")
+        try:
+            entry["attempts"] += 1
+            _report_status(job_id, "delivering", attempts=entry["attempts"])
+            delivered, retryable, status_code, error, retry_after = post_webhook(entry["url"], entry["payload"])
+
+            if delivered:
+                logger.info(f"Job {job_id}: Webhook delivered to {entry['url']} after {entry['attempts']} attempt(s)")
+                os.remove(processing_path)
+                _report_status(job_id, "delivered", attempts=entry["attempts"],
+                               last_status_code=status_code, delivered_at=time.time())
+                return
+
+            entry["last_error"] = error
+            if retryable and entry["attempts"] < WEBHOOK_MAX_ATTEMPTS:
+                delay = get_backoff_delay(entry["attempts"], retry_after)
+                entry["next_attempt_at"] = time.time() + delay
+                logger.warning(f"Job {job_id}: Webhook to {entry['url']} failed ({error}), retrying in {delay:.1f} seconds")
+                _write_entry(processing_path, entry)
+                os.replace(processing_path, os.path.join(PENDING_DIR, f"{entry['id']}.json"))
+                _report_status(job_id, "retrying", attempts=entry["attempts"], last_status_code=status_code,
+                               last_error=error, next_attempt_at=entry["next_attempt_at"])
+                return
+
+            logger.error(f"Job {job_id}: Webhook to {entry['url']} failed permanently: {error}")
+            _write_entry(processing_path, entry)
+            os.replace(processing_path, os.path.join(FAILED_DIR, f"{entry['id']}.json"))
+            _report_status(job_id, "failed", attempts=entry["attempts"], last_status_code=status_code, last_error=error)
+        except Exception as e:
+            logger.error(f"Job {job_id}: Unexpected error delivering webhook: {e}")
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+                self._host_in_flight[host] -= 1
+            # A slot freed up; look for more work without waiting for the next poll
+            self.wake()
+
+_dispatcher = None
+_dispatcher_pid = None
+_dispatcher_lock = threading.Lock()
+
+def start_webhook_dispatcher():
+    """Start this process's outbox dispatcher if it is not running yet."""
+    global _dispatcher, _dispatcher_pid
+    with _dispatcher_lock:
+        if _dispatcher is None or _dispatcher_pid != os.getpid():
+            _dispatcher = WebhookDispatcher()
+            _dispatcher_pid = os.getpid()
+            _dispatcher.start()
+            logger.info(f"Started webhook dispatcher in PID {_dispatcher_pid}")
+        return _dispatcher
@@ -0,0 +1,234 @@
+# Copyright (c) 2025 Stephen G. Pope
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+
+import gc
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+import psutil
+from services.transcription_backends import get_backend
+from services import thread_budget
+from config import (WHISPER_DEFAULT_MODEL, WHISPER_DEVICE, WHISPER_BACKEND, WHISPER_PRELOAD_MODELS,
+                    WHISPER_MODEL_IDLE_TIMEOUT, WHISPER_MEMORY_PRESSURE_PERCENT)
+
+logger = logging.getLogger(__name__)
+
+EVICTION_INTERVAL = 60  # seconds between idle/memory checks
+
+class LoadedModel:
+    """A cached model plus the lock that serializes inference on it."""
+
+    def __init__(self, key, model, pinned=False):
+        self.key = key
+        self.model = model
+        self.pinned = pinned  # Preloaded models are only evicted under memory pressure
+        # Whisper installs per-call hooks on the model while decoding, so one
+        # transcription runs on a given model instance at a time (for every backend)
+        self.lock = threading.Lock()
+        self.last_used = time.time()
+
+    @property
+    def busy(self):
+        return self.lock.locked()
+
+# Registry of loaded models keyed by (name, device, precision, backend). Rebuilt after a
+# fork so a preloaded parent's CUDA state is never reused by a child.
+_models = {}
+_models_pid = None
+_registry_lock = threading.Lock()
+_loading_locks = {}
+_eviction_thread = None
+
+def resolve_device(device=None):
+    """Return the requested device, or 'cuda' when available and 'cpu' otherwise."""
+    device = device or WHISPER_DEVICE
+    if device and device != 'auto':
+        return device
+    import torch
+    return 'cuda' if torch.cuda.is_available() else 'cpu'
+
+def get_model_key(name=None, device=None, precision=None, backend=None):
+    """Fill in defaults and return the registry key (name, device, precision, backend)."""
+    name = name or WHISPER_DEFAULT_MODEL
+    backend = backend or WHISPER_BACKEND
+    device = resolve_device(device)
+    precision = precision or get_backend(backend).default_precision(device)
+    return (name, device, precision, backend)
+
+def _check_pid():
+    global _models_pid
+    if _models_pid != os.getpid():
+        _models.clear()
+        _loading_locks.clear()
+        _models_pid = os.getpid()
+
+def get_model(name=None, device=None, precision=None, backend=None, pinned=False):
+    """
+    Return the cached model for (name, device, precision, backend), loading it on first use.
+
+    Concurrent requests for a model that is still loading wait for that load
+    instead of starting their own.
+    """
+    key = get_model_key(name, device, precision, backend)
+    with _registry_lock:
+        _check_pid()
+        entry = _models.get(key)
+        if entry is not None:
+            entry.pinned = entry.pinned or pinned
+            return entry
+        loading_lock = _loading_locks.setdefault(key, threading.Lock())
+
+    with loading_lock:
+        with _registry_lock:
+            entry = _models.get(key)
+        if entry is not None:
+            return entry
+
+        start_time = time.time()
+        model = get_backend(key[3]).load(key[0], key[1], key[2])
+        entry = LoadedModel(key, model, pinned)
+        with _registry_lock:
+            _models[key] = entry
+        logger.info(f"Loaded transcription model {key} in {time.time() - start_time:.2f}s (PID {os.getpid()})")
+
+    start_eviction_thread()
+    return entry
+
+@contextmanager
+def use_model(name=None, device=None, precision=None, backend=None):
+    """Hold exclusive use of a cached model for the duration of the block."""
+    entry = get_model(name, device, precision, backend)
+    with entry.lock:
+        # Size torch's pool to the host thread budget for this inference
+        thread_budget.apply_torch_threads()
+        try:
+            yield entry.model
+        finally:
+            entry.last_used = time.time()
+
+def transcribe(audio, model_name=None, device=None, precision=None, backend=None, on_segment=None, **options):
+    """
+    Transcribe with a cached model; options use whisper's transcribe() names.
+
+    Args:
+        audio: Path to a media file or a float32 waveform at 16 kHz
+        model_name (str, optional): Model size, WHISPER_DEFAULT_MODEL if omitted
+        backend (str, optional): Transcription backend, WHISPER_BACKEND if omitted
+        on_segment (callable, optional): Called with each segment as it is decoded
+
+    Returns:
+        dict: Whisper result with 'text', 'segments' and 'language'
+    """
+    from services import transcription_server
+
+    # Hand off to the shared sidecar when one is configured, so this worker never loads a model.
+    # Streaming callbacks cannot cross the socket, so those run here.
+    if transcription_server.is_enabled() and on_segment is None:
+        try:
+            return transcription_server.transcribe_remote(audio, model_name, device, precision, backend, **options)
+        except ConnectionError as e:
+            logger.warning(f"{e}; transcribing in this worker instead")
+
+    key = get_model_key(model_name, device, precision, backend)
+    with use_model(*key) as model:
+        return get_backend(key[3]).transcribe(model, audio, key[2], on_segment=on_segment, **options)
+
+def transcribe_batch(audios, model_name=None, device=None, precision=None, backend=None, **options):
+    """
+    Transcribe several waveforms while holding the cached model once, batching
+    them through the model where the backend supports it.
+
+    Returns:
+        list: One whisper result per waveform, in order
+    """
+    key = get_model_key(model_name, device, precision, backend)
+    with use_model(*key) as model:
+        return get_backend(key[3]).transcribe_batch(model, audios, key[2], **options)
+
+def preload_models(names=None):
+    """Load and pin models at worker start (WHISPER_PRELOAD_MODELS by default)."""
+    names = names if names is not None else WHISPER_PRELOAD_MODELS
+    for name in names:
+        try:
+            get_model(name, pinned=True)
+        except Exception as e:
+            logger.error(f"Failed to preload Whisper model {name}: {e}")
+
+def _release_memory(devices):
+    gc.collect()
+    if any(device.startswith('cuda') for device in devices):
+        import torch
+        torch.cuda.empty_cache()
+
+def evict_models():
+    """
+    Drop models that have been idle longer than WHISPER_MODEL_IDLE_TIMEOUT, and
+    drop every idle model (pinned ones included) while system memory use is at
+    or above WHISPER_MEMORY_PRESSURE_PERCENT. Busy models are never evicted.
+
+    Returns:
+        list: Keys of evicted models
+    """
+    evicted = []
+    now = time.time()
+    with _registry_lock:
+        _check_pid()
+        idle = sorted((entry for entry in _models.values() if not entry.busy), key=lambda entry: entry.last_used)
+
+        if WHISPER_MODEL_IDLE_TIMEOUT > 0:
+            for entry in idle:
+                if not entry.pinned and now - entry.last_used > WHISPER_MODEL_IDLE_TIMEOUT:
+                    evicted.append(entry)
+
+        under_pressure = psutil.virtual_memory().percent >= WHISPER_MEMORY_PRESSURE_PERCENT
+        if under_pressure:
+            # Memory is tight: release every idle model, pinned ones included
+            evicted.extend(entry for entry in idle if entry not in evicted)
+
+        for entry in evicted:
+            _models.pop(entry.key, None)
+
+    if not evicted:
+        return []
+
+    evicted_keys = []
+    for entry in evicted:
+        logger.info(f"Evicting transcription model {entry.key}, idle for {now - entry.last_used:.0f}s"
+                    f"{' (memory pressure)' if under_pressure else ''}")
+        evicted_keys.append(entry.key)
+    # Drop the last references before asking the allocator to give memory back
+    entry = evicted = idle = None
+    _release_memory([key[1] for key in evicted_keys])
+    return evicted_keys
+
+def _eviction_loop():
+    while True:
+        time.sleep(EVICTION_INTERVAL)
+        try:
+            evict_models()
+        except Exception as e:
+            logger.error(f"Transcription model eviction failed: {e}")
+
+def start_eviction_thread():
+    global _eviction_thread
+    with _registry_lock:
+        if _eviction_thread is None or not _eviction_thread.is_alive():
+            _eviction_thread = threading.Thread(target=_eviction_loop, daemon=True)
+            _eviction_thread.start()